@@ -2,7 +2,9 @@ import time
 import logging
 from datetime import datetime
 from typing import Optional, Dict, Any, Tuple
-from database import save_weighing
+from database import save_weighing, datetime_to_timestamp, WEIGHING_DATETIME_FORMAT
+from stability_detector import StabilityDetector
+import metrics
 from logger import get_logger
 
 # Настройка логирования для auto_weighing_engine модуля
@@ -12,15 +14,23 @@ logger = get_logger('auto_weighing_engine')
 class AutoWeighingEngine:
     """Движок автоматического взвешивания с логикой стабилизации веса"""
 
-    def __init__(self, user: Optional[str] = None, scales_name: Optional[str] = None):
+    def __init__(self, user: Optional[str] = None, scales_name: Optional[str] = None, writer=None, history=None):
         self.user = user
         self.scales_name = scales_name
+        # Очередь отложенной записи (WeighingWriter); без нее запись выполняется сразу
+        self.writer = writer
+        # История показаний весов (ReadingHistory), заполняется панелью весов по каждому кадру;
+        # по ней перед сохранением проверяется разброс веса за весь интервал стабилизации
+        self.history = history
+        # Источник метрик производительности (по умолчанию - название весов)
+        self.metrics_source: Optional[str] = None
 
         # Переменные для автоматического взвешивания
         self.last_weight: Optional[float] = None
-        self.last_weight_time: Optional[float] = None
+        self.last_weight_time: Optional[float] = None  # По монотонным часам, в секундах
         self.stable_weight_duration: float = 0.0
         self.last_saved_weight: Optional[float] = None
+        self.last_saved_id: Optional[int] = None  # id последней записи, сохраненной без очереди
         self.weight_was_zero: bool = True  # Флаг, что вес был сброшен на ноль
 
         # Настройки автоматического взвешивания
@@ -29,6 +39,13 @@ class AutoWeighingEngine:
         self.auto_save_timeout: float = 30.0  # Таймаут для автоматического сохранения (секунды)
         self.stabilization_interval: int = 3  # Интервал стабилизации в секундах
 
+        # Детектор стабильности по скользящему окну кадров (допуск в делениях весов)
+        self.stability_detector = StabilityDetector()
+        # Доверять признаку стабильности от весов (ST/US в протоколе 2): при стабильном кадре
+        # вес сохраняется сразу, без ожидания интервала стабилизации
+        self.trust_scale_stability: bool = False
+        self.scale_stable: bool = False  # Весы сообщили о стабильности последнего кадра
+
     def set_user(self, user: str):
         """Установить текущего пользователя"""
         self.user = user
@@ -41,27 +58,58 @@ class AutoWeighingEngine:
         """Установить интервал стабилизации в секундах"""
         self.stabilization_interval = max(1, min(30, interval))  # Ограничение 1-30 секунд
 
+    def set_trust_scale_stability(self, enabled: bool):
+        """Включить/выключить использование признака стабильности от весов"""
+        self.trust_scale_stability = bool(enabled)
+        self.scale_stable = False
+
+    def set_stability_parameters(self, window_size: Optional[int] = None, min_samples: Optional[int] = None,
+                                 division: Optional[float] = None, tolerance_divisions: Optional[float] = None):
+        """Настроить детектор стабильности (не переданные параметры не меняются)"""
+        detector = self.stability_detector
+        self.stability_detector = StabilityDetector(
+            window_size=window_size if window_size is not None else detector.window_size,
+            min_samples=min_samples if min_samples is not None else detector.min_samples,
+            division=division if division is not None else detector.division,
+            tolerance_divisions=tolerance_divisions if tolerance_divisions is not None else detector.tolerance_divisions
+        )
+        self.last_weight_time = None
+        self.stable_weight_duration = 0
+
     def reset_state(self):
         """Сбросить состояние автоматического взвешивания"""
         self.weight_was_zero = True
         self.last_weight = None
         self.last_weight_time = None
         self.stable_weight_duration = 0
+        self.scale_stable = False
+        self.stability_detector.reset()
 
-    def process_weight(self, current_weight: float) -> Tuple[bool, Optional[str]]:
+    def process_weight(self, current_weight: float, scale_stable: Optional[bool] = None,
+                       timestamp_ns: Optional[int] = None) -> Tuple[bool, Optional[str]]:
         """
         Обработать новый вес и определить необходимость автосохранения
 
+        Args:
+            current_weight: вес кадра
+            scale_stable: признак стабильности кадра от весов (None - весы его не передают)
+            timestamp_ns: время поступления кадра по time.monotonic_ns(); без него берется
+                текущее время. Длительность стабильности считается по этим меткам, поэтому
+                не зависит от перевода системных часов и задержек GUI-потока
+
         Returns:
             Tuple[bool, Optional[str]]: (нужно ли сохранить, сообщение о статусе)
         """
         if not self._validate_auto_save_conditions(current_weight):
             return False, None
 
-        current_time = time.time()
+        if timestamp_ns is not None:
+            current_time = timestamp_ns / 1e9
+        else:
+            current_time = time.monotonic()
 
-        # Если вес равен нулю, устанавливаем флаг сброса
-        if current_weight == 0:
+        # Если вес равен нулю (ниже порога срабатывания), устанавливаем флаг сброса
+        if current_weight < self.min_weight_threshold:
             self._handle_zero_weight()
             return False, None
 
@@ -70,7 +118,7 @@ class AutoWeighingEngine:
             return False, None
 
         # Обновляем состояние стабильности веса
-        weight_changed = self._update_weight_stability(current_weight, current_time)
+        weight_changed = self._update_weight_stability(current_weight, current_time, scale_stable)
 
         # Проверяем условия для автосохранения
         if self._should_auto_save(current_weight, current_time):
@@ -81,13 +129,15 @@ class AutoWeighingEngine:
 
     def _validate_auto_save_conditions(self, weight: float) -> bool:
         """Проверить базовые условия для автосохранения"""
-        if not isinstance(weight, (int, float)) or weight < 0:
+        if not isinstance(weight, (int, float)):
             return False
 
         if not self.user:
             return False
 
-        if weight < self.min_weight_threshold or weight > self.max_weight_threshold:
+        # Вес ниже порога срабатывания (в том числе отрицательный - уход нуля) не отбрасывается:
+        # это пустая платформа (сброс на ноль)
+        if weight > self.max_weight_threshold:
             return False
 
         return True
@@ -98,42 +148,77 @@ class AutoWeighingEngine:
         self.last_weight = None
         self.last_weight_time = None
         self.stable_weight_duration = 0
+        self.scale_stable = False
+        self.stability_detector.reset()
 
-    def _update_weight_stability(self, current_weight: float, current_time: float) -> bool:
+    def _update_weight_stability(self, current_weight: float, current_time: float,
+                                 scale_stable: Optional[bool] = None) -> bool:
         """
-        Обновить состояние стабильности веса
+        Обновить состояние стабильности веса по скользящему окну кадров
+        или по признаку стабильности от весов, если ему разрешено доверять.
+        last_weight_time - момент, с которого вес стабилен (None, пока вес колеблется)
 
         Returns:
-            bool: True если вес изменился
+            bool: True если вес нестабилен
         """
-        weight_changed = False
+        self.last_weight = current_weight
 
-        # Если это новый вес или вес изменился
-        if self.last_weight != current_weight:
-            self.last_weight = current_weight
-            self.last_weight_time = current_time
-            self.stable_weight_duration = 0
-            weight_changed = True
+        detector_stable = self.stability_detector.update(current_weight)
+        self.scale_stable = bool(scale_stable) and self.trust_scale_stability
+        if self.trust_scale_stability and scale_stable is not None:
+            stable = scale_stable
         else:
-            # Вес не изменился, увеличиваем время стабилизации
-            if self.last_weight_time is not None:
-                self.stable_weight_duration = current_time - self.last_weight_time
+            stable = detector_stable
 
-        return weight_changed
+        if not stable:
+            self.last_weight_time = None
+            self.stable_weight_duration = 0
+            return True
+
+        # Вес в пределах допуска, увеличиваем время стабилизации
+        if self.last_weight_time is None:
+            self.last_weight_time = current_time
+        self.stable_weight_duration = current_time - self.last_weight_time
+        return False
 
     def _should_auto_save(self, weight: float, current_time: float) -> bool:
         """Определить, нужно ли выполнять автосохранение"""
-        # Вес должен быть стабилен в течение заданного интервала
-        # и больше нуля, и должен был быть сброшен на ноль перед этим
+        # Вес должен быть стабилен в течение заданного интервала (или по признаку
+        # стабильности от весов) и больше нуля, и должен был быть сброшен на ноль перед этим
+        if weight <= 0 or not self.weight_was_zero:
+            return False
+        if self.scale_stable:
+            return True
         return (self.stable_weight_duration >= self.stabilization_interval and
-                weight > 0 and
-                self.weight_was_zero)
+                self._is_stable_over_interval(current_time))
+
+    def _is_stable_over_interval(self, current_time: float) -> bool:
+        """Укладывается ли разброс веса за интервал стабилизации в допуск детектора.
+
+        Окно детектора - несколько последних кадров, поэтому медленный дрейф
+        веса (груз сползает, машина еще въезжает) оно не замечает; история
+        показаний покрывает весь интервал. Без истории проверка не выполняется.
+        """
+        if self.history is None:
+            return True
+        weight_range = self.history.min_max(self.stabilization_interval, int(current_time * 1e9))
+        if weight_range is None:
+            return True
+        low, high = weight_range
+        # Тот же запас на погрешность дробных весов, что и в детекторе
+        return high - low <= 2 * self.stability_detector.tolerance + 1e-9
 
     def _perform_auto_save(self, weight: float):
         """Выполнить автоматическое сохранение веса"""
         try:
+            # Момент выполнения условия сохранения: от него считается задержка до записи в базу
+            # (задержку от поступления кадра до движка показывает метрика "Кадр -> индикатор")
+            condition_met_ns = time.monotonic_ns() if metrics.enabled else None
+            metrics_source = self.metrics_source or self.scales_name or '-'
+
             # Получить текущую дату и время
-            current_datetime = datetime.now().strftime("%d.%m.%Y %H:%M")
+            now = datetime.now()
+            current_datetime = now.strftime(WEIGHING_DATETIME_FORMAT)
 
             # Данные для сохранения (по умолчанию)
             weighing_data = {
@@ -145,11 +230,20 @@ class AutoWeighingEngine:
                 'sender': '-',
                 'recipient': '-',
                 'comment': '-',
-                'scales_name': self.scales_name or '-'
+                'scales_name': self.scales_name or '-',
+                'timestamp': datetime_to_timestamp(now)
             }
 
-            # Сохранить в базу данных
-            save_weighing(**weighing_data)
+            # Поставить в очередь записи или сохранить в базу данных сразу
+            if self.writer is not None:
+                # Задержку с учетом ожидания в очереди запишет поток записи после фиксации пачки
+                latency = (metrics_source, condition_met_ns) if condition_met_ns is not None else None
+                self.writer.submit(weighing_data, latency=latency)
+                self.last_saved_id = None  # id станет известен после записи (сигнал очереди)
+            else:
+                self.last_saved_id = save_weighing(**weighing_data)
+                if condition_met_ns is not None:
+                    metrics.record(metrics_source, metrics.SAVE_LATENCY, time.monotonic_ns() - condition_met_ns)
 
             # Обновить состояние
             self.last_saved_weight = weight
@@ -165,7 +259,10 @@ class AutoWeighingEngine:
             'last_weight': self.last_weight,
             'stable_duration': self.stable_weight_duration,
             'stabilization_interval': self.stabilization_interval,
+            'trust_scale_stability': self.trust_scale_stability,
+            'scale_stable': self.scale_stable,
             'weight_was_zero': self.weight_was_zero,
             'last_saved_weight': self.last_saved_weight,
+            'history_size': len(self.history) if self.history is not None else 0,
             'auto_enabled': True  # Всегда включено если объект существует
         }
\ No newline at end of file
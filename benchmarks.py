@@ -0,0 +1,297 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+# Бенчмарки работают без окна: виджеты журнала создаются на offscreen-платформе Qt
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+# Импорт database базу не открывает: бенчмарки работают только во временной базе (run_benchmarks)
+import database
+from logger import get_logger
+
+# Настройка логирования для benchmarks модуля
+logger = get_logger('benchmarks')
+
+# Сохраненные результаты эталонного прогона и допустимое замедление относительно них.
+# Эталон - абсолютные времена одного компьютера: сравнение имеет смысл только на нем же
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks_baseline.json')
+REGRESSION_THRESHOLD = 1.5
+# Размеры журнала для бенчмарков выборки и экспорта (--full добавляет 1 000 000 строк)
+JOURNAL_SIZES = (10_000, 100_000)
+FULL_JOURNAL_SIZES = JOURNAL_SIZES + (1_000_000,)
+# Пачка строк при заполнении тестового журнала
+FILL_BATCH_SIZE = 5000
+
+SCALES = ('Весы 1', 'Весы 2', 'Весы 3', 'Весы 4')
+OPERATORS = ('operator1', 'operator2', 'operator3')
+MODES = ('Автоматическое', 'Ручное')
+
+
+def measure(func, number=1, repeat=5):
+    """Лучшее время одного вызова func (в секундах) из repeat серий по number вызовов"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = (time.perf_counter() - started) / number
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def _weighing_record(index, start):
+    """Тестовая запись журнала: взвешивания раз в минуту, начиная со start"""
+    moment = start + timedelta(minutes=index)
+    return {
+        'datetime_str': moment.strftime(database.WEIGHING_DATETIME_FORMAT),
+        'weight': 1000 + (index * 37) % 39000,
+        'operator': OPERATORS[index % len(OPERATORS)],
+        'weighing_mode': MODES[index % len(MODES)],
+        'cargo_name': f"Груз {index % 50}",
+        'sender': f"Отправитель {index % 20}",
+        'recipient': f"Получатель {index % 30}",
+        'comment': '-',
+        'scales_name': SCALES[index % len(SCALES)],
+        'timestamp': database.datetime_to_timestamp(moment),
+    }
+
+
+def _fill_journal(size, start):
+    """Дополнить журнал тестовыми записями до size строк"""
+    existing = database.count_weighings()
+    for batch_start in range(existing, size, FILL_BATCH_SIZE):
+        batch_end = min(batch_start + FILL_BATCH_SIZE, size)
+        database.save_weighings([_weighing_record(index, start) for index in range(batch_start, batch_end)])
+
+
+def bench_parsers(results):
+    """Разбор кадров весов по протоколам (на один кадр)"""
+    from weight_reader import WeightReader
+
+    frames = {
+        'protocol1': (1, b'ww00020.12kg\r\n'),
+        'protocol2': (2, b'ST, GS,+012340 kg\r\n'),
+        'generic': (1, b'weight: 1234.5\r\n'),
+    }
+    for name, (protocol, frame) in frames.items():
+        reader = WeightReader(protocol=protocol)
+        parse = reader.parse_weight_from_raw
+        results[f'parse_weight_from_raw.{name}'] = measure(lambda: parse(frame), number=20000)
+
+    # Пачка из 100 кадров, как при чтении накопившегося буфера порта
+    reader = WeightReader(protocol=2)
+    chunk = b'ST, GS,+012340 kg\r\n' * 100
+    results['split_and_parse.protocol2_per_frame'] = measure(
+        lambda: [reader.parse_reading_from_raw(raw) for raw, _ in reader._split_frames(chunk)], number=200) / 100
+
+
+class _CountingWriter:
+    """Очередь записи для бенчмарка движка: только считает сохранения"""
+
+    def __init__(self):
+        self.count = 0
+
+    def submit(self, record):
+        self.count += 1
+
+
+def bench_engine(results):
+    """AutoWeighingEngine.process_weight на потоке кадров с циклами машин (на один кадр)"""
+    from auto_weighing_engine import AutoWeighingEngine
+    from scale_simulator import SimulatedScale
+
+    for rate in (50, 200):
+        scale = SimulatedScale({'seed': 1, 'rate': rate, 'division': 1})
+        interval_ns = 1_000_000_000 // rate
+        frames = []
+        for index in range(20000):
+            weight, stable = scale.weight_at(index * interval_ns / 1e9)
+            frames.append((weight, stable, index * interval_ns))
+
+        def run():
+            engine = AutoWeighingEngine(user='benchmark', scales_name='bench', writer=_CountingWriter())
+            process = engine.process_weight
+            for weight, stable, timestamp_ns in frames:
+                process(weight, stable, timestamp_ns)
+
+        results[f'process_weight.{rate}hz'] = measure(run, repeat=3) / len(frames)
+
+
+def bench_saves(results, start):
+    """save_weighing по одной записи и save_weighings пачками (на одну запись)"""
+    records = [_weighing_record(index, start) for index in range(500)]
+
+    def single():
+        for record in records:
+            database.save_weighing(**record)
+
+    def batched():
+        for batch_start in range(0, len(records), 50):
+            database.save_weighings(records[batch_start:batch_start + 50])
+
+    results['save_weighing.single'] = measure(single, repeat=3) / len(records)
+    results['save_weighings.batch50'] = measure(batched, repeat=3) / len(records)
+
+    # Тестовые записи не должны попасть в журнал для бенчмарков выборки
+    with database.get_connection() as conn:
+        conn.execute('DELETE FROM weighings')
+        conn.execute('DELETE FROM weighings_daily')
+
+
+def bench_journal(results, sizes, start, tmp_dir):
+    """Выборка журнала, фильтры левой панели и экспорт CSV на журналах разного размера"""
+    from PyQt5 import QtWidgets, QtCore
+    from left_panel import LeftPanelWidget
+    from journal_export import write_csv
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv[:1])
+    panel = LeftPanelWidget()
+    panel.set_current_user('admin')
+    csv_path = os.path.join(tmp_dir, 'export.csv')
+
+    for size in sizes:
+        started = time.perf_counter()
+        _fill_journal(size, start)
+        logger.info(f"Тестовый журнал заполнен до {size} строк за {time.perf_counter() - started:.1f} с")
+        label = f"{size // 1000}k"
+
+        results[f'get_weighings.first_page.{label}'] = measure(
+            lambda: database.get_weighings(operator='admin', limit=200), number=10)
+        results[f'count_weighings.{label}'] = measure(lambda: database.count_weighings(operator='admin'))
+
+        # Фильтр по дате на последние сутки журнала
+        last = start + timedelta(minutes=size - 1)
+        panel.filter_checkbox.setChecked(True)
+        panel.date_edit1.setDate(QtCore.QDate(last.year, last.month, last.day))
+        panel.time_edit1.setTime(QtCore.QTime(0, 0))
+        panel.date_edit2.setDate(QtCore.QDate(last.year, last.month, last.day))
+        panel.time_edit2.setTime(QtCore.QTime(23, 59))
+        results[f'apply_filters.date.{label}'] = measure(panel.apply_filters)
+        panel.filter_checkbox.setChecked(False)
+        results[f'apply_filters.all.{label}'] = measure(panel.apply_filters)
+
+        # Экспорт считается на одну строку, чтобы размеры были сравнимы
+        results[f'export_csv.per_row.{label}'] = measure(
+            lambda: write_csv(csv_path, database.iter_weighings(operator='admin')), repeat=1 if size > 100_000 else 3
+        ) / size
+
+    panel.deleteLater()
+    app.processEvents()
+
+
+def run_benchmarks(sizes=JOURNAL_SIZES, groups=('parsers', 'engine', 'saves', 'journal')):
+    """Выполнить бенчмарки во временной базе данных и вернуть {имя: секунд на операцию}"""
+    results = {}
+    tmp_dir = tempfile.mkdtemp(prefix='weighing_bench_')
+    database.DB_FILE = os.path.join(tmp_dir, 'benchmark.db')
+    database.close_connection()
+    database.init_db()
+    start = datetime(2024, 1, 1, 0, 0)
+    try:
+        if 'parsers' in groups:
+            bench_parsers(results)
+        if 'engine' in groups:
+            bench_engine(results)
+        if 'saves' in groups:
+            bench_saves(results, start)
+        if 'journal' in groups:
+            bench_journal(results, sizes, start, tmp_dir)
+    finally:
+        database.close_connection()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return results
+
+
+def _format_time(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.2f} мкс"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f} мс"
+    return f"{seconds:.2f} с"
+
+
+def _machine_id():
+    """Компьютер, на котором сняты результаты (эталон действителен только для него)"""
+    return f"{platform.node()} / {platform.machine()} / {platform.processor() or '-'}"
+
+
+def compare_with_baseline(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """Сравнить результаты с эталоном; возвращает список имен бенчмарков с замедлением"""
+    machine = baseline.get('machine')
+    if machine and machine != _machine_id():
+        print(f"Внимание: эталон снят на другом компьютере ({machine}), сравнение неточно - "
+              f"обновите эталон: python benchmarks.py --full --save-baseline")
+    regressions = []
+    reference = baseline.get('results', {})
+    for name, seconds in results.items():
+        base = reference.get(name)
+        if base:
+            ratio = seconds / base
+            mark = "ЗАМЕДЛЕНИЕ" if ratio > threshold else ""
+            if ratio > threshold:
+                regressions.append(name)
+            print(f"{name:45} {_format_time(seconds):>12} {_format_time(base):>12} {ratio:6.2f}x {mark}")
+        else:
+            print(f"{name:45} {_format_time(seconds):>12} {'-':>12}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарки горячих путей журнала взвешиваний")
+    parser.add_argument('--full', action='store_true', help="добавить журнал на 1 000 000 строк")
+    parser.add_argument('--only', nargs='+', choices=('parsers', 'engine', 'saves', 'journal'),
+                        help="выполнить только указанные группы")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="файл эталонных результатов")
+    parser.add_argument('--save-baseline', action='store_true', help="сохранить результаты как эталон")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help="допустимое замедление относительно эталона (во сколько раз)")
+    args = parser.parse_args(argv)
+
+    sizes = FULL_JOURNAL_SIZES if args.full else JOURNAL_SIZES
+    groups = tuple(args.only) if args.only else ('parsers', 'engine', 'saves', 'journal')
+    results = run_benchmarks(sizes, groups)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding='utf-8') as f:
+                baseline = json.load(f)
+        # Результаты частичного прогона дополняют эталон, а не заменяют его
+        merged = dict(baseline.get('results', {}))
+        merged.update(results)
+        baseline = {
+            'note': "Абсолютные времена, действительны только для компьютера machine",
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'machine': _machine_id(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'results': dict(sorted(merged.items())),
+        }
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+        for name, seconds in results.items():
+            print(f"{name:45} {_format_time(seconds):>12}")
+        print(f"Эталон сохранен: {args.baseline}")
+        return 0
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    regressions = compare_with_baseline(results, baseline, args.threshold)
+    if regressions:
+        print(f"Замедление больше чем в {args.threshold:g} раза: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,11 +1,11 @@
-import sqlite3
 from PyQt5 import QtWidgets
 from PyQt5.QtSerialPort import QSerialPortInfo
-
-DB_FILE = 'weights_journal.db'
+from database import get_connection, COM_CONFIG_STABILITY_COLUMNS
+from stability_detector import (DEFAULT_WINDOW_SIZE, DEFAULT_MIN_SAMPLES, DEFAULT_DIVISION,
+                                DEFAULT_TOLERANCE_DIVISIONS)
 
 def init_db():
-    conn = sqlite3.connect(DB_FILE)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS com_configurations (
@@ -23,17 +23,19 @@ def init_db():
         cols = [row[1] for row in cursor.fetchall()]
         if 'protocol' not in cols:
             cursor.execute("ALTER TABLE com_configurations ADD COLUMN protocol INTEGER DEFAULT 1")
+        for column, column_type in COM_CONFIG_STABILITY_COLUMNS:
+            if column not in cols:
+                cursor.execute(f"ALTER TABLE com_configurations ADD COLUMN {column} {column_type}")
     except Exception:
         pass
     conn.commit()
-    conn.close()
 
 class ComConfigDialog(QtWidgets.QDialog):
     def __init__(self, parent=None, username=None):
         super().__init__(parent)
         self.username = username
         self.setWindowTitle("Настройка COM-порта")
-        self.setFixedSize(600, 300)
+        self.setFixedSize(900, 340)
 
         main_layout = QtWidgets.QVBoxLayout(self)
 
@@ -45,6 +47,11 @@ class ComConfigDialog(QtWidgets.QDialog):
 
         config_layout.addWidget(QtWidgets.QLabel("COM порт:"))
         self.port_combo = QtWidgets.QComboBox()
+        # Порт можно ввести вручную, в том числе запись потока весов "replay:<файл>"
+        # и виртуальные весы "sim:<параметры>"
+        self.port_combo.setEditable(True)
+        self.port_combo.setToolTip("COM-порт весов, replay:<файл записи> для воспроизведения записи\n"
+                                   "или виртуальные весы sim:protocol=2&rate=20&noise=1")
         config_layout.addWidget(self.port_combo)
 
         config_layout.addWidget(QtWidgets.QLabel("Бадрейт:"))
@@ -61,6 +68,38 @@ class ComConfigDialog(QtWidgets.QDialog):
 
         main_layout.addLayout(config_layout)
 
+        # Детектор стабильности: допуск задается в делениях весов, поэтому для
+        # автомобильных весов с делением 10-20 кг цену деления нужно указать
+        stability_layout = QtWidgets.QHBoxLayout()
+        stability_layout.addWidget(QtWidgets.QLabel("Цена деления, кг:"))
+        self.division_spin = QtWidgets.QDoubleSpinBox()
+        self.division_spin.setDecimals(3)
+        self.division_spin.setRange(0.001, 1000)
+        self.division_spin.setValue(DEFAULT_DIVISION)
+        stability_layout.addWidget(self.division_spin)
+
+        stability_layout.addWidget(QtWidgets.QLabel("Допуск, ± дел.:"))
+        self.tolerance_spin = QtWidgets.QDoubleSpinBox()
+        self.tolerance_spin.setDecimals(1)
+        self.tolerance_spin.setRange(0, 100)
+        self.tolerance_spin.setValue(DEFAULT_TOLERANCE_DIVISIONS)
+        stability_layout.addWidget(self.tolerance_spin)
+
+        stability_layout.addWidget(QtWidgets.QLabel("Окно, кадров:"))
+        self.window_spin = QtWidgets.QSpinBox()
+        self.window_spin.setRange(1, 1000)
+        self.window_spin.setValue(DEFAULT_WINDOW_SIZE)
+        stability_layout.addWidget(self.window_spin)
+
+        stability_layout.addWidget(QtWidgets.QLabel("Мин. кадров:"))
+        self.min_samples_spin = QtWidgets.QSpinBox()
+        self.min_samples_spin.setRange(1, 1000)
+        self.min_samples_spin.setValue(DEFAULT_MIN_SAMPLES)
+        stability_layout.addWidget(self.min_samples_spin)
+        stability_layout.addStretch()
+
+        main_layout.addLayout(stability_layout)
+
         # Кнопки
         buttons_layout = QtWidgets.QHBoxLayout()
         self.add_button = QtWidgets.QPushButton("Добавить")
@@ -72,8 +111,9 @@ class ComConfigDialog(QtWidgets.QDialog):
 
         # Таблица конфигураций
         self.table = QtWidgets.QTableWidget()
-        self.table.setColumnCount(4)
-        self.table.setHorizontalHeaderLabels(["Имя конфигурации", "COM порт", "Бадрейт", "Протокол"])
+        self.table.setColumnCount(8)
+        self.table.setHorizontalHeaderLabels(["Имя конфигурации", "COM порт", "Бадрейт", "Протокол",
+                                              "Деление, кг", "Допуск, дел.", "Окно", "Мин. кадров"])
         # Все столбцы одинаковой ширины
         header = self.table.horizontalHeader()
         header.setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
@@ -91,52 +131,62 @@ class ComConfigDialog(QtWidgets.QDialog):
         ports = QSerialPortInfo.availablePorts()
         port_names = [port.portName() for port in ports]
         self.port_combo.addItems(port_names)
+        # Виртуальные весы для проверки и нагрузочного тестирования без оборудования
+        # (модуль стенда импортируется только при открытии настройки)
+        from scale_simulator import SIM_PORT_PRESETS
+        self.port_combo.addItems(SIM_PORT_PRESETS)
 
     def load_configurations(self):
         self.table.setRowCount(0)
         if not self.username:
             return
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
+        cursor = get_connection().cursor()
         cursor.execute('''
-            SELECT name, port, baud, COALESCE(protocol, 1)
+            SELECT name, port, baud, COALESCE(protocol, 1),
+                   COALESCE(division, ?), COALESCE(tolerance_divisions, ?),
+                   COALESCE(window_size, ?), COALESCE(min_samples, ?)
             FROM com_configurations
             WHERE username=?
             ORDER BY id DESC
-        ''', (self.username,))
+        ''', (DEFAULT_DIVISION, DEFAULT_TOLERANCE_DIVISIONS, DEFAULT_WINDOW_SIZE, DEFAULT_MIN_SAMPLES,
+              self.username))
         rows = cursor.fetchall()
-        conn.close()
 
         for row_data in rows:
             row = self.table.rowCount()
             self.table.insertRow(row)
             for col, val in enumerate(row_data):
-                self.table.setItem(row, col, QtWidgets.QTableWidgetItem(str(val)))
+                text = f"{val:g}" if isinstance(val, float) else str(val)
+                self.table.setItem(row, col, QtWidgets.QTableWidgetItem(text))
 
         # Ширины столбцов остаются равными благодаря режиму Stretch
 
     def add_configuration(self):
         name = self.name_edit.text().strip()
-        port = self.port_combo.currentText()
+        port = self.port_combo.currentText().strip()
         baud = int(self.baud_combo.currentText())
         protocol = int(self.protocol_combo.currentText()) if self.protocol_combo.currentText().isdigit() else 1
+        min_samples = min(self.min_samples_spin.value(), self.window_spin.value())
 
         if not name:
             QtWidgets.QMessageBox.warning(self, "Ошибка", "Введите имя конфигурации")
             return
 
+        if not port:
+            QtWidgets.QMessageBox.warning(self, "Ошибка", "Выберите или введите COM порт")
+            return
+
         if not self.username:
             QtWidgets.QMessageBox.warning(self, "Ошибка", "Пользователь не задан")
             return
 
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO com_configurations (username, name, port, baud, protocol)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (self.username, name, port, baud, protocol))
-        conn.commit()
-        conn.close()
+        with get_connection() as conn:
+            conn.execute('''
+                INSERT INTO com_configurations (username, name, port, baud, protocol,
+                                                division, tolerance_divisions, window_size, min_samples)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (self.username, name, port, baud, protocol, self.division_spin.value(),
+                  self.tolerance_spin.value(), self.window_spin.value(), min_samples))
 
         self.name_edit.clear()
         self.load_configurations()
@@ -150,23 +200,18 @@ class ComConfigDialog(QtWidgets.QDialog):
             QtWidgets.QMessageBox.warning(self, "Ошибка", "Пользователь не задан")
             return
 
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-
-        for index in sorted(selected, reverse=True):
-            name = self.table.item(index.row(), 0).text()
-            port = self.table.item(index.row(), 1).text()
-            baud = int(self.table.item(index.row(), 2).text())
-            protocol_item = self.table.item(index.row(), 3)
-            protocol = int(protocol_item.text()) if protocol_item and protocol_item.text().isdigit() else 1
-
-            cursor.execute('''
-                DELETE FROM com_configurations
-                WHERE username=? AND name=? AND port=? AND baud=? AND COALESCE(protocol,1)=?
-            ''', (self.username, name, port, baud, protocol))
-            self.table.removeRow(index.row())
-
-        conn.commit()
-        conn.close()
+        with get_connection() as conn:
+            for index in sorted(selected, reverse=True):
+                name = self.table.item(index.row(), 0).text()
+                port = self.table.item(index.row(), 1).text()
+                baud = int(self.table.item(index.row(), 2).text())
+                protocol_item = self.table.item(index.row(), 3)
+                protocol = int(protocol_item.text()) if protocol_item and protocol_item.text().isdigit() else 1
+
+                conn.execute('''
+                    DELETE FROM com_configurations
+                    WHERE username=? AND name=? AND port=? AND baud=? AND COALESCE(protocol,1)=?
+                ''', (self.username, name, port, baud, protocol))
+                self.table.removeRow(index.row())
 
 init_db()
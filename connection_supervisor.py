@@ -0,0 +1,176 @@
+import time
+import logging
+from typing import Optional, Tuple
+from PyQt5 import QtCore
+from weight_reader import WeightReader
+from serial_multiplexer import SerialMultiplexer
+from logger import get_logger
+
+# Настройка логирования для connection_supervisor модуля
+logger = get_logger('connection_supervisor')
+
+# Состояния подключения весов
+STATE_DISCONNECTED = 'disconnected'  # Отключены оператором (или еще не подключались)
+STATE_CONNECTED = 'connected'        # Порт открыт, данные поступают
+STATE_NO_DATA = 'no_data'            # Порт открыт без ошибок, но весы молчат
+STATE_RECONNECTING = 'reconnecting'  # Ошибка порта, ждем повторного подключения
+
+CONNECTION_STATE_TITLES = {
+    STATE_DISCONNECTED: "Отключено",
+    STATE_CONNECTED: "Ок",
+    STATE_NO_DATA: "Нет данных",
+    STATE_RECONNECTING: "Переподключение",
+}
+
+# Пауза перед повторным подключением: удваивается после каждой неудачи до максимума, с
+RECONNECT_INITIAL_DELAY = 0.5
+RECONNECT_MAX_DELAY = 30.0
+# Через сколько секунд без кадров открытый порт считается молчащим, с
+NO_DATA_TIMEOUT = 5.0
+# Период проверки поступления данных (check_data), мс
+WATCHDOG_INTERVAL_MS = 1000
+
+
+class ConnectionSupervisor(QtCore.QObject):
+    """Надзор за подключением одних весов: переподключение после ошибок порта.
+
+    Отсутствие данных (пустое чтение) ошибкой не считается - порт остается
+    открытым, а состояние меняется на "нет данных". Ошибка порта
+    (мультиплексор снял весы с обслуживания) закрывает порт и запускает
+    повторные подключения с нарастающей паузой, пока порт не откроется
+    или оператор не отключит весы. Пауза сбрасывается, когда после
+    переподключения приходят первые кадры.
+
+    Своего таймера проверки молчания у надзора нет: check_data() вызывает
+    владелец раз в WATCHDOG_INTERVAL_MS (ScalesManager - одним таймером
+    для всех весов), чтобы пробуждения GUI-потока не росли с числом весов.
+    """
+
+    # Смена состояния подключения: новое состояние (STATE_*), пояснение
+    state_changed = QtCore.pyqtSignal(str, str)
+    # Кадры (WeightReading) от весов, в GUI-потоке
+    readings_received = QtCore.pyqtSignal(list)
+
+    def __init__(self, weight_reader: WeightReader, multiplexer: SerialMultiplexer, parent=None):
+        super().__init__(parent)
+        self.weight_reader = weight_reader
+        self.multiplexer = multiplexer
+        self.state = STATE_DISCONNECTED
+
+        self.port: Optional[str] = None
+        self.baudrate: Optional[int] = None
+        self.protocol = 1
+        self.channel = None
+
+        self.reconnect_delay = RECONNECT_INITIAL_DELAY
+        self.reconnect_attempts = 0
+        self.last_data_time: Optional[float] = None  # time.monotonic() последней пачки кадров
+
+        self.reconnect_timer = QtCore.QTimer(self)
+        self.reconnect_timer.setSingleShot(True)
+        self.reconnect_timer.timeout.connect(self._try_reconnect)
+
+    def connect_port(self, port: str, baudrate: int, protocol: int = 1) -> Tuple[bool, str]:
+        """Подключиться к весам и взять подключение под надзор.
+
+        Ошибка первого подключения возвращается вызывающему (оператор
+        выбрал неверный порт) и повторами не сопровождается.
+        """
+        self.disconnect_port()
+        success, message = self.weight_reader.connect(port, baudrate)
+        if not success:
+            return False, message
+        self.port = port
+        self.baudrate = baudrate
+        self.protocol = protocol
+        self.reconnect_delay = RECONNECT_INITIAL_DELAY
+        self.reconnect_attempts = 0
+        self._attach()
+        self._set_state(STATE_CONNECTED, message)
+        return True, message
+
+    def disconnect_port(self):
+        """Отключить весы по команде оператора: без повторных подключений"""
+        self.reconnect_timer.stop()
+        self._detach()
+        self.weight_reader.disconnect()
+        if self.state != STATE_DISCONNECTED:
+            self._set_state(STATE_DISCONNECTED, "Отключено оператором")
+
+    def _attach(self):
+        """Поставить открытый порт на обслуживание мультиплексором"""
+        self.weight_reader.set_protocol(self.protocol)
+        self.channel = self.multiplexer.add(self.weight_reader, parent=self)
+        # Мультиплексор работает в своем потоке, поэтому сигналы доставляются через очередь событий
+        self.channel.readings_received.connect(self._on_readings, QtCore.Qt.QueuedConnection)
+        self.channel.connection_lost.connect(self._on_connection_lost, QtCore.Qt.QueuedConnection)
+        self.last_data_time = time.monotonic()
+
+    def _detach(self):
+        """Снять порт с обслуживания мультиплексором"""
+        if self.channel is None:
+            return
+        self.multiplexer.remove(self.channel)
+        try:
+            self.channel.readings_received.disconnect()
+            self.channel.connection_lost.disconnect()
+        except (TypeError, RuntimeError):
+            pass
+        self.channel.deleteLater()
+        self.channel = None
+
+    def _set_state(self, state: str, message: str = ""):
+        if state == self.state:
+            return
+        logger.info(f"Весы {self.port}: {CONNECTION_STATE_TITLES[self.state]} -> "
+                    f"{CONNECTION_STATE_TITLES[state]}{f' ({message})' if message else ''}")
+        self.state = state
+        self.state_changed.emit(state, message)
+
+    def _on_readings(self, readings):
+        if self.channel is None:
+            # Пачка пришла из очереди событий уже после отключения
+            return
+        self.last_data_time = time.monotonic()
+        if self.state != STATE_CONNECTED:
+            self._set_state(STATE_CONNECTED, "Данные поступают")
+        # Связь подтверждена кадрами - следующий обрыв снова начнет с короткой паузы
+        self.reconnect_delay = RECONNECT_INITIAL_DELAY
+        self.reconnect_attempts = 0
+        self.readings_received.emit(readings)
+
+    def check_data(self):
+        """Отметить молчащие весы (порт открыт, но кадров нет дольше NO_DATA_TIMEOUT)"""
+        if self.state != STATE_CONNECTED or self.last_data_time is None:
+            return
+        silence = time.monotonic() - self.last_data_time
+        if silence >= NO_DATA_TIMEOUT:
+            self._set_state(STATE_NO_DATA, f"Нет кадров {silence:.0f} с")
+
+    def _on_connection_lost(self):
+        """Ошибка порта: закрыть его и запланировать повторное подключение"""
+        if self.channel is None:
+            return
+        self._detach()
+        self.weight_reader.disconnect()
+        self._schedule_reconnect("Ошибка порта")
+
+    def _schedule_reconnect(self, reason: str):
+        delay = self.reconnect_delay
+        self.reconnect_delay = min(self.reconnect_delay * 2, RECONNECT_MAX_DELAY)
+        self._set_state(STATE_RECONNECTING, reason)
+        logger.warning(f"Весы {self.port}: {reason}, повторное подключение через {delay:g} с")
+        self.reconnect_timer.start(int(delay * 1000))
+
+    def _try_reconnect(self):
+        if self.port is None or self.state != STATE_RECONNECTING:
+            return
+        self.reconnect_attempts += 1
+        success, message = self.weight_reader.connect(self.port, self.baudrate)
+        if not success:
+            self._schedule_reconnect(f"Попытка {self.reconnect_attempts}: {message}")
+            return
+        logger.info(f"Весы {self.port}: порт открыт после {self.reconnect_attempts} попыток")
+        self._attach()
+        # Пауза сбросится с первыми кадрами; если их не будет - состояние станет "Нет данных"
+        self._set_state(STATE_CONNECTED, message)
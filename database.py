@@ -1,5 +1,8 @@
 import sqlite3
 import logging
+import argparse
+import threading
+from datetime import datetime, timedelta
 from PyQt5 import QtWidgets, QtCore
 from PyQt5.QtSerialPort import QSerialPortInfo
 from logger import get_logger
@@ -10,9 +13,108 @@ logger = get_logger('database')
 
 DB_FILE = 'weights_journal.db'
 
+# Размер кэша подготовленных выражений на соединение: запросы модулей
+# компилируются один раз и далее переиспользуются sqlite3
+STATEMENT_CACHE_SIZE = 256
+# Сколько секунд ждать снятия блокировки базы другим соединением
+BUSY_TIMEOUT = 5.0
+
+# Формат отображаемой даты в колонке weighings.datetime
+WEIGHING_DATETIME_FORMAT = "%d.%m.%Y %H:%M"
+# Размер пачки при заполнении колонки ts для старых записей
+TS_BACKFILL_BATCH_SIZE = 5000
+# Размер пачки строк при потоковой выборке журнала (экспорт)
+EXPORT_FETCH_SIZE = 1000
+# Поля строки журнала в порядке, в котором их возвращает get_weighings
+WEIGHING_FIELDS = ('id', 'datetime', 'weight', 'operator', 'weighing_mode', 'cargo_name',
+                   'sender', 'recipient', 'comment', 'scales_name')
+# Начало дневной смены (часы) и длительность смены для группировки отчетов
+SHIFT_START_HOUR = 8
+SHIFT_LENGTH_HOURS = 12
+# Группировки отчетов: ключ -> SQL-выражение над строкой weighings
+WEIGHING_GROUPINGS = {
+    'day': "strftime('%Y-%m-%d', ts, 'unixepoch', 'localtime')",
+    # Смена относится к дате ее начала: ночная смена после полуночи - к предыдущему дню
+    'shift': (f"strftime('%Y-%m-%d', ts, 'unixepoch', 'localtime', '-{SHIFT_START_HOUR} hours') || "
+              f"CASE WHEN CAST(strftime('%H', ts, 'unixepoch', 'localtime', '-{SHIFT_START_HOUR} hours') AS INTEGER) "
+              f"< {SHIFT_LENGTH_HOURS} THEN ' дневная' ELSE ' ночная' END"),
+    'operator': 'operator',
+    'scales': 'scales_name',
+    'cargo': 'cargo_name',
+    'sender': 'sender',
+    'recipient': 'recipient',
+}
+# Весы записи в суточной сводке: пустое название и NULL учитываются как '-'
+DAILY_ROLLUP_SCALES = "IFNULL(NULLIF(scales_name, ''), '-')"
+# Группировки, которые можно посчитать по суточной сводке weighings_daily
+DAILY_ROLLUP_GROUPINGS = {
+    'day': 'day',
+    'operator': 'operator',
+    'scales': 'scales_name',
+}
+# Поля, от которых зависит суточная сводка (их изменение требует пересчета групп)
+DAILY_ROLLUP_FIELDS = ('datetime', 'weight', 'operator', 'scales_name')
+# Настройки детектора стабильности в конфигурации COM-порта: колонка -> тип
+COM_CONFIG_STABILITY_COLUMNS = (
+    ('division', 'REAL'),              # Цена деления весов, кг
+    ('tolerance_divisions', 'REAL'),   # Допуск колебаний веса, ± делений
+    ('window_size', 'INTEGER'),        # Кадров в скользящем окне
+    ('min_samples', 'INTEGER'),        # Минимум кадров для решения о стабильности
+)
+# Сколько id передавать в одном условии IN (...)
+SQL_IN_BATCH_SIZE = 500
+# Поля журнала, которые администратор может изменять
+EDITABLE_WEIGHING_FIELDS = ('datetime', 'weight', 'operator', 'weighing_mode', 'cargo_name',
+                            'sender', 'recipient', 'comment', 'scales_name')
+
+# Одно долгоживущее соединение на поток (sqlite3 запрещает делить соединение между потоками)
+_thread_local = threading.local()
+
+
+def get_connection() -> sqlite3.Connection:
+    """
+    Возвращает постоянное соединение с базой данных для текущего потока.
+    Соединение открывается один раз (WAL, synchronous=NORMAL) и используется всеми модулями,
+    поэтому вставки не платят за открытие файла и fsync на каждую запись.
+    Для записи используйте `with get_connection() as conn:` - это одна транзакция
+    с автоматическим commit/rollback.
+    """
+    conn = getattr(_thread_local, 'connection', None)
+    if conn is None:
+        conn = sqlite3.connect(DB_FILE, timeout=BUSY_TIMEOUT, cached_statements=STATEMENT_CACHE_SIZE)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        _thread_local.connection = conn
+    return conn
+
+
+def close_connection():
+    """Закрывает соединение текущего потока (вызывается при завершении потока/приложения)"""
+    conn = getattr(_thread_local, 'connection', None)
+    if conn is not None:
+        _thread_local.connection = None
+        try:
+            conn.close()
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка при закрытии соединения с базой данных: {e}")
+
+
+def checkpoint() -> bool:
+    """Перенести WAL в файл базы (PRAGMA wal_checkpoint(PASSIVE)) без ожидания других соединений.
+
+    При synchronous=NORMAL зафиксированные транзакции попадают на диск только
+    с контрольной точкой: True - WAL перенесен полностью и файл базы сброшен на диск.
+    """
+    try:
+        busy, log_frames, checkpointed = get_connection().execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+    except sqlite3.Error as e:
+        logger.warning(f"Не удалось выполнить контрольную точку WAL: {e}")
+        return False
+    return busy == 0 and log_frames == checkpointed
+
 
 def init_db():
-    conn = sqlite3.connect(DB_FILE)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS com_configurations (
@@ -30,6 +132,10 @@ def init_db():
         cols = [row[1] for row in cursor.fetchall()]
         if 'protocol' not in cols:
             cursor.execute("ALTER TABLE com_configurations ADD COLUMN protocol INTEGER DEFAULT 1")
+        # Параметры детектора стабильности весов (NULL - значения по умолчанию детектора)
+        for column, column_type in COM_CONFIG_STABILITY_COLUMNS:
+            if column not in cols:
+                cursor.execute(f"ALTER TABLE com_configurations ADD COLUMN {column} {column_type}")
     except Exception:
         pass
     
@@ -45,7 +151,9 @@ def init_db():
             sender TEXT DEFAULT '-',
             recipient TEXT DEFAULT '-',
             comment TEXT DEFAULT '-',
-            scales_name TEXT DEFAULT '-'
+            scales_name TEXT DEFAULT '-',
+            ts INTEGER,
+            uid TEXT
         )
     ''')
 
@@ -87,8 +195,182 @@ def init_db():
 
     except Exception as e:
         logger.error(f"Ошибка миграции базы данных: {e}")
+
+    # Миграция: добавляем колонку ts (Unix-время, секунды) для сортировки и фильтрации по дате
+    try:
+        cursor.execute("PRAGMA table_info(weighings)")
+        cols = [row[1] for row in cursor.fetchall()]
+        if 'ts' not in cols:
+            cursor.execute("ALTER TABLE weighings ADD COLUMN ts INTEGER")
+        conn.commit()
+        _backfill_weighings_ts(conn)
+    except Exception as e:
+        logger.error(f"Ошибка миграции колонки ts: {e}")
+
+    # Миграция: колонка uid - уникальный идентификатор записи из спула (для идемпотентной записи)
+    try:
+        cursor.execute("PRAGMA table_info(weighings)")
+        cols = [row[1] for row in cursor.fetchall()]
+        if 'uid' not in cols:
+            cursor.execute("ALTER TABLE weighings ADD COLUMN uid TEXT")
+        conn.commit()
+    except Exception as e:
+        logger.error(f"Ошибка миграции колонки uid: {e}")
+
+    # Индексы для фильтрации журнала на стороне SQL
+    cursor.execute('DROP INDEX IF EXISTS idx_weighings_datetime_key')
+    cursor.execute('DROP INDEX IF EXISTS idx_weighings_operator')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_weighings_ts ON weighings(ts)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_weighings_operator_ts ON weighings(operator, ts)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_weighings_mode ON weighings(weighing_mode)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_weighings_scales ON weighings(scales_name)')
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_weighings_uid ON weighings(uid)')
+    conn.commit()
+
+    # Суточная сводка по весам и операторам (поддерживается при сохранении, правке и удалении)
+    cursor.execute("PRAGMA table_info(weighings_daily)")
+    rollup_columns = {row[1]: row[2] for row in cursor.fetchall()}
+    rollup_exists = bool(rollup_columns)
+    if rollup_columns.get('total_weight') == 'REAL':
+        # Сводка прежнего формата приводила суммы к REAL - пересоздаем ее по записям
+        cursor.execute('DROP TABLE weighings_daily')
+        rollup_exists = False
+    # Колонки веса без типа: в них хранится результат SUM/MIN/MAX(weight) как есть (целое
+    # или дробное), чтобы сводка возвращала те же типы, что и запрос по weighings
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS weighings_daily (
+            day TEXT NOT NULL,
+            scales_name TEXT NOT NULL,
+            operator TEXT NOT NULL,
+            weighings_count INTEGER NOT NULL,
+            total_weight NOT NULL,
+            min_weight,
+            max_weight,
+            PRIMARY KEY (day, scales_name, operator)
+        ) WITHOUT ROWID
+    ''')
     conn.commit()
-    conn.close()
+    if not rollup_exists:
+        rebuild_weighings_daily()
+
+
+def _backfill_weighings_ts(conn):
+    """Заполняет ts для записей без него пачками, чтобы не держать одну огромную транзакцию"""
+    last_id = 0
+    filled = 0
+    while True:
+        rows = conn.execute('''
+            SELECT id, datetime FROM weighings
+            WHERE ts IS NULL AND id > ?
+            ORDER BY id
+            LIMIT ?
+        ''', (last_id, TS_BACKFILL_BATCH_SIZE)).fetchall()
+        if not rows:
+            break
+
+        updates = []
+        for record_id, datetime_str in rows:
+            ts = parse_weighing_timestamp(datetime_str)
+            if ts is not None:
+                updates.append((ts, record_id))
+        with conn:
+            conn.executemany('UPDATE weighings SET ts=? WHERE id=?', updates)
+
+        filled += len(updates)
+        last_id = rows[-1][0]
+
+    if filled:
+        logger.info(f"Миграция: заполнена колонка ts для {filled} записей")
+
+
+def _add_to_daily_rollup(conn, weighing_id):
+    """Учесть новую запись в суточной сводке (в транзакции вставки).
+
+    Ключ и вес берутся из только что вставленной строки weighings теми же
+    выражениями, что и при пересчете, поэтому сводка не расходится с ним
+    ни в названии весов, ни в типе веса.
+    """
+    conn.execute(f'''
+        INSERT INTO weighings_daily (day, scales_name, operator, weighings_count,
+                                     total_weight, min_weight, max_weight)
+        SELECT {WEIGHING_GROUPINGS['day']}, {DAILY_ROLLUP_SCALES}, operator, 1, weight, weight, weight
+        FROM weighings
+        WHERE id = ? AND ts IS NOT NULL
+        ON CONFLICT (day, scales_name, operator) DO UPDATE SET
+            weighings_count = weighings_count + 1,
+            total_weight = total_weight + excluded.total_weight,
+            min_weight = MIN(min_weight, excluded.min_weight),
+            max_weight = MAX(max_weight, excluded.max_weight)
+    ''', (weighing_id,))
+
+
+def _get_rollup_keys(conn, weighing_ids):
+    """Группы суточной сводки (день, весы, оператор), к которым относятся записи"""
+    keys = set()
+    weighing_ids = list(weighing_ids)
+    for start in range(0, len(weighing_ids), SQL_IN_BATCH_SIZE):
+        chunk = weighing_ids[start:start + SQL_IN_BATCH_SIZE]
+        placeholders = ', '.join('?' * len(chunk))
+        rows = conn.execute(f'''
+            SELECT DISTINCT {WEIGHING_GROUPINGS['day']}, {DAILY_ROLLUP_SCALES}, operator
+            FROM weighings
+            WHERE id IN ({placeholders}) AND ts IS NOT NULL
+        ''', chunk).fetchall()
+        keys.update(rows)
+    return keys
+
+
+def _recompute_daily_rollup(conn, keys):
+    """Пересчитать группы суточной сводки по записям weighings (после правки или удаления)"""
+    for day, scales_name, operator in keys:
+        day_start = datetime.strptime(day, '%Y-%m-%d')
+        conn.execute('DELETE FROM weighings_daily WHERE day=? AND scales_name=? AND operator=?',
+                     (day, scales_name, operator))
+        conn.execute(f'''
+            INSERT INTO weighings_daily (day, scales_name, operator, weighings_count,
+                                         total_weight, min_weight, max_weight)
+            SELECT ?, ?, ?, COUNT(*), SUM(weight), MIN(weight), MAX(weight)
+            FROM weighings
+            WHERE operator = ? AND ts >= ? AND ts < ? AND {DAILY_ROLLUP_SCALES} = ?
+            GROUP BY operator
+        ''', (day, scales_name, operator, operator, datetime_to_timestamp(day_start),
+              datetime_to_timestamp(day_start + timedelta(days=1)), scales_name))
+
+
+def rebuild_weighings_daily():
+    """Полностью пересчитать суточную сводку по таблице weighings (для восстановления и первичного заполнения)"""
+    with get_connection() as conn:
+        conn.execute('DELETE FROM weighings_daily')
+        conn.execute(f'''
+            INSERT INTO weighings_daily (day, scales_name, operator, weighings_count,
+                                         total_weight, min_weight, max_weight)
+            SELECT {WEIGHING_GROUPINGS['day']}, {DAILY_ROLLUP_SCALES}, operator,
+                   COUNT(*), SUM(weight), MIN(weight), MAX(weight)
+            FROM weighings
+            WHERE ts IS NOT NULL
+            GROUP BY 1, 2, 3
+        ''')
+        count = conn.execute('SELECT COUNT(*) FROM weighings_daily').fetchone()[0]
+    logger.info(f"Суточная сводка пересчитана: {count} групп")
+    return count
+
+
+def datetime_to_timestamp(value: datetime) -> int:
+    """Переводит локальные дату и время в Unix-время (секунды)"""
+    return int(value.timestamp())
+
+
+def parse_weighing_timestamp(datetime_str):
+    """Переводит строку даты журнала ("%d.%m.%Y %H:%M") в Unix-время, None если формат неверный"""
+    try:
+        return datetime_to_timestamp(datetime.strptime(datetime_str, WEIGHING_DATETIME_FORMAT))
+    except (TypeError, ValueError):
+        return None
+
+
+def format_weighing_timestamp(ts):
+    """Переводит Unix-время в строку даты журнала"""
+    return datetime.fromtimestamp(ts).strftime(WEIGHING_DATETIME_FORMAT)
 
 
 class ComConfigDialog(QtWidgets.QDialog):
@@ -176,8 +458,7 @@ class ComConfigDialog(QtWidgets.QDialog):
 
     def load_configurations(self):
         self.table.setRowCount(0)
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
+        cursor = get_connection().cursor()
         cursor.execute('''
             SELECT name, port, baud, COALESCE(protocol, 1)
             FROM com_configurations
@@ -185,7 +466,6 @@ class ComConfigDialog(QtWidgets.QDialog):
             ORDER BY id DESC
         ''', (self.username,))
         rows = cursor.fetchall()
-        conn.close()
 
         for row_data in rows:
             row = self.table.rowCount()
@@ -207,14 +487,11 @@ class ComConfigDialog(QtWidgets.QDialog):
             QtWidgets.QMessageBox.warning(self, "Ошибка", "Введите имя конфигурации")
             return
 
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO com_configurations (username, name, port, baud, protocol)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (self.username, name, port, baud, protocol))
-        conn.commit()
-        conn.close()
+        with get_connection() as conn:
+            conn.execute('''
+                INSERT INTO com_configurations (username, name, port, baud, protocol)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (self.username, name, port, baud, protocol))
 
         self.name_edit.clear()
         self.load_configurations()
@@ -224,80 +501,326 @@ class ComConfigDialog(QtWidgets.QDialog):
         if not selected:
             return
 
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
+        with get_connection() as conn:
+            for index in sorted(selected, reverse=True):
+                name = self.table.item(index.row(), 0).text()
+                port = self.table.item(index.row(), 1).text()
+                baud = int(self.table.item(index.row(), 2).text())
+                protocol_text = self.table.item(index.row(), 3)
+                protocol = int(protocol_text.text()) if protocol_text and protocol_text.text().isdigit() else 1
 
-        for index in sorted(selected, reverse=True):
-            name = self.table.item(index.row(), 0).text()
-            port = self.table.item(index.row(), 1).text()
-            baud = int(self.table.item(index.row(), 2).text())
-            protocol_text = self.table.item(index.row(), 3)
-            protocol = int(protocol_text.text()) if protocol_text and protocol_text.text().isdigit() else 1
+                conn.execute('''
+                    DELETE FROM com_configurations
+                    WHERE username=? AND name=? AND port=? AND baud=? AND COALESCE(protocol,1)=?
+                ''', (self.username, name, port, baud, protocol))
+                self.table.removeRow(index.row())
 
-            cursor.execute('''
-                DELETE FROM com_configurations
-                WHERE username=? AND name=? AND port=? AND baud=? AND COALESCE(protocol,1)=?
-            ''', (self.username, name, port, baud, protocol))
-            self.table.removeRow(index.row())
 
-        conn.commit()
-        conn.close()
+def _insert_weighing(conn, datetime_str, weight, operator, weighing_mode='-', cargo_name='-',
+                     sender='-', recipient='-', comment='-', scales_name='-', timestamp=None, uid=None):
+    """
+    Вставляет одно взвешивание в открытой транзакции и возвращает id новой записи.
+    Запись с уже сохраненным uid пропускается (возвращается None)
+    """
+    if timestamp is None:
+        timestamp = parse_weighing_timestamp(datetime_str)
+
+    cursor = conn.execute('''
+        INSERT INTO weighings (datetime, weight, operator, weighing_mode, cargo_name,
+                             sender, recipient, comment, scales_name, ts, uid)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (uid) DO NOTHING
+    ''', (datetime_str, weight, operator, weighing_mode, cargo_name,
+          sender, recipient, comment, scales_name, timestamp, uid))
+    if cursor.rowcount == 0:
+        return None
+    _add_to_daily_rollup(conn, cursor.lastrowid)
+    return cursor.lastrowid
 
 
 def save_weighing(datetime_str, weight, operator, weighing_mode='-', cargo_name='-',
-                  sender='-', recipient='-', comment='-', scales_name='-'):
+                  sender='-', recipient='-', comment='-', scales_name='-', timestamp=None, uid=None):
     """
-    Сохраняет данные взвешивания в базу данных
+    Сохраняет данные взвешивания в базу данных и возвращает id новой записи
+    timestamp - Unix-время взвешивания; если не передано, вычисляется из datetime_str
+    uid - идентификатор записи из спула; повторная запись с тем же uid игнорируется (None)
     """
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO weighings (datetime, weight, operator, weighing_mode, cargo_name,
-                             sender, recipient, comment, scales_name)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (datetime_str, weight, operator, weighing_mode, cargo_name,
-          sender, recipient, comment, scales_name))
-    conn.commit()
-    conn.close()
+    with get_connection() as conn:
+        return _insert_weighing(conn, datetime_str, weight, operator, weighing_mode, cargo_name,
+                                sender, recipient, comment, scales_name, timestamp, uid)
 
 
-def get_weighings(operator=None):
+def save_weighings(records):
     """
-    Получает данные взвешиваний из базы данных
-    Если operator указан и не "admin", возвращает только записи этого оператора
-    Для admin возвращает все записи
+    Сохраняет пачку взвешиваний одной транзакцией и возвращает список id в том же порядке
+    (None - запись с таким uid уже была сохранена).
+    records - словари с аргументами save_weighing
     """
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        return [_insert_weighing(conn, **record) for record in records]
 
-    if operator == "admin":
-        # Admin видит все записи
-        cursor.execute('''
-            SELECT datetime, weight, operator, weighing_mode, cargo_name,
-                   sender, recipient, comment, scales_name
-            FROM weighings
-            ORDER BY id DESC
-        ''')
-    elif operator:
-        cursor.execute('''
-            SELECT datetime, weight, operator, weighing_mode, cargo_name,
-                   sender, recipient, comment, scales_name
-            FROM weighings
-            WHERE operator = ?
-            ORDER BY id DESC
-        ''', (operator,))
-    else:
-        cursor.execute('''
-            SELECT datetime, weight, operator, weighing_mode, cargo_name,
-                   sender, recipient, comment, scales_name
-            FROM weighings
-            ORDER BY id DESC
-        ''')
 
+def _build_weighings_filter(operator=None, date_from=None, date_to=None, weighing_mode=None, scales_name=None):
+    """
+    Формирует условие WHERE и параметры для выборки взвешиваний.
+    Если operator указан и не "admin", выбираются только записи этого оператора.
+    date_from/date_to - datetime (границы включительно), weighing_mode и scales_name - точное совпадение
+    (режим "-" включает записи без режима).
+    """
+    conditions = []
+    params = []
+
+    if operator and operator != "admin":
+        conditions.append('operator = ?')
+        params.append(operator)
+    if date_from is not None:
+        conditions.append('ts >= ?')
+        params.append(datetime_to_timestamp(date_from))
+    if date_to is not None:
+        # Граница задается с точностью до минуты - включаем всю последнюю минуту
+        conditions.append('ts < ?')
+        params.append(datetime_to_timestamp(date_to) + 60)
+    if weighing_mode == '-':
+        # Режим "-" отображается и для старых записей без режима (NULL или пустая строка)
+        conditions.append("(weighing_mode IS NULL OR weighing_mode IN ('', '-'))")
+    elif weighing_mode:
+        conditions.append('weighing_mode = ?')
+        params.append(weighing_mode)
+    if scales_name:
+        conditions.append('scales_name = ?')
+        params.append(scales_name)
+
+    where_sql = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    return where_sql, params
+
+
+def get_weighings(operator=None, date_from=None, date_to=None, weighing_mode=None, scales_name=None,
+                  limit=None, offset=0):
+    """
+    Получает данные взвешиваний из базы данных (новые записи первыми)
+    Каждая строка начинается с id записи
+    Если operator указан и не "admin", возвращает только записи этого оператора
+    Для admin возвращает все записи
+    Фильтры по дате, режиму и весам, а также постраничная выборка (limit/offset)
+    выполняются в SQL по индексам
+    """
+    where_sql, params = _build_weighings_filter(operator, date_from, date_to, weighing_mode, scales_name)
+    query = f'''
+        SELECT id, datetime, weight, operator, weighing_mode, cargo_name,
+               sender, recipient, comment, scales_name
+        FROM weighings
+        {where_sql}
+        ORDER BY ts DESC, id DESC
+    '''
+    if limit is not None:
+        query += ' LIMIT ? OFFSET ?'
+        params += [limit, offset]
+
+    cursor = get_connection().cursor()
+    cursor.execute(query, params)
     rows = cursor.fetchall()
-    conn.close()
     return rows
 
 
-# Вызовите один раз в начале приложения
-init_db()
+def iter_weighings(operator=None, date_from=None, date_to=None, weighing_mode=None, scales_name=None,
+                   batch_size=EXPORT_FETCH_SIZE, fields=WEIGHING_FIELDS):
+    """
+    Потоково выдает записи журнала пачками по batch_size строк.
+    fields - выбираемые поля (по умолчанию как в get_weighings, доступно также 'ts').
+    Используется один курсор с fetchmany, поэтому расход памяти не зависит от размера выборки
+    """
+    unknown_fields = set(fields) - set(WEIGHING_FIELDS) - {'ts'}
+    if unknown_fields:
+        raise ValueError(f"Неизвестные поля журнала: {', '.join(sorted(unknown_fields))}")
+
+    where_sql, params = _build_weighings_filter(operator, date_from, date_to, weighing_mode, scales_name)
+    cursor = get_connection().cursor()
+    cursor.execute(f'''
+        SELECT {', '.join(fields)}
+        FROM weighings
+        {where_sql}
+        ORDER BY ts DESC, id DESC
+    ''', params)
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cursor.close()
+
+
+def get_weighing_position(weighing_id, operator=None, date_from=None, date_to=None, weighing_mode=None,
+                          scales_name=None):
+    """
+    Одна запись по id для журнала operator одним запросом: (строка в формате get_weighings, позиция)
+    или None, если запись оператору не видна. Позиция - индекс записи в выборке get_weighings
+    с теми же фильтрами (сколько подходящих записей новее нее по ts, id) или None,
+    если запись под фильтры не подходит
+    """
+    user_where_sql, user_params = _build_weighings_filter(operator)
+    where_sql, params = _build_weighings_filter(operator, date_from, date_to, weighing_mode, scales_name)
+    user_where_sql = f"{user_where_sql} AND id = ?" if user_where_sql else 'WHERE id = ?'
+    matches_sql = where_sql.replace('WHERE ', '', 1) if where_sql else '1'
+    newer_where_sql = f"{where_sql} AND" if where_sql else 'WHERE'
+    # Условия фильтра без префикса относятся к ближайшей таблице: в подзапросе - к newer
+    cursor = get_connection().cursor()
+    cursor.execute(f'''
+        SELECT id, datetime, weight, operator, weighing_mode, cargo_name,
+               sender, recipient, comment, scales_name,
+               CASE WHEN ts IS NOT NULL AND {matches_sql} THEN (
+                   SELECT COUNT(*) FROM weighings AS newer
+                   {newer_where_sql} (newer.ts, newer.id) > (current.ts, current.id)
+               ) END
+        FROM weighings AS current
+        {user_where_sql}
+    ''', params + params + user_params + [weighing_id])
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return row[:-1], row[-1]
+
+
+def update_weighing_field(weighing_id, field, value):
+    """
+    Изменяет одно поле записи по id. При изменении даты/времени пересчитывается ts
+    (дата не в формате журнала - ValueError). Возвращает True, если запись найдена
+    """
+    if field not in EDITABLE_WEIGHING_FIELDS:
+        raise ValueError(f"Поле {field} нельзя изменять")
+    if field == 'datetime':
+        ts = parse_weighing_timestamp(value)
+        if ts is None:
+            raise ValueError(f"Дата/время '{value}' не в формате {WEIGHING_DATETIME_FORMAT}")
+
+    with get_connection() as conn:
+        rollup_keys = _get_rollup_keys(conn, [weighing_id]) if field in DAILY_ROLLUP_FIELDS else set()
+        if field == 'datetime':
+            # Держим в согласии сортируемое время записи
+            cursor = conn.execute('UPDATE weighings SET datetime=?, ts=? WHERE id=?',
+                                  (value, ts, weighing_id))
+        else:
+            cursor = conn.execute(f'UPDATE weighings SET {field}=? WHERE id=?', (value, weighing_id))
+        if field in DAILY_ROLLUP_FIELDS:
+            # Запись могла перейти в другую группу - пересчитываем старую и новую
+            rollup_keys |= _get_rollup_keys(conn, [weighing_id])
+            _recompute_daily_rollup(conn, rollup_keys)
+    return cursor.rowcount > 0
+
+
+def delete_weighings(weighing_ids):
+    """Удаляет записи по списку id одной транзакцией, возвращает количество удаленных"""
+    weighing_ids = list(weighing_ids)
+    with get_connection() as conn:
+        rollup_keys = _get_rollup_keys(conn, weighing_ids)
+        cursor = conn.executemany('DELETE FROM weighings WHERE id=?',
+                                  ((weighing_id,) for weighing_id in weighing_ids))
+        _recompute_daily_rollup(conn, rollup_keys)
+    return cursor.rowcount
+
+
+def count_weighings(operator=None, date_from=None, date_to=None, weighing_mode=None, scales_name=None):
+    """Возвращает количество взвешиваний с теми же фильтрами, что и get_weighings"""
+    where_sql, params = _build_weighings_filter(operator, date_from, date_to, weighing_mode, scales_name)
+    cursor = get_connection().cursor()
+    cursor.execute(f'SELECT COUNT(*) FROM weighings {where_sql}', params)
+    return cursor.fetchone()[0]
+
+
+def aggregate_weighings(group_by=(), operator=None, date_from=None, date_to=None, weighing_mode=None,
+                        scales_name=None):
+    """
+    Сводка по взвешиваниям с фильтрами get_weighings, сгруппированная по ключам WEIGHING_GROUPINGS.
+    Возвращает строки (значения группировок..., количество, сумма, среднее, минимум, максимум веса)
+    """
+    unknown_groupings = [key for key in group_by if key not in WEIGHING_GROUPINGS]
+    if unknown_groupings:
+        raise ValueError(f"Неизвестные группировки отчета: {', '.join(unknown_groupings)}")
+
+    if _daily_rollup_applicable(group_by, date_from, date_to, weighing_mode, scales_name):
+        return _aggregate_daily_rollup(group_by, operator, date_from, date_to)
+
+    where_sql, params = _build_weighings_filter(operator, date_from, date_to, weighing_mode, scales_name)
+    group_columns = [WEIGHING_GROUPINGS[key] for key in group_by]
+    select_sql = ''.join(f'{column} AS g{i}, ' for i, column in enumerate(group_columns))
+    group_sql = ''
+    if group_columns:
+        aliases = ', '.join(f'g{i}' for i in range(len(group_columns)))
+        group_sql = f'GROUP BY {aliases} ORDER BY {aliases}'
+
+    cursor = get_connection().cursor()
+    cursor.execute(f'''
+        SELECT {select_sql}COUNT(*), SUM(weight), AVG(weight), MIN(weight), MAX(weight)
+        FROM weighings
+        {where_sql}
+        {group_sql}
+    ''', params)
+    return cursor.fetchall()
+
+
+def _daily_rollup_applicable(group_by, date_from, date_to, weighing_mode, scales_name):
+    """Можно ли посчитать сводку по weighings_daily: группировки по дням/весам/операторам
+    и период, заданный целыми сутками с обеих сторон.
+    Без границ периода сводка идет по weighings: записи без ts в суточную сводку не попадают"""
+    if weighing_mode or scales_name:
+        return False
+    if any(key not in DAILY_ROLLUP_GROUPINGS for key in group_by):
+        return False
+    if date_from is None or date_to is None:
+        return False
+    return (date_from.hour, date_from.minute) == (0, 0) and (date_to.hour, date_to.minute) == (23, 59)
+
+
+def _aggregate_daily_rollup(group_by, operator, date_from, date_to):
+    """aggregate_weighings по суточной сводке: читается O(дней) строк вместо всех взвешиваний"""
+    conditions = []
+    params = []
+    if operator and operator != "admin":
+        conditions.append('operator = ?')
+        params.append(operator)
+    if date_from is not None:
+        conditions.append('day >= ?')
+        params.append(date_from.strftime('%Y-%m-%d'))
+    if date_to is not None:
+        conditions.append('day <= ?')
+        params.append(date_to.strftime('%Y-%m-%d'))
+    where_sql = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    group_columns = [DAILY_ROLLUP_GROUPINGS[key] for key in group_by]
+    select_sql = ''.join(f'{column}, ' for column in group_columns)
+    group_sql = ''
+    if group_columns:
+        columns = ', '.join(group_columns)
+        group_sql = f'GROUP BY {columns} ORDER BY {columns}'
+
+    cursor = get_connection().cursor()
+    cursor.execute(f'''
+        SELECT {select_sql}IFNULL(SUM(weighings_count), 0), SUM(total_weight),
+               CAST(SUM(total_weight) AS REAL) / SUM(weighings_count), MIN(min_weight), MAX(max_weight)
+        FROM weighings_daily
+        {where_sql}
+        {group_sql}
+    ''', params)
+    return cursor.fetchall()
+
+
+def get_weighings_time_range(operator=None, date_from=None, date_to=None, weighing_mode=None, scales_name=None):
+    """Возвращает (количество, самое раннее ts, самое позднее ts) для взвешиваний с фильтрами"""
+    where_sql, params = _build_weighings_filter(operator, date_from, date_to, weighing_mode, scales_name)
+    cursor = get_connection().cursor()
+    cursor.execute(f'SELECT COUNT(*), MIN(ts), MAX(ts) FROM weighings {where_sql}', params)
+    return cursor.fetchone()
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Обслуживание базы данных журнала взвешиваний")
+    parser.add_argument('--rebuild-daily', action='store_true',
+                        help="пересчитать суточную сводку weighings_daily по всем взвешиваниям")
+    args = parser.parse_args()
+    if args.rebuild_daily:
+        init_db()
+        print(f"Суточная сводка пересчитана: {rebuild_weighings_daily()} групп")
+    else:
+        parser.print_help()
@@ -0,0 +1,115 @@
+import logging
+from datetime import datetime
+from PyQt5 import QtWidgets, QtCore
+import metrics
+from logger import get_logger
+
+# Настройка логирования для diagnostics_dialog модуля
+logger = get_logger('diagnostics_dialog')
+
+# Период обновления таблицы метрик, мс
+REFRESH_INTERVAL_MS = 1000
+
+DIAGNOSTICS_HEADERS = ["Источник", "Метрика", "Кол-во", "Частота, /с", "p50, мс", "p95, мс", "p99, мс", "Макс, мс"]
+
+
+class DiagnosticsDialog(QtWidgets.QDialog):
+    """Немодальное окно метрик производительности: задержки горячего пути по весам, базе и журналу"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Диагностика")
+        self.resize(900, 400)
+
+        layout = QtWidgets.QVBoxLayout(self)
+
+        self.enabled_checkbox = QtWidgets.QCheckBox("Собирать метрики производительности")
+        self.enabled_checkbox.setChecked(metrics.is_enabled())
+        self.enabled_checkbox.toggled.connect(self.on_enabled_toggled)
+        layout.addWidget(self.enabled_checkbox)
+
+        # Таблица метрик
+        self.table = QtWidgets.QTableWidget(0, len(DIAGNOSTICS_HEADERS))
+        self.table.setHorizontalHeaderLabels(DIAGNOSTICS_HEADERS)
+        self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.verticalHeader().setVisible(False)
+        layout.addWidget(self.table)
+
+        # Кнопки
+        buttons_layout = QtWidgets.QHBoxLayout()
+        self.reset_button = QtWidgets.QPushButton("Сбросить")
+        self.reset_button.clicked.connect(self.reset_metrics)
+        buttons_layout.addWidget(self.reset_button)
+
+        self.save_button = QtWidgets.QPushButton("Сохранить в файл")
+        self.save_button.clicked.connect(self.save_metrics)
+        buttons_layout.addWidget(self.save_button)
+
+        buttons_layout.addStretch()
+
+        self.close_button = QtWidgets.QPushButton("Закрыть")
+        self.close_button.clicked.connect(self.close)
+        buttons_layout.addWidget(self.close_button)
+
+        layout.addLayout(buttons_layout)
+
+        self.refresh_timer = QtCore.QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.refresh()
+
+    def on_enabled_toggled(self, checked):
+        metrics.set_enabled(checked)
+        self.refresh()
+
+    def refresh(self):
+        """Перечитать сводку метрик в таблицу"""
+        rows = metrics.snapshot()
+        self.table.setRowCount(len(rows))
+        for row_index, row in enumerate(rows):
+            values = [
+                row['source'],
+                metrics.METRIC_TITLES.get(row['metric'], row['metric']),
+                str(row['count']),
+                f"{row['rate']:.1f}",
+                f"{row['p50_ms']:.3f}",
+                f"{row['p95_ms']:.3f}",
+                f"{row['p99_ms']:.3f}",
+                f"{row['max_ms']:.3f}",
+            ]
+            for column, value in enumerate(values):
+                item = self.table.item(row_index, column)
+                if item is None:
+                    item = QtWidgets.QTableWidgetItem()
+                    if column >= 2:
+                        item.setTextAlignment(QtCore.Qt.AlignRight | QtCore.Qt.AlignVCenter)
+                    self.table.setItem(row_index, column, item)
+                item.setText(value)
+
+    def reset_metrics(self):
+        metrics.reset()
+        self.refresh()
+
+    def save_metrics(self):
+        default_name = f"metrics_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Сохранить метрики", default_name, "JSON (*.json)")
+        if not path:
+            return
+        try:
+            metrics.dump(path)
+            QtWidgets.QMessageBox.information(self, "Диагностика", f"Метрики сохранены: {path}")
+        except Exception as e:
+            logger.error(f"Не удалось сохранить метрики в файл {path}: {e}")
+            QtWidgets.QMessageBox.warning(self, "Ошибка", f"Не удалось сохранить метрики: {e}")
+
+    def showEvent(self, a0):
+        # Таблица обновляется только пока окно открыто
+        self.refresh()
+        self.refresh_timer.start(REFRESH_INTERVAL_MS)
+        super().showEvent(a0)
+
+    def hideEvent(self, a0):
+        # Закрытие кнопкой, крестиком и Esc (reject) только скрывает окно
+        self.refresh_timer.stop()
+        super().hideEvent(a0)
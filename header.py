@@ -10,6 +10,7 @@ class HeaderWidget(QtWidgets.QWidget):
     add_scales_clicked = QtCore.pyqtSignal()
     user_management_clicked = QtCore.pyqtSignal()
     delete_record_clicked = QtCore.pyqtSignal()
+    diagnostics_clicked = QtCore.pyqtSignal()
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -175,6 +176,10 @@ class HeaderWidget(QtWidgets.QWidget):
         self.license_action.triggered.connect(self.show_license_info)
         self.help_menu.addAction(self.license_action)
 
+        self.diagnostics_action = QtWidgets.QAction("Диагностика", self)
+        self.diagnostics_action.triggered.connect(self.diagnostics_clicked.emit)
+        self.help_menu.addAction(self.diagnostics_action)
+
         # Подключаем меню к кнопке
         self.btn_help.setMenu(self.help_menu)
 
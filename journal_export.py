@@ -0,0 +1,270 @@
+import csv
+import os
+import re
+import importlib.util
+import logging
+from collections import namedtuple
+from datetime import datetime
+from PyQt5 import QtCore
+from database import iter_weighings, count_weighings, close_connection, EXPORT_FETCH_SIZE, WEIGHING_FIELDS
+from journal_model import JOURNAL_HEADERS, format_journal_row
+from logger import get_logger
+
+# Настройка логирования для journal_export модуля
+logger = get_logger('journal_export')
+
+# Поля типизированной выгрузки (Parquet, Arrow, XLSX): время - Unix-время ts, вес - число
+TYPED_EXPORT_FIELDS = ('id', 'ts', 'weight', 'operator', 'scales_name', 'weighing_mode',
+                       'cargo_name', 'sender', 'recipient', 'comment')
+TYPED_EXPORT_HEADERS = ("ID", "Дата/Время", "Масса, кг", "Оператор", "ВЕСЫ№", "Режим взвешивания",
+                        "Наименование груза", "Отправитель", "Получатель", "Примечание")
+# Поля с небольшим набором повторяющихся значений - пишутся словарным кодированием
+CATEGORICAL_EXPORT_FIELDS = ('operator', 'scales_name', 'weighing_mode')
+# Число в весе, сохраненном текстом (старые правки журнала вида "12 кг", "12,5")
+_WEIGHT_NUMBER = re.compile(r'[-+]?\d+(?:[.,]\d+)?')
+# Максимум строк на одном листе Excel (без строки заголовков)
+XLSX_MAX_SHEET_ROWS = 1048575
+
+
+def write_csv(path, batches, on_batch=None):
+    """Записать журнал в CSV (разделитель ';', тексты как в таблице) по пачкам строк.
+
+    on_batch(количество строк в пачке) вызывается после записи каждой пачки
+    и может вернуть False, чтобы прервать запись. Возвращает число записанных строк.
+    """
+    written = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(JOURNAL_HEADERS)
+        for rows in batches:
+            writer.writerows(format_journal_row(row) for row in rows)
+            written += len(rows)
+            if on_batch is not None and on_batch(len(rows)) is False:
+                break
+    return written
+
+
+def _arrow_schema(pa):
+    """Схема типизированной выгрузки журнала для pyarrow"""
+    types = {
+        'id': pa.int64(),
+        'ts': pa.timestamp('s', tz='UTC'),
+        'weight': pa.float64(),
+    }
+    return pa.schema([
+        (field, types.get(field, pa.dictionary(pa.int32(), pa.string())
+                          if field in CATEGORICAL_EXPORT_FIELDS else pa.string()))
+        for field in TYPED_EXPORT_FIELDS
+    ])
+
+
+def _typed_weight(value):
+    """Вес для типизированной колонки: число; текст старых правок разбирается, иначе - пусто (null)"""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    match = _WEIGHT_NUMBER.search(str(value))
+    return float(match.group().replace(',', '.')) if match else None
+
+
+class _DictionaryEncoder:
+    """Словарь значений колонки, общий для всех пачек выгрузки.
+
+    Новые значения только дописываются в конец словаря, поэтому в Arrow IPC
+    он передается дельтами, а не заменяется в каждой пачке. Пустые значения
+    (NULL) в словарь не попадают и пишутся как null-индекс.
+    """
+
+    def __init__(self):
+        self.indices = {}
+        self.values = []
+
+    def encode(self, pa, column):
+        indices = []
+        for value in column:
+            if value is None:
+                indices.append(None)
+                continue
+            index = self.indices.get(value)
+            if index is None:
+                index = self.indices[value] = len(self.values)
+                self.values.append(value)
+            indices.append(index)
+        return pa.DictionaryArray.from_arrays(pa.array(indices, pa.int32()),
+                                              pa.array(self.values, pa.string()))
+
+
+def _iter_record_batches(pa, schema, batches, on_batch):
+    """Преобразовать пачки строк TYPED_EXPORT_FIELDS в RecordBatch по колонкам"""
+    encoders = {field: _DictionaryEncoder() for field in CATEGORICAL_EXPORT_FIELDS}
+    for rows in batches:
+        arrays = []
+        for field, column in zip(TYPED_EXPORT_FIELDS, zip(*rows)):
+            if field in encoders:
+                arrays.append(encoders[field].encode(pa, column))
+            elif field == 'weight':
+                arrays.append(pa.array([_typed_weight(value) for value in column], pa.float64()))
+            else:
+                arrays.append(pa.array(column, schema.field(field).type))
+        yield pa.record_batch(arrays, schema=schema), len(rows)
+        if on_batch is not None and on_batch(len(rows)) is False:
+            break
+
+
+def write_parquet(path, batches, on_batch=None):
+    """Записать журнал в Apache Parquet с типизированными колонками (нужен pyarrow)"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(pa)
+    written = 0
+    with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+        for record_batch, rows_count in _iter_record_batches(pa, schema, batches, on_batch):
+            writer.write_batch(record_batch)
+            written += rows_count
+    return written
+
+
+def write_arrow(path, batches, on_batch=None):
+    """Записать журнал в файл Arrow IPC (Feather v2) с типизированными колонками (нужен pyarrow)"""
+    import pyarrow as pa
+
+    schema = _arrow_schema(pa)
+    options = pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+    written = 0
+    with pa.ipc.new_file(path, schema, options=options) as writer:
+        for record_batch, rows_count in _iter_record_batches(pa, schema, batches, on_batch):
+            writer.write_batch(record_batch)
+            written += rows_count
+    return written
+
+
+def write_xlsx(path, batches, on_batch=None):
+    """Записать журнал в XLSX потоковым режимом openpyxl (write_only).
+
+    Дата/время пишется как дата Excel, вес - числом. При превышении
+    предела строк листа Excel записи продолжаются на следующем листе.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+
+    workbook = Workbook(write_only=True)
+    sheet = None
+    sheet_rows = XLSX_MAX_SHEET_ROWS
+    written = 0
+    for rows in batches:
+        for row in rows:
+            if sheet_rows >= XLSX_MAX_SHEET_ROWS:
+                sheet = workbook.create_sheet(f"Журнал {len(workbook.sheetnames) + 1}")
+                sheet.append(TYPED_EXPORT_HEADERS)
+                sheet_rows = 0
+            weighing_time = WriteOnlyCell(sheet, value=datetime.fromtimestamp(row[1]) if row[1] is not None else None)
+            weighing_time.number_format = 'DD.MM.YYYY HH:MM'
+            sheet.append([row[0], weighing_time, *row[2:]])
+            sheet_rows += 1
+        written += len(rows)
+        if on_batch is not None and on_batch(len(rows)) is False:
+            break
+
+    if sheet is None:
+        workbook.create_sheet("Журнал 1").append(TYPED_EXPORT_HEADERS)
+    workbook.save(path)
+    return written
+
+
+# Формат выгрузки: фильтр диалога сохранения, расширение, функция записи,
+# выбираемые поля журнала и модуль, без которого формат недоступен
+ExportFormat = namedtuple('ExportFormat', 'title extension writer fields required_module')
+
+EXPORT_FORMATS = {
+    'csv': ExportFormat("CSV (*.csv)", '.csv', write_csv, WEIGHING_FIELDS, None),
+    'xlsx': ExportFormat("Excel (*.xlsx)", '.xlsx', write_xlsx, TYPED_EXPORT_FIELDS, 'openpyxl'),
+    'parquet': ExportFormat("Apache Parquet (*.parquet)", '.parquet', write_parquet, TYPED_EXPORT_FIELDS, 'pyarrow'),
+    'arrow': ExportFormat("Apache Arrow IPC (*.arrow)", '.arrow', write_arrow, TYPED_EXPORT_FIELDS, 'pyarrow'),
+}
+
+
+def available_export_formats():
+    """Форматы выгрузки, для которых установлены нужные библиотеки"""
+    return {
+        name: export_format for name, export_format in EXPORT_FORMATS.items()
+        if export_format.required_module is None or importlib.util.find_spec(export_format.required_module)
+    }
+
+
+class JournalExportWorker(QtCore.QThread):
+    """Фоновая выгрузка журнала из базы данных в файл.
+
+    Строки читаются из SQLite пачками одним курсором с теми же фильтрами,
+    что и у журнала, и сразу пишутся в файл, поэтому расход памяти не зависит
+    от объема выгрузки, а окно приложения не блокируется. Запись идет
+    во временный файл, который заменяет целевой только после успешного завершения.
+    """
+
+    # Выгружено строк, всего строк
+    progress = QtCore.pyqtSignal(int, int)
+    # Выгрузка завершена: количество строк, путь к файлу
+    export_finished = QtCore.pyqtSignal(int, str)
+    # Выгрузка прервана пользователем
+    export_cancelled = QtCore.pyqtSignal()
+    # Ошибка выгрузки: текст ошибки
+    export_failed = QtCore.pyqtSignal(str)
+
+    def __init__(self, path, operator, filters=None, export_format='csv',
+                 batch_size=EXPORT_FETCH_SIZE, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.export_format = EXPORT_FORMATS[export_format]
+        self.operator = operator
+        self.filters = dict(filters or {})
+        self.batch_size = batch_size
+
+        self._written = 0
+        self._total = 0
+
+    def run(self):
+        temp_path = self.path + '.part'
+        batches = None
+        try:
+            self._total = count_weighings(operator=self.operator, **self.filters)
+            self.progress.emit(0, self._total)
+
+            batches = iter_weighings(operator=self.operator, batch_size=self.batch_size,
+                                     fields=self.export_format.fields, **self.filters)
+            count = self.export_format.writer(temp_path, batches, self._on_batch)
+
+            if self.isInterruptionRequested():
+                self._remove_file(temp_path)
+                logger.info(f"Выгрузка журнала в {self.path} прервана после {count} записей")
+                self.export_cancelled.emit()
+                return
+
+            os.replace(temp_path, self.path)
+            logger.info(f"Журнал выгружен в {self.path}: {count} записей")
+            self.export_finished.emit(count, self.path)
+        except Exception as e:
+            self._remove_file(temp_path)
+            logger.error(f"Ошибка при выгрузке журнала в {self.path}: {e}")
+            self.export_failed.emit(str(e))
+        finally:
+            # Курсор и соединение с базой данных принадлежат этому потоку
+            if batches is not None:
+                batches.close()
+            close_connection()
+
+    def _on_batch(self, rows_count):
+        """Учесть записанную пачку и сообщить о прогрессе"""
+        self._written += rows_count
+        self.progress.emit(self._written, self._total)
+        return not self.isInterruptionRequested()
+
+    def cancel(self):
+        """Прервать выгрузку (файл не будет создан)"""
+        self.requestInterruption()
+
+    @staticmethod
+    def _remove_file(path):
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            logger.warning(f"Не удалось удалить временный файл {path}: {e}")
@@ -0,0 +1,251 @@
+import logging
+from PyQt5 import QtCore
+from database import get_weighings, count_weighings, parse_weighing_timestamp
+from logger import get_logger
+
+# Настройка логирования для journal_model модуля
+logger = get_logger('journal_model')
+
+# Заголовки колонок журнала в порядке отображения
+JOURNAL_HEADERS = [
+    "Дата/Время",
+    "Масса",
+    "ВЕСЫ№",
+    "Оператор",
+    "Режим взвешивания",
+    "Наименование груза",
+    "Отправитель",
+    "Получатель",
+    "Примечание",
+]
+
+# Поле таблицы weighings для каждой колонки журнала
+JOURNAL_FIELDS = [
+    'datetime',
+    'weight',
+    'scales_name',
+    'operator',
+    'weighing_mode',
+    'cargo_name',
+    'sender',
+    'recipient',
+    'comment',
+]
+
+# Порядок полей в строке, которую возвращает get_weighings (id не отображается)
+_ROW_FIELDS = ['id', 'datetime', 'weight', 'operator', 'weighing_mode', 'cargo_name',
+               'sender', 'recipient', 'comment', 'scales_name']
+_ID_INDEX = _ROW_FIELDS.index('id')
+# Индекс значения в строке get_weighings для каждой колонки журнала
+_COLUMN_TO_ROW_INDEX = [_ROW_FIELDS.index(field) for field in JOURNAL_FIELDS]
+DATETIME_COLUMN = JOURNAL_FIELDS.index('datetime')
+WEIGHT_COLUMN = JOURNAL_FIELDS.index('weight')
+SCALES_COLUMN = JOURNAL_FIELDS.index('scales_name')
+
+
+def format_journal_cell(row, column: int) -> str:
+    """Текст ячейки журнала для строки get_weighings"""
+    value = row[_COLUMN_TO_ROW_INDEX[column]]
+    if column == WEIGHT_COLUMN:
+        return f"{value} кг"
+    if column == SCALES_COLUMN:
+        return str(value or "-")
+    return str(value)
+
+
+def format_journal_row(row):
+    """Строка get_weighings в виде текстов ячеек журнала (как в таблице)"""
+    return [format_journal_cell(row, column) for column in range(len(JOURNAL_FIELDS))]
+
+
+class WeighingsTableModel(QtCore.QAbstractTableModel):
+    """Модель журнала взвешиваний с ленивой подгрузкой строк из базы.
+
+    Строки запрашиваются страницами через canFetchMore/fetchMore по мере
+    прокрутки, поэтому объем памяти и время обновления не зависят
+    от размера журнала.
+    """
+
+    # Администратор изменил ячейку: (id записи, поле, новое значение)
+    cell_edited = QtCore.pyqtSignal(int, str, object)
+
+    def __init__(self, page_size: int = 200, parent=None):
+        super().__init__(parent)
+        self.page_size = page_size
+        self.editable = False
+
+        self._rows = []
+        self._operator = None
+        self._filters = {}
+        self._has_more = False
+        self.matching_count = 0  # Количество записей, подходящих под фильтры
+
+    def set_query(self, operator, filters=None):
+        """Задать оператора и фильтры журнала и загрузить первую страницу"""
+        self.beginResetModel()
+        self._rows = []
+        self._operator = operator
+        self._filters = dict(filters or {})
+        self._has_more = operator is not None
+        self.matching_count = count_weighings(operator=operator, **self._filters) if operator else 0
+        self.endResetModel()
+
+        if self.canFetchMore(QtCore.QModelIndex()):
+            self.fetchMore(QtCore.QModelIndex())
+
+    def clear(self):
+        """Очистить модель (например, при выходе пользователя)"""
+        self.beginResetModel()
+        self._rows = []
+        self._operator = None
+        self._filters = {}
+        self._has_more = False
+        self.matching_count = 0
+        self.endResetModel()
+
+    def refresh(self):
+        """Перечитать журнал с текущими фильтрами"""
+        self.set_query(self._operator, self._filters)
+
+    # --- ленивая подгрузка ---
+
+    def canFetchMore(self, parent):
+        if parent.isValid():
+            return False
+        return self._has_more
+
+    def fetchMore(self, parent):
+        if parent.isValid() or not self._has_more:
+            return
+
+        try:
+            rows = get_weighings(operator=self._operator, limit=self.page_size,
+                                 offset=len(self._rows), **self._filters)
+        except Exception as e:
+            logger.error(f"Ошибка при подгрузке журнала взвешиваний: {e}")
+            self._has_more = False
+            return
+
+        if len(rows) < self.page_size:
+            self._has_more = False
+        if not rows:
+            return
+
+        start = len(self._rows)
+        self.beginInsertRows(QtCore.QModelIndex(), start, start + len(rows) - 1)
+        self._rows.extend(rows)
+        self.endInsertRows()
+
+    # --- интерфейс QAbstractTableModel ---
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._rows)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(JOURNAL_HEADERS)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        if role == QtCore.Qt.DisplayRole:
+            return format_journal_cell(self._rows[index.row()], index.column())
+        if role == QtCore.Qt.EditRole:
+            value = self._rows[index.row()][_COLUMN_TO_ROW_INDEX[index.column()]]
+            if index.column() == SCALES_COLUMN:
+                return str(value or "-")
+            return str(value)
+        if role == QtCore.Qt.UserRole:
+            # Скрытый первичный ключ записи
+            return self._rows[index.row()][_ID_INDEX]
+        return None
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
+            if 0 <= section < len(JOURNAL_HEADERS):
+                return JOURNAL_HEADERS[section]
+        return None
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if self.editable and index.isValid():
+            flags |= QtCore.Qt.ItemIsEditable
+        return flags
+
+    def setData(self, index, value, role=QtCore.Qt.EditRole):
+        if role != QtCore.Qt.EditRole or not index.isValid() or not self.editable:
+            return False
+
+        column = index.column()
+        field = JOURNAL_FIELDS[column]
+        new_value = str(value).strip()
+        if column == WEIGHT_COLUMN:
+            try:
+                number = float(new_value.replace(' кг', '').replace(',', '.'))
+            except ValueError:
+                return False
+            new_value = int(number) if number.is_integer() else number
+        elif column == DATETIME_COLUMN and parse_weighing_timestamp(new_value) is None:
+            # Дата не в формате журнала - запись выпала бы из фильтров, сортировки и сводки
+            return False
+
+        row = list(self._rows[index.row()])
+        row[_COLUMN_TO_ROW_INDEX[column]] = new_value
+        self._rows[index.row()] = tuple(row)
+        self.dataChanged.emit(index, index, [QtCore.Qt.DisplayRole, QtCore.Qt.EditRole])
+
+        self.cell_edited.emit(row[_ID_INDEX], field, new_value)
+        return True
+
+    def insert_row(self, position, row):
+        """Добавить новую запись на ее место в журнале без перезапроса.
+
+        position - индекс записи в выборке с текущими фильтрами. Запись за
+        пределами загруженных страниц не вставляется: она придет с fetchMore
+        (загруженное начало выборки от нее не сдвигается).
+        """
+        self.matching_count += 1
+        if position > len(self._rows) or (position == len(self._rows) and self._has_more):
+            return
+        self.beginInsertRows(QtCore.QModelIndex(), position, position)
+        self._rows.insert(position, row)
+        self.endInsertRows()
+
+    def removeRows(self, row, count, parent=QtCore.QModelIndex()):
+        if parent.isValid() or row < 0 or row + count > len(self._rows):
+            return False
+        self.beginRemoveRows(parent, row, row + count - 1)
+        del self._rows[row:row + count]
+        self.endRemoveRows()
+        self.matching_count = max(0, self.matching_count - count)
+        return True
+
+    def remove_rows(self, rows):
+        """Удалить строки по номерам, объединяя соседние строки в диапазоны"""
+        # Удаляем с конца, чтобы номера оставшихся строк не сдвигались
+        ranges = []
+        for row in sorted(set(rows), reverse=True):
+            if ranges and ranges[-1][0] == row + 1:
+                ranges[-1][0] = row
+            else:
+                ranges.append([row, row])
+        for first, last in ranges:
+            self.removeRows(first, last - first + 1)
+
+    # --- доступ к данным для печати, экспорта и удаления ---
+
+    def row_values(self, row: int):
+        """Строка журнала в виде текстов ячеек (как в таблице)"""
+        return format_journal_row(self._rows[row])
+
+    def row_record(self, row: int):
+        """Строка журнала в порядке полей get_weighings"""
+        return self._rows[row]
+
+    def row_id(self, row: int) -> int:
+        """id записи в строке журнала"""
+        return self._rows[row][_ID_INDEX]
@@ -1,20 +1,25 @@
 from PyQt5 import QtWidgets, QtCore, QtGui
 from datetime import datetime as dt
-from database import get_weighings
-import sqlite3
+from time import perf_counter_ns
+from database import count_weighings, get_weighing_position, update_weighing_field
+from journal_model import WeighingsTableModel, JOURNAL_HEADERS
+import metrics
 import logging
 from logger import get_logger
 
 # Настройка логирования для left_panel модуля
 logger = get_logger('left_panel')
 
+# Сколько записей журнала подгружается из базы за один раз при прокрутке
+JOURNAL_PAGE_SIZE = 200
+
 
 class LeftPanelWidget(QtWidgets.QWidget):
     summary_changed = QtCore.pyqtSignal(str)
     def __init__(self, parent=None):
         super().__init__(parent)
         self.current_user = None
-        self.all_weighings = []  # хранит полные данные до фильтрации
+        self.total_count = 0  # общее количество записей пользователя без учета фильтров
         self.is_admin = False  # флаг для определения, является ли пользователь админом
 
         main_layout = QtWidgets.QVBoxLayout(self)
@@ -163,32 +168,25 @@ class LeftPanelWidget(QtWidgets.QWidget):
         table_layout = QtWidgets.QVBoxLayout(self.table_widget)
         table_layout.setContentsMargins(0, 0, 0, 0)
         
-        # Таблица
-        self.table = QtWidgets.QTableWidget()
+        # Таблица: данные подгружаются моделью из базы по мере прокрутки
+        self.model = WeighingsTableModel(page_size=JOURNAL_PAGE_SIZE, parent=self)
+        self.table = QtWidgets.QTableView()
+        self.table.setModel(self.model)
         self.table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
         # Запрещаем редактирование таблицы (будет включено для админа)
         self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
         # Реакция на выделение строк для обновления сводки
-        self.selection_changed_connection = self.table.itemSelectionChanged.connect(self.on_selection_changed)
+        self.selection_changed_connection = self.table.selectionModel().selectionChanged.connect(self.on_selection_changed)
         # Обработчик для сохранения изменений в базе данных (только для админа)
-        self.item_changed_connection = self.table.itemChanged.connect(self.on_item_changed)
+        self.item_changed_connection = self.model.cell_edited.connect(self.on_item_changed)
+        # Сводка обновляется и при подгрузке очередной страницы
+        self.model.rowsInserted.connect(self.on_selection_changed)
+        self.model.rowsRemoved.connect(self.on_selection_changed)
         # Устанавливаем политику размера для полного заполнения блока
         self.table.setSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Expanding)
         table_layout.addWidget(self.table)
 
-        headers = [
-            "Дата/Время",
-            "Масса",
-            "ВЕСЫ№",
-            "Оператор",
-            "Режим взвешивания",
-            "Наименование груза",
-            "Отправитель",
-            "Получатель",
-            "Примечание",
-        ]
-        self.table.setColumnCount(len(headers))
-        self.table.setHorizontalHeaderLabels(headers)
+        headers = JOURNAL_HEADERS
 
         self.table.setStyleSheet("""
             QHeaderView::section {
@@ -199,7 +197,7 @@ class LeftPanelWidget(QtWidgets.QWidget):
                 font-size: 10pt;
                 font-family: Calibri;
             }
-            QTableWidget {
+            QTableView {
                 gridline-color: #d0d0d0;
                 font-family: Calibri;
                 font-size: 11pt;
@@ -209,11 +207,11 @@ class LeftPanelWidget(QtWidgets.QWidget):
                 background-attachment: fixed;
                 background-color: rgba(255, 255, 255, 0.5);
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 4px;
                 background-color: rgba(255, 255, 255, 0.85);
             }
-            QTableWidget::item:selected {
+            QTableView::item:selected {
                 background-color: #0078d4;
                 color: white;
             }
@@ -255,9 +253,6 @@ class LeftPanelWidget(QtWidgets.QWidget):
         # По умолчанию показываем сообщение о необходимости входа
         self.stacked_widget.setCurrentIndex(0)
 
-        # Флаг для предотвращения рекурсии при обновлении таблицы
-        self.updating_table = False
-
     def set_current_user(self, username):
         """Устанавливает текущего пользователя и обновляет отображение"""
         self.current_user = username
@@ -265,6 +260,7 @@ class LeftPanelWidget(QtWidgets.QWidget):
         if username:
             self.stacked_widget.setCurrentIndex(1)  # Показываем таблицу
             # Для админа разрешаем редактирование
+            self.model.editable = self.is_admin
             if self.is_admin:
                 self.table.setEditTriggers(QtWidgets.QAbstractItemView.DoubleClicked | QtWidgets.QAbstractItemView.EditKeyPressed)
             else:
@@ -273,14 +269,16 @@ class LeftPanelWidget(QtWidgets.QWidget):
         else:
             self.stacked_widget.setCurrentIndex(0)  # Показываем сообщение о входе
             self.is_admin = False
+            self.model.editable = False
+            self.model.clear()
 
     def disconnect_signals(self):
         """Отключение сигналов для предотвращения memory leaks"""
         try:
             if hasattr(self, 'selection_changed_connection'):
-                self.table.itemSelectionChanged.disconnect(self.selection_changed_connection)
+                self.table.selectionModel().selectionChanged.disconnect(self.selection_changed_connection)
             if hasattr(self, 'item_changed_connection'):
-                self.table.itemChanged.disconnect(self.item_changed_connection)
+                self.model.cell_edited.disconnect(self.item_changed_connection)
             # Отключаем сигналы фильтров
             if hasattr(self, 'filter_checkbox'):
                 self.filter_checkbox.stateChanged.disconnect()
@@ -302,98 +300,86 @@ class LeftPanelWidget(QtWidgets.QWidget):
     def load_weighings_data(self):
         """Загружает данные взвешиваний из базы данных в таблицу"""
         if not self.current_user:
-            self.table.setRowCount(0)
+            self.model.clear()
             self.summary_changed.emit("Войдите для просмотра записей")
             return
-            
+
         try:
-            self.all_weighings = get_weighings(operator=self.current_user)
+            self.total_count = count_weighings(operator=self.current_user)
             self.apply_filters()
         except Exception as e:
             logger.error(f"Ошибка при загрузке данных взвешиваний: {e}")
             # В случае ошибки показываем пустую таблицу
-            self.table.setRowCount(0)
+            self.model.clear()
             self.summary_changed.emit("Ошибка загрузки данных")
 
     def apply_filters(self):
-        """Применяет фильтры к self.all_weighings и рендерит таблицу"""
-        filtered = list(self.all_weighings)
+        """Перезапрашивает журнал с учетом фильтров (первая страница, остальное - при прокрутке)"""
+        if not self.current_user:
+            return
+
+        started_ns = perf_counter_ns() if metrics.enabled else None
+        try:
+            self.model.set_query(self.current_user, self.get_active_filters())
+        except Exception as e:
+            logger.error(f"Ошибка при фильтрации данных взвешиваний: {e}")
+            return
+        if started_ns is not None:
+            metrics.record(metrics.SOURCE_JOURNAL, metrics.JOURNAL_REFRESH_TIME, perf_counter_ns() - started_ns)
+
+        self.on_selection_changed()
+
+    def get_active_filters(self):
+        """Возвращает активные фильтры журнала в виде аргументов для get_weighings"""
+        filters = {}
 
         # Фильтр по режиму (включается галочкой)
         if self.mode_checkbox.isChecked():
             mode = self.mode_combo.currentText() if hasattr(self, 'mode_combo') else "Все"
             if mode != "Все":
-                filtered = [w for w in filtered if (w[3] or "-") == mode]
+                filters['weighing_mode'] = mode
 
         # Фильтр по дате/времени
         if self.filter_checkbox.isChecked():
-            start_dt = self._get_start_dt()
-            end_dt = self._get_end_dt()
-            def in_range(w):
-                try:
-                    wdt = dt.strptime(w[0], "%d.%m.%Y %H:%M")
-                except Exception:
-                    return False
-                return (wdt >= start_dt) and (wdt <= end_dt)
-            filtered = [w for w in filtered if in_range(w)]
+            filters['date_from'] = self._get_start_dt()
+            filters['date_to'] = self._get_end_dt()
 
         # Фильтр по получателю удален
 
-        self._render_table(filtered, total_all=len(self.all_weighings))
-
-    def _render_table(self, weighings, total_all=None):
-        self.updating_table = True
-        self.table.setRowCount(len(weighings))
-        self.displayed_weighings = weighings  # сохраняем для редактирования
-        headers = [
-            "Дата/Время",
-            "Масса",
-            "ВЕСЫ№",
-            "Оператор",
-            "Режим взвешивания",
-            "Наименование груза",
-            "Отправитель",
-            "Получатель",
-            "Примечание",
-        ]
-        self.table.setColumnCount(len(headers))
-        self.table.setHorizontalHeaderLabels(headers)
-
-        for row_idx, w in enumerate(weighings):
-            datetime_str, weight, operator, weighing_mode, cargo_name, sender, recipient, comment, scales_name = w
-            row_data = [
-                datetime_str,
-                f"{weight} кг",
-                scales_name or "-",
-                operator,
-                weighing_mode,
-                cargo_name,
-                sender,
-                recipient,
-                comment
-            ]
-            for col_idx, item in enumerate(row_data):
-                table_item = QtWidgets.QTableWidgetItem(str(item))
-                self.table.setItem(row_idx, col_idx, table_item)
-
-        self.updating_table = False
-        displayed = len(weighings)
-        total = total_all if total_all is not None else displayed
-        status_text = f"Отображаются записи: {displayed} из {total}, выбрано: 0"
-        self.summary_changed.emit(status_text)
+        return filters
 
-    def on_selection_changed(self):
-        total = self.table.rowCount()
+    def on_selection_changed(self, *args):
         # Подсчитываем уникальные выделенные строки
-        selected_rows = set()
-        for item in self.table.selectedItems():
-            selected_rows.add(item.row())
-        selected_count = len(selected_rows)
+        selected_count = len(self.get_selected_rows())
+        # displayed = все записи, подходящие под фильтр (подгружаются по мере прокрутки)
+        displayed = self.model.matching_count
         # total_all = общее без учета фильтра
-        total_all = len(self.all_weighings) if self.all_weighings is not None else total
-        status_text = f"Отображаются записи: {total} из {total_all}, выбрано: {selected_count}"
+        total_all = self.total_count if self.total_count else displayed
+        status_text = f"Отображаются записи: {displayed} из {total_all}, выбрано: {selected_count}"
         self.summary_changed.emit(status_text)
 
+    def get_selected_rows(self):
+        """Возвращает отсортированные номера выделенных строк таблицы"""
+        selection_model = self.table.selectionModel()
+        if not selection_model:
+            return []
+        return sorted(index.row() for index in selection_model.selectedRows())
+
+    def get_current_row(self):
+        """Первая выделенная строка, иначе текущая строка таблицы (-1, если нет)"""
+        selected_rows = self.get_selected_rows()
+        if selected_rows:
+            return selected_rows[0]
+        return self.table.currentIndex().row()
+
+    def get_row_values(self, row):
+        """Тексты ячеек строки журнала в порядке колонок"""
+        return self.model.row_values(row)
+
+    def get_headers(self):
+        """Заголовки колонок журнала"""
+        return list(JOURNAL_HEADERS)
+
     def _get_start_dt(self) -> dt:
         date = self.date_edit1.date()
         time = self.time_edit1.time()
@@ -411,56 +397,45 @@ class LeftPanelWidget(QtWidgets.QWidget):
         )
 
     def refresh_weighings_data(self):
-        """Обновляет данные в таблице (вызывается при добавлении нового взвешивания)"""
+        """Полностью перечитывает журнал из базы данных"""
         self.load_weighings_data()
 
-    def on_item_changed(self, item):
-        """Обработчик изменения ячейки таблицы (только для админа)"""
-        if not self.is_admin or self.updating_table:
+    def on_weighing_saved(self, weighing_id):
+        """Добавляет в журнал только что сохраненную запись без перезагрузки всей таблицы"""
+        if not self.current_user:
             return
 
-        row = item.row()
-        col = item.column()
-        new_value = item.text()
-
-        # Получаем оригинальные данные для обновления в БД
-        if hasattr(self, 'displayed_weighings') and row < len(self.displayed_weighings):
-            original_row = self.displayed_weighings[row]
-            # original_row: (datetime, weight, operator, weighing_mode, cargo_name, sender, recipient, comment, scales_name)
-
-            # Определяем, какое поле обновляем
-            field_map = {
-                0: 'datetime',
-                1: 'weight',
-                2: 'operator',
-                3: 'weighing_mode',
-                4: 'cargo_name',
-                5: 'sender',
-                6: 'recipient',
-                7: 'comment',
-                8: 'scales_name'
-            }
+        started_ns = perf_counter_ns() if metrics.enabled else None
+        try:
+            result = get_weighing_position(weighing_id, operator=self.current_user, **self.get_active_filters())
+            # Запись не видна текущему пользователю - счетчики не меняются
+            if result is None:
+                return
+            self.total_count += 1
+
+            row, position = result
+            if position is not None:
+                self.model.insert_row(position, row)
+        except Exception as e:
+            logger.error(f"Ошибка при добавлении записи {weighing_id} в журнал: {e}")
+            return
+        if started_ns is not None:
+            metrics.record(metrics.SOURCE_JOURNAL, metrics.JOURNAL_REFRESH_TIME, perf_counter_ns() - started_ns)
 
-            if col in field_map:
-                field = field_map[col]
-                # Получаем ID записи для обновления
-                conn = sqlite3.connect('weights_journal.db')
-                cursor = conn.cursor()
-
-                # Найти ID по оригинальным данным
-                cursor.execute('''
-                    SELECT id FROM weighings
-                    WHERE datetime=? AND weight=? AND operator=?
-                ''', (original_row[0], original_row[1], original_row[2]))
-
-                result = cursor.fetchone()
-                if result:
-                    record_id = result[0]
-                    # Обновляем поле
-                    cursor.execute(f'UPDATE weighings SET {field}=? WHERE id=?', (new_value, record_id))
-                    conn.commit()
-                    logger.info(f"Пользователь '{self.current_user}' (админ) изменил поле {field} записи ID {record_id}: '{new_value}'")
-                else:
-                    logger.warning(f"Пользователь '{self.current_user}' (админ) не смог найти запись для обновления поля {field}")
-
-                conn.close()
+        self.on_selection_changed()
+
+    def on_item_changed(self, weighing_id, field, new_value):
+        """Обработчик изменения ячейки таблицы (только для админа)"""
+        if not self.is_admin:
+            return
+
+        try:
+            updated = update_weighing_field(weighing_id, field, new_value)
+        except ValueError as e:
+            logger.warning(f"Пользователь '{self.current_user}' (админ): изменение поля {field} отклонено: {e}")
+            self.apply_filters()  # Вернуть в таблицу значение из базы
+            return
+        if updated:
+            logger.info(f"Пользователь '{self.current_user}' (админ) изменил поле {field} записи ID {weighing_id}: '{new_value}'")
+        else:
+            logger.warning(f"Пользователь '{self.current_user}' (админ) не смог найти запись для обновления поля {field}")
@@ -1,24 +1,21 @@
 import sqlite3
 from PyQt5 import QtWidgets, QtGui, QtCore
-
-DB_FILE = 'weights_journal.db'
+from database import get_connection
 
 def init_user_table():
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL
-        )
-    ''')
-    # Создаем администратора при первом запуске
-    cursor.execute("SELECT COUNT(*) FROM users WHERE username = ?", ("admin",))
-    if cursor.fetchone()[0] == 0:
-        cursor.execute("INSERT INTO users (username, password) VALUES (?, ?)", ("admin", "admin"))
-    conn.commit()
-    conn.close()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE NOT NULL,
+                password TEXT NOT NULL
+            )
+        ''')
+        # Создаем администратора при первом запуске
+        cursor.execute("SELECT COUNT(*) FROM users WHERE username = ?", ("admin",))
+        if cursor.fetchone()[0] == 0:
+            cursor.execute("INSERT INTO users (username, password) VALUES (?, ?)", ("admin", "admin"))
 
 class LoginDialog(QtWidgets.QDialog):
     def __init__(self, parent=None):
@@ -65,11 +62,9 @@ class LoginDialog(QtWidgets.QDialog):
     def load_users(self):
         """Загружает список пользователей в комбо-бокс"""
         self.username_combo.clear()
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
+        cursor = get_connection().cursor()
         cursor.execute("SELECT username FROM users ORDER BY username")
         users = cursor.fetchall()
-        conn.close()
 
         # Добавляем пользователей в комбо-бокс
         for user in users:
@@ -83,11 +78,9 @@ class LoginDialog(QtWidgets.QDialog):
             QtWidgets.QMessageBox.warning(self, "Ошибка", "Введите имя пользователя и пароль")
             return
 
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
+        cursor = get_connection().cursor()
         cursor.execute("SELECT password FROM users WHERE username=?", (username,))
         row = cursor.fetchone()
-        conn.close()
 
         if row is None:
             QtWidgets.QMessageBox.warning(self, "Ошибка", "Пользователь не найден")
@@ -109,16 +102,12 @@ class LoginDialog(QtWidgets.QDialog):
             QtWidgets.QMessageBox.warning(self, "Ошибка", "Введите имя пользователя и пароль для добавления")
             return
 
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
         try:
-            cursor.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, password))
-            conn.commit()
+            with get_connection() as conn:
+                conn.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, password))
         except sqlite3.IntegrityError:
             QtWidgets.QMessageBox.warning(self, "Ошибка", "Пользователь с таким именем уже существует")
-            conn.close()
             return
-        conn.close()
 
         QtWidgets.QMessageBox.information(self, "Успех", f"Пользователь {username} добавлен")
         # Обновляем список пользователей после добавления нового
@@ -11,7 +11,10 @@ from login_dialog import LoginDialog
 from thermal_printer_manager import ThermalPrinterManager
 from thermal_printer_dialog import ThermalPrinterDialog
 from user_management_dialog import UserManagementDialog
-import csv
+from database import init_db, close_connection, delete_weighings, get_weighings_time_range, format_weighing_timestamp
+from journal_export import JournalExportWorker, available_export_formats
+from report_dialog import ReportDialog
+from diagnostics_dialog import DiagnosticsDialog
 from datetime import datetime
 import license_manager
 from activation_dialog import ActivationDialog
@@ -61,6 +64,17 @@ class WeighingJournal(QtWidgets.QMainWindow):
 
         self.current_user = None
 
+        # Фоновый экспорт журнала
+        self.export_worker = None
+        self.export_progress = None
+
+        # Окно диагностики (немодальное, создается при первом открытии)
+        self.diagnostics_dialog = None
+
+        # Предупреждение о несохраненных автовзвешиваниях (немодальное) и их количество
+        self.write_failed_box = None
+        self.write_failed_count = 0
+
         # Инициализация менеджера термопринтера
         self.printer_manager = ThermalPrinterManager()
 
@@ -75,9 +89,12 @@ class WeighingJournal(QtWidgets.QMainWindow):
         self.header.add_scales_clicked.connect(self.add_new_scales)
         self.header.user_management_clicked.connect(self.open_user_management_dialog)
         self.header.delete_record_clicked.connect(self.on_delete_record)
+        self.header.diagnostics_clicked.connect(self.open_diagnostics_dialog)
 
         # Подключение сигнала сохранения взвешивания к обновлению таблицы
-        self.weighing_saved_connection = self.scales_manager.weighing_saved.connect(self.left_panel.refresh_weighings_data)
+        self.weighing_saved_connection = self.scales_manager.weighing_saved.connect(self.left_panel.on_weighing_saved)
+        # Ошибка записи автовзвешиваний в базу - предупреждение оператору
+        self.write_failed_connection = self.scales_manager.write_failed.connect(self.on_write_failed)
 
         # Связываем сводку и пользователя с футером
         self.summary_changed_connection = self.left_panel.summary_changed.connect(self.footer.set_status_text)
@@ -89,6 +106,31 @@ class WeighingJournal(QtWidgets.QMainWindow):
         self.export_clicked_connection = self.footer.export_clicked.connect(self.on_footer_export)
         self.report_clicked_connection = self.footer.report_clicked.connect(self.on_footer_report)
 
+    def on_write_failed(self, count, error):
+        """Пачку автоматических взвешиваний не удалось сохранить в базу: предупредить оператора.
+
+        Одно немодальное окно на все ошибки: пока оно открыто, в нем растет
+        количество несохраненных записей, а не появляются новые окна.
+        """
+        self.write_failed_count += count
+        text = (f"Не удалось сохранить в журнал автоматических взвешиваний: {self.write_failed_count}.\n"
+                f"Ошибка: {error}\n\n"
+                "Взвешивания остались в файле предзаписи и будут перенесены в журнал "
+                "при следующем запуске программы.")
+        if self.write_failed_box is None:
+            self.write_failed_box = QtWidgets.QMessageBox(QtWidgets.QMessageBox.Warning, "Ошибка записи в журнал",
+                                                          text, QtWidgets.QMessageBox.Ok, self)
+            self.write_failed_box.setModal(False)
+            self.write_failed_box.finished.connect(self._on_write_failed_box_closed)
+        else:
+            self.write_failed_box.setText(text)
+        self.write_failed_box.show()
+        self.write_failed_box.raise_()
+
+    def _on_write_failed_box_closed(self):
+        # Следующая ошибка начнет новый счет
+        self.write_failed_count = 0
+
     def add_new_scales(self):
         """Добавляет новые весы в интерфейс"""
         self.scales_manager.add_scales()
@@ -100,8 +142,7 @@ class WeighingJournal(QtWidgets.QMainWindow):
         import subprocess
 
         # Проверяем, выделена ли ровно 1 строка в таблице
-        table = self.left_panel.table
-        selected_rows = table.selectionModel().selectedRows() if table.selectionModel() else []
+        selected_rows = self.left_panel.get_selected_rows()
 
         if len(selected_rows) != 1:
             QtWidgets.QMessageBox.warning(self, "Ошибка", "Выберите ровно одну строку для формирования акта взвешивания!")
@@ -189,17 +230,12 @@ class WeighingJournal(QtWidgets.QMainWindow):
         painter.drawLine(x + 30, y + 55, w - 30, y + 55)
 
         # Получаем данные из выбранной строки таблицы
-        table = self.left_panel.table
-        selected_rows = table.selectionModel().selectedRows() if table.selectionModel() else []
-        if selected_rows:
-            row_index = selected_rows[0].row()
-        else:
-            current = table.currentRow()
-            row_index = current if current >= 0 else 0
+        current = self.left_panel.get_current_row()
+        row_index = current if current >= 0 else 0
+        row_values = self.left_panel.get_row_values(row_index) if self.left_panel.model.rowCount() else []
 
         def get_table_value(col):
-            item = table.item(row_index, col)
-            return item.text() if item else ""
+            return row_values[col] if col < len(row_values) else ""
 
         # Данные из таблицы
         datetime_val = get_table_value(0)
@@ -258,17 +294,8 @@ class WeighingJournal(QtWidgets.QMainWindow):
         table_y = y + 145
 
         # Получаем заголовки из таблицы, исключая столбец "Режим"
-        table = self.left_panel.table
-        headers = []
-        for i in range(table.columnCount()):
-            header_item = table.horizontalHeaderItem(i)
-            if header_item:
-                header_text = header_item.text()
-                # Пропускаем столбец "Режим"
-                if header_text != "Режим":
-                    headers.append(header_text)
-            else:
-                headers.append(f"Колонка {i+1}")
+        table_headers = self.left_panel.get_headers()
+        headers = [header_text for header_text in table_headers if header_text != "Режим"]
 
         # Ширина колонок динамически
         if headers:
@@ -296,15 +323,6 @@ class WeighingJournal(QtWidgets.QMainWindow):
         startY = table_y + 25
         table_h = 25  # Только одна строка
 
-        # Определяем индекс строки: при наличии выделения берем первую выделенную строку,
-        # иначе используем текущую строку, если нет — 0
-        selected_rows = table.selectionModel().selectedRows() if table.selectionModel() else []
-        if selected_rows:
-            row_index = selected_rows[0].row()
-        else:
-            current = table.currentRow()
-            row_index = current if current >= 0 else 0
-
         # Рисуем строку таблицы
         painter.setFont(font_table)
         row_y = startY
@@ -314,66 +332,94 @@ class WeighingJournal(QtWidgets.QMainWindow):
 
         # Заполняем ячейки данными из выделенной строки, пропуская столбец "Режим"
         header_index = 0
-        for c in range(table.columnCount()):
-            header_item = table.horizontalHeaderItem(c)
-            if header_item and header_item.text() == "Режим":
+        for c, header_text in enumerate(table_headers):
+            if header_text == "Режим":
                 continue  # Пропускаем столбец "Режим"
 
-            item = table.item(row_index, c)
-            cell_text = item.text() if item else ""
+            cell_text = get_table_value(c)
             painter.drawText(col_x[header_index] + 2, row_y, col_widths[header_index] - 4, 25,
                            QtCore.Qt.AlignVCenter | QtCore.Qt.AlignLeft, cell_text)
             header_index += 1
         painter.drawLine(col_x[-1], row_y, col_x[-1], row_y + 25)
     def on_footer_export(self):
-        # Экспорт текущей таблицы в CSV
-        path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Сохранить как", "weighings.csv", "CSV (*.csv)")
+        # Экспорт журнала с текущими фильтрами в файл (в фоновом потоке)
+        if not self.current_user:
+            QtWidgets.QMessageBox.warning(self, "Экспорт", "Войдите для экспорта записей.")
+            return
+        if self.export_worker is not None and self.export_worker.isRunning():
+            QtWidgets.QMessageBox.warning(self, "Экспорт", "Экспорт уже выполняется.")
+            return
+
+        export_formats = available_export_formats()
+        path, selected_filter = QtWidgets.QFileDialog.getSaveFileName(
+            self, "Сохранить как", "weighings.csv",
+            ";;".join(export_format.title for export_format in export_formats.values()))
         if not path:
             return
-        table = self.left_panel.table
-        try:
-            with open(path, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f, delimiter=';')
-                headers = [table.horizontalHeaderItem(i).text() for i in range(table.columnCount())]
-                writer.writerow(headers)
-                for row in range(table.rowCount()):
-                    row_vals = []
-                    for col in range(table.columnCount()):
-                        item = table.item(row, col)
-                        row_vals.append(item.text() if item else '')
-                    writer.writerow(row_vals)
-            logger.info(f"Пользователь '{self.current_user}' экспортировал {table.rowCount()} записей в CSV файл: {path}")
-            QtWidgets.QMessageBox.information(self, "Экспорт", "Данные успешно экспортированы в CSV.")
-        except Exception as e:
-            logger.error(f"Пользователь '{self.current_user}' не смог экспортировать данные в CSV: {e}")
-            QtWidgets.QMessageBox.critical(self, "Ошибка экспорта", str(e))
+
+        # Формат определяется выбранным фильтром, иначе - расширением файла
+        format_name = next((name for name, export_format in export_formats.items()
+                            if export_format.title == selected_filter), None)
+        if format_name is None:
+            format_name = next((name for name, export_format in export_formats.items()
+                                if path.lower().endswith(export_format.extension)), 'csv')
+        if not path.lower().endswith(export_formats[format_name].extension):
+            path += export_formats[format_name].extension
+
+        self.export_worker = JournalExportWorker(path, self.current_user, self.left_panel.get_active_filters(),
+                                                 export_format=format_name)
+
+        self.export_progress = QtWidgets.QProgressDialog("Экспорт записей...", "Отмена", 0, 0, self)
+        self.export_progress.setWindowTitle("Экспорт")
+        self.export_progress.setWindowModality(QtCore.Qt.WindowModal)
+        self.export_progress.setMinimumDuration(500)
+        self.export_progress.canceled.connect(self.export_worker.cancel)
+
+        self.export_worker.progress.connect(self._on_export_progress)
+        self.export_worker.export_finished.connect(self._on_export_finished)
+        self.export_worker.export_cancelled.connect(self._on_export_cancelled)
+        self.export_worker.export_failed.connect(self._on_export_failed)
+        self.export_worker.start()
+
+    def _on_export_progress(self, written, total):
+        if self.export_progress is not None:
+            self.export_progress.setMaximum(max(total, 1))
+            self.export_progress.setValue(min(written, max(total, 1)))
+
+    def _close_export_progress(self):
+        if self.export_progress is not None:
+            self.export_progress.canceled.disconnect()
+            self.export_progress.close()
+            self.export_progress = None
+
+    def _on_export_finished(self, count, path):
+        self._close_export_progress()
+        logger.info(f"Пользователь '{self.current_user}' экспортировал {count} записей в файл: {path}")
+        QtWidgets.QMessageBox.information(self, "Экспорт", f"Данные успешно экспортированы ({count} записей).")
+
+    def _on_export_cancelled(self):
+        self._close_export_progress()
+        logger.info(f"Пользователь '{self.current_user}' отменил экспорт данных")
+
+    def _on_export_failed(self, error):
+        self._close_export_progress()
+        logger.error(f"Пользователь '{self.current_user}' не смог экспортировать данные: {error}")
+        QtWidgets.QMessageBox.critical(self, "Ошибка экспорта", error)
 
     def on_footer_receipt_print(self):
         """Печать чека из выделенной строки"""
-        table = self.left_panel.table
-
         # Получить индекс выделенной строки (или текущей строки)
-        selected_rows = table.selectionModel().selectedRows() if table.selectionModel() else []
-        if selected_rows:
-            row_index = selected_rows[0].row()
-        else:
-            current = table.currentRow()
-            if current < 0:
-                QtWidgets.QMessageBox.warning(self, "Ошибка", "Выберите строку для печати чека!")
-                return
-            row_index = current
+        row_index = self.left_panel.get_current_row()
+        if row_index < 0:
+            QtWidgets.QMessageBox.warning(self, "Ошибка", "Выберите строку для печати чека!")
+            return
 
         # Собрать данные из строки
         receipt_data = {}
-        headers = []
-        for col in range(table.columnCount()):
-            header_item = table.horizontalHeaderItem(col)
-            if header_item:
-                headers.append(header_item.text())
-
-        for col in range(table.columnCount()):
-            item = table.item(row_index, col)
-            value = item.text() if item else ""
+        headers = self.left_panel.get_headers()
+        row_values = self.left_panel.get_row_values(row_index)
+
+        for col, value in enumerate(row_values):
             header = headers[col] if col < len(headers) else f"Колонка_{col}"
 
             # Маппинг заголовков на ключи данных чека
@@ -402,20 +448,20 @@ class WeighingJournal(QtWidgets.QMainWindow):
             QtWidgets.QMessageBox.critical(self, "Ошибка", message)
 
     def on_footer_report(self):
-        # Простой отчет: количество записей и диапазон дат
-        table = self.left_panel.table
-        count = table.rowCount()
-        dates = []
-        for row in range(count):
-            item = table.item(row, 0)
-            if item:
-                dates.append(item.text())
+        # Сводный отчет по журналу с текущими фильтрами (агрегаты считаются в SQL)
+        if not self.current_user:
+            QtWidgets.QMessageBox.warning(self, "Ошибка", "Для формирования отчета необходимо авторизоваться.")
+            return
+        filters = self.left_panel.get_active_filters()
+        count, first_ts, last_ts = get_weighings_time_range(operator=self.current_user, **filters)
         date_range = "-"
-        if dates:
-            first = min(dates)
-            last = max(dates)
+        if first_ts is not None and last_ts is not None:
+            first = format_weighing_timestamp(first_ts)
+            last = format_weighing_timestamp(last_ts)
             date_range = f"{first} — {last}"
-        QtWidgets.QMessageBox.information(self, "Отчет", f"Записей: {count}\nДиапазон дат: {date_range}")
+
+        dialog = ReportDialog(self.current_user, filters, f"Записей: {count}, диапазон дат: {date_range}", self)
+        dialog.exec_()
 
     def open_com_config_dialog(self):
         if not self.current_user:
@@ -436,6 +482,14 @@ class WeighingJournal(QtWidgets.QMainWindow):
         else:
             logger.debug(f"Пользователь '{self.current_user}' отменил настройку термопринтера")
 
+    def open_diagnostics_dialog(self):
+        """Открыть окно метрик производительности (немодальное, одно на приложение)"""
+        if self.diagnostics_dialog is None:
+            self.diagnostics_dialog = DiagnosticsDialog(parent=self)
+        self.diagnostics_dialog.show()
+        self.diagnostics_dialog.raise_()
+        self.diagnostics_dialog.activateWindow()
+
     def open_user_management_dialog(self):
         """Открыть диалог управления пользователями"""
         if self.current_user != "admin":
@@ -456,10 +510,10 @@ class WeighingJournal(QtWidgets.QMainWindow):
             QtWidgets.QMessageBox.warning(self, "Ошибка", "Только администратор может удалять записи.")
             return
 
-        table = self.left_panel.table
+        model = self.left_panel.model
 
         # Получить индексы выделенных строк
-        selected_rows = table.selectionModel().selectedRows() if table.selectionModel() else []
+        selected_rows = self.left_panel.get_selected_rows()
         if not selected_rows:
             QtWidgets.QMessageBox.warning(self, "Ошибка", "Выберите запись для удаления.")
             return
@@ -476,35 +530,15 @@ class WeighingJournal(QtWidgets.QMainWindow):
         )
 
         if reply == QtWidgets.QMessageBox.Yes:
-            # Получить данные для удаления из базы
-            import sqlite3
-            conn = sqlite3.connect('weights_journal.db')
-            cursor = conn.cursor()
-
-            deleted_count = 0
-            for index in sorted(selected_rows, reverse=True):
-                row = index.row()
-                # Получить данные из таблицы для идентификации записи
-                datetime_val = table.item(row, 0).text() if table.item(row, 0) else ""
-                weight_val = table.item(row, 1).text() if table.item(row, 1) else ""
-                operator_val = table.item(row, 3).text() if table.item(row, 3) else ""
-
-                # Удалить из базы данных
-                cursor.execute('''
-                    DELETE FROM weighings
-                    WHERE datetime=? AND weight=? AND operator=?
-                ''', (datetime_val, float(weight_val.replace(' кг', '').replace(',', '.')) if weight_val else 0, operator_val))
-
-                deleted_count += cursor.rowcount
-                # Удалить из таблицы
-                table.removeRow(row)
-
-            conn.commit()
-            conn.close()
+            # Удалить записи по первичному ключу одной транзакцией
+            deleted_count = delete_weighings([model.row_id(row) for row in selected_rows])
+            # Удалить из таблицы
+            model.remove_rows(selected_rows)
 
             logger.info(f"Пользователь '{self.current_user}' (админ) удалил {deleted_count} записей из журнала")
             QtWidgets.QMessageBox.information(self, "Успех", f"Удалено {deleted_count} запись(ей).")
             # Обновить сводку
+            self.left_panel.total_count = max(0, self.left_panel.total_count - deleted_count)
             self.left_panel.on_selection_changed()
 
     def open_login_dialog(self):
@@ -562,6 +596,16 @@ class WeighingJournal(QtWidgets.QMainWindow):
                     self._disconnect_all_signals()
                 except Exception as e:
                     logger.error(f"Ошибка при отключении сигналов при закрытии: {e}")
+                # Прерываем незавершенный экспорт
+                if self.export_worker is not None and self.export_worker.isRunning():
+                    self.export_worker.cancel()
+                    self.export_worker.wait()
+                # Закрываем порты весов и поток их чтения
+                self.scales_manager.stop_reading()
+                # Дописываем очередь автоматических взвешиваний
+                self.scales_manager.stop_writer()
+                # Закрываем постоянное соединение с базой данных GUI-потока
+                close_connection()
                 a0.accept()  # Закрываем приложение
             else:
                 a0.ignore()  # Игнорируем событие закрытия
@@ -581,10 +625,13 @@ class WeighingJournal(QtWidgets.QMainWindow):
                 self.header.add_scales_clicked.disconnect()
                 self.header.user_management_clicked.disconnect()
                 self.header.delete_record_clicked.disconnect()
+                self.header.diagnostics_clicked.disconnect()
 
             # Отключаем сигналы из scales_manager
             if hasattr(self, 'weighing_saved_connection'):
                 self.scales_manager.weighing_saved.disconnect(self.weighing_saved_connection)
+            if hasattr(self, 'write_failed_connection'):
+                self.scales_manager.write_failed.disconnect(self.write_failed_connection)
 
             # Отключаем сигналы из left_panel
             if hasattr(self, 'summary_changed_connection'):
@@ -613,6 +660,8 @@ class WeighingJournal(QtWidgets.QMainWindow):
 
 
 if __name__ == "__main__":
+    # Создание и миграция базы - один раз при запуске приложения (импорт database базу не открывает)
+    init_db()
     app = QtWidgets.QApplication(sys.argv)
     window = WeighingJournal()
     window.show()
@@ -0,0 +1,197 @@
+import json
+import math
+import threading
+import time
+import logging
+from array import array
+from datetime import datetime
+from logger import get_logger
+
+# Настройка логирования для metrics модуля
+logger = get_logger('metrics')
+
+# Сбор метрик горячего пути. Пока он выключен, точки замера проверяют
+# только этот флаг и не вызывают часы, поэтому накладные расходы почти нулевые
+enabled = False
+
+# Метрики (ключ - название для диалога диагностики)
+FRAME_INTERVAL = 'frame_interval'        # Интервал между кадрами весов
+PARSE_TIME = 'parse_time'                # Разбор одного кадра
+DISPLAY_LATENCY = 'display_latency'      # От поступления кадра до обновления индикатора веса
+SAVE_LATENCY = 'save_latency'            # От выполнения условия автосохранения до фиксации записи в базе
+DB_COMMIT_TIME = 'db_commit_time'        # Транзакция сохранения взвешиваний
+JOURNAL_REFRESH_TIME = 'journal_refresh_time'  # Обновление таблицы журнала
+
+METRIC_TITLES = {
+    FRAME_INTERVAL: "Интервал кадров",
+    PARSE_TIME: "Разбор кадра",
+    DISPLAY_LATENCY: "Кадр -> индикатор",
+    SAVE_LATENCY: "Стабильность -> запись в базу",
+    DB_COMMIT_TIME: "Запись в базу",
+    JOURNAL_REFRESH_TIME: "Обновление журнала",
+}
+
+# Источники метрик, не относящиеся к конкретным весам
+SOURCE_DATABASE = "База данных"
+SOURCE_JOURNAL = "Журнал"
+
+# Гистограмма: логарифмические корзины от 1 мкс до ~17 мин, по 8 корзин на удвоение
+_HISTOGRAM_MIN_NS = 1000
+_BUCKETS_PER_DOUBLING = 8
+_BUCKET_COUNT = 30 * _BUCKETS_PER_DOUBLING
+
+
+class LatencyHistogram:
+    """Гистограмма длительностей с логарифмическими корзинами (погрешность процентилей ~9%).
+
+    Память постоянна (array('q') на 240 корзин), запись значения - O(1).
+    """
+
+    def __init__(self):
+        self.buckets = array('q', bytes(8 * _BUCKET_COUNT))
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns = None
+        self.max_ns = 0
+        self.first_time = None  # Время первой и последней записи (monotonic), для частоты
+        self.last_time = None
+
+    def record(self, value_ns: int, now: float = None):
+        if value_ns < 0:
+            value_ns = 0
+        if value_ns < _HISTOGRAM_MIN_NS:
+            index = 0
+        else:
+            index = min(int(math.log2(value_ns / _HISTOGRAM_MIN_NS) * _BUCKETS_PER_DOUBLING) + 1,
+                        _BUCKET_COUNT - 1)
+        self.buckets[index] += 1
+        self.count += 1
+        self.total_ns += value_ns
+        if self.min_ns is None or value_ns < self.min_ns:
+            self.min_ns = value_ns
+        if value_ns > self.max_ns:
+            self.max_ns = value_ns
+        if now is None:
+            now = time.monotonic()
+        if self.first_time is None:
+            self.first_time = now
+        self.last_time = now
+
+    @staticmethod
+    def _bucket_upper_ns(index: int) -> float:
+        if index == 0:
+            return _HISTOGRAM_MIN_NS
+        return _HISTOGRAM_MIN_NS * 2 ** (index / _BUCKETS_PER_DOUBLING)
+
+    def percentile(self, percent: float) -> float:
+        """Процентиль в нс (верхняя граница корзины, не больше максимума)"""
+        if not self.count:
+            return 0.0
+        target = max(1, math.ceil(self.count * percent / 100))
+        seen = 0
+        for index, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen >= target:
+                return min(self._bucket_upper_ns(index), self.max_ns)
+        return float(self.max_ns)
+
+    @property
+    def mean_ns(self) -> float:
+        return self.total_ns / self.count if self.count else 0.0
+
+    @property
+    def rate(self) -> float:
+        """Средняя частота записей в секунду"""
+        if self.count < 2 or self.last_time == self.first_time:
+            return 0.0
+        return (self.count - 1) / (self.last_time - self.first_time)
+
+    def summary(self) -> dict:
+        return {
+            'count': self.count,
+            'rate': self.rate,
+            'mean_ms': self.mean_ns / 1e6,
+            'p50_ms': self.percentile(50) / 1e6,
+            'p95_ms': self.percentile(95) / 1e6,
+            'p99_ms': self.percentile(99) / 1e6,
+            'min_ms': (self.min_ns or 0) / 1e6,
+            'max_ms': self.max_ns / 1e6,
+        }
+
+
+_lock = threading.Lock()
+_histograms = {}       # (источник, метрика) -> LatencyHistogram
+_last_frame_ns = {}    # источник -> время последнего кадра, для интервала кадров
+_started = None
+
+
+def set_enabled(value: bool):
+    """Включить/выключить сбор метрик"""
+    global enabled, _started
+    if value and not enabled:
+        _started = datetime.now()
+        logger.info("Сбор метрик производительности включен")
+    elif not value and enabled:
+        logger.info("Сбор метрик производительности выключен")
+    enabled = bool(value)
+
+
+def is_enabled() -> bool:
+    return enabled
+
+
+def reset():
+    """Очистить все собранные метрики"""
+    global _started
+    with _lock:
+        _histograms.clear()
+        _last_frame_ns.clear()
+    _started = datetime.now() if enabled else None
+
+
+def record(source: str, metric: str, value_ns: int):
+    """Записать длительность в нс (вызывать только при включенном сборе: if metrics.enabled)"""
+    with _lock:
+        histogram = _histograms.get((source, metric))
+        if histogram is None:
+            histogram = _histograms[(source, metric)] = LatencyHistogram()
+        histogram.record(value_ns)
+
+
+def record_frames(source: str, timestamps_ns):
+    """Записать интервалы между кадрами весов по их меткам времени (monotonic_ns)"""
+    with _lock:
+        histogram = _histograms.get((source, FRAME_INTERVAL))
+        if histogram is None:
+            histogram = _histograms[(source, FRAME_INTERVAL)] = LatencyHistogram()
+        previous = _last_frame_ns.get(source)
+        for timestamp_ns in timestamps_ns:
+            if previous is not None:
+                histogram.record(timestamp_ns - previous, timestamp_ns / 1e9)
+            previous = timestamp_ns
+        _last_frame_ns[source] = previous
+
+
+def snapshot() -> list:
+    """Сводка по всем метрикам: список словарей (источник, метрика, count, процентили в мс)"""
+    with _lock:
+        items = sorted(_histograms.items())
+        rows = []
+        for (source, metric), histogram in items:
+            row = {'source': source, 'metric': metric}
+            row.update(histogram.summary())
+            rows.append(row)
+    return rows
+
+
+def dump(path: str):
+    """Сохранить сводку метрик в файл (JSON)"""
+    data = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'collecting_since': _started.isoformat(timespec='seconds') if _started else None,
+        'enabled': enabled,
+        'metrics': snapshot(),
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    logger.info(f"Метрики производительности сохранены в файл: {path}")
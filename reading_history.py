@@ -0,0 +1,107 @@
+import time
+from array import array
+from typing import Iterable, List, Optional, Tuple
+
+# История показаний весов по умолчанию: последние 5 минут
+# при частоте кадров до 50 Гц (память не зависит от времени работы)
+HISTORY_DURATION_S = 300
+HISTORY_MAX_FRAME_RATE = 50
+
+
+class ReadingHistory:
+    """Кольцевой буфер последних показаний одних весов с метками времени.
+
+    Вес хранится в array('d'), время поступления кадра (time.monotonic_ns) -
+    в array('q'), поэтому память ограничена capacity * 16 байт независимо
+    от времени работы. Кадры старше duration_s в выборки не попадают,
+    даже если буфер еще не перезаписал их. Буфер заполняется и читается
+    из GUI-потока.
+    """
+
+    def __init__(self, duration_s: float = HISTORY_DURATION_S, max_frame_rate: int = HISTORY_MAX_FRAME_RATE,
+                 capacity: Optional[int] = None):
+        if capacity is None:
+            capacity = int(duration_s * max_frame_rate)
+        if capacity < 1:
+            raise ValueError("Размер истории показаний должен быть не меньше 1")
+        self.duration_s = duration_s
+        self.capacity = capacity
+        self._values = array('d', bytes(8 * capacity))
+        self._timestamps = array('q', bytes(8 * capacity))
+        self._count = 0  # Всего добавлено кадров с момента очистки
+
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
+
+    @property
+    def total_count(self) -> int:
+        """Сколько кадров добавлено с момента очистки (растет, даже когда буфер полон)"""
+        return self._count
+
+    def clear(self):
+        self._count = 0
+
+    def append(self, value: float, timestamp_ns: Optional[int] = None):
+        """Добавить показание (без метки времени берется текущее time.monotonic_ns())"""
+        if timestamp_ns is None:
+            timestamp_ns = time.monotonic_ns()
+        slot = self._count % self.capacity
+        self._values[slot] = value
+        self._timestamps[slot] = timestamp_ns
+        self._count += 1
+
+    def extend(self, readings: Iterable):
+        """Добавить кадры WeightReading (кадры без метки времени получают текущее время)"""
+        for reading in readings:
+            self.append(reading.value, reading.timestamp_ns)
+
+    def last(self) -> Optional[Tuple[int, float]]:
+        """Последнее показание (время, вес) или None"""
+        if not self._count:
+            return None
+        slot = (self._count - 1) % self.capacity
+        return self._timestamps[slot], self._values[slot]
+
+    def _first_index_since(self, since_ns: int) -> int:
+        """Логический индекс первого кадра не старше since_ns (метки времени не убывают)"""
+        low = self._count - len(self)
+        high = self._count
+        timestamps = self._timestamps
+        capacity = self.capacity
+        while low < high:
+            middle = (low + high) // 2
+            if timestamps[middle % capacity] < since_ns:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def since(self, since_ns: int) -> Tuple[List[int], List[float]]:
+        """Показания не старше since_ns: (метки времени, веса) в порядке поступления"""
+        start = self._first_index_since(since_ns)
+        end = self._count
+        if start >= end:
+            return [], []
+        capacity = self.capacity
+        first = start % capacity
+        last = (end - 1) % capacity + 1
+        if first < last:
+            return self._timestamps[first:last].tolist(), self._values[first:last].tolist()
+        # Выборка переходит через конец кольцевого буфера
+        return ((self._timestamps[first:] + self._timestamps[:last]).tolist(),
+                (self._values[first:] + self._values[:last]).tolist())
+
+    def window(self, seconds: Optional[float] = None, now_ns: Optional[int] = None) -> Tuple[List[int], List[float]]:
+        """Показания за последние seconds секунд (по умолчанию - за всю длительность истории)"""
+        if seconds is None:
+            seconds = self.duration_s
+        if now_ns is None:
+            now_ns = time.monotonic_ns()
+        return self.since(now_ns - int(seconds * 1_000_000_000))
+
+    def min_max(self, seconds: float, now_ns: Optional[int] = None) -> Optional[Tuple[float, float]]:
+        """Минимальный и максимальный вес за последние seconds секунд или None, если кадров нет"""
+        _, values = self.window(seconds, now_ns)
+        if not values:
+            return None
+        return min(values), max(values)
@@ -0,0 +1,176 @@
+import logging
+from PyQt5 import QtWidgets, QtCore
+from report_engine import (REPORT_GROUPINGS, ReportWorker, report_headers, format_report_row,
+                           format_report_total, write_report_csv, write_report_pdf)
+from logger import get_logger
+
+# Настройка логирования для report_dialog модуля
+logger = get_logger('report_dialog')
+
+
+class ReportDialog(QtWidgets.QDialog):
+    """Диалог сводного отчета по журналу с группировками и сохранением в PDF/CSV"""
+
+    def __init__(self, operator, filters=None, period_text="", parent=None):
+        super().__init__(parent)
+        # Диалог создается на каждое открытие отчета - удаляем его вместе с потоком расчета
+        self.setAttribute(QtCore.Qt.WA_DeleteOnClose)
+        self.setWindowTitle("Отчет")
+        self.resize(800, 500)
+
+        self.operator = operator
+        self.filters = dict(filters or {})
+        self.period_text = period_text
+        self.report = None
+        self.worker = None
+
+        layout = QtWidgets.QVBoxLayout(self)
+
+        # Период и фильтры берутся из журнала
+        self.period_label = QtWidgets.QLabel(period_text)
+        layout.addWidget(self.period_label)
+
+        # Группировки
+        groupings_box = QtWidgets.QGroupBox("Группировать по")
+        groupings_layout = QtWidgets.QHBoxLayout(groupings_box)
+        self.grouping_checkboxes = {}
+        for key, title in REPORT_GROUPINGS.items():
+            checkbox = QtWidgets.QCheckBox(title)
+            checkbox.setChecked(key == 'day')
+            groupings_layout.addWidget(checkbox)
+            self.grouping_checkboxes[key] = checkbox
+        layout.addWidget(groupings_box)
+
+        # Таблица результатов
+        self.table = QtWidgets.QTableWidget()
+        self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.verticalHeader().setVisible(False)
+        layout.addWidget(self.table)
+
+        # Кнопки
+        buttons_layout = QtWidgets.QHBoxLayout()
+        self.build_button = QtWidgets.QPushButton("Сформировать")
+        self.build_button.clicked.connect(self.build_report)
+        buttons_layout.addWidget(self.build_button)
+
+        self.pdf_button = QtWidgets.QPushButton("Сохранить PDF")
+        self.pdf_button.clicked.connect(self.save_pdf)
+        buttons_layout.addWidget(self.pdf_button)
+
+        self.csv_button = QtWidgets.QPushButton("Сохранить CSV")
+        self.csv_button.clicked.connect(self.save_csv)
+        buttons_layout.addWidget(self.csv_button)
+
+        buttons_layout.addStretch()
+
+        self.close_button = QtWidgets.QPushButton("Закрыть")
+        self.close_button.clicked.connect(self.close)
+        buttons_layout.addWidget(self.close_button)
+
+        layout.addLayout(buttons_layout)
+
+        self._set_busy(False)
+        self.build_report()
+
+    def selected_groupings(self):
+        """Выбранные группировки в порядке отображения"""
+        return [key for key, checkbox in self.grouping_checkboxes.items() if checkbox.isChecked()]
+
+    def _set_busy(self, busy):
+        self.build_button.setEnabled(not busy)
+        self.pdf_button.setEnabled(not busy and self.report is not None)
+        self.csv_button.setEnabled(not busy and self.report is not None)
+        if busy:
+            self.build_button.setText("Формирование...")
+        else:
+            self.build_button.setText("Сформировать")
+
+    def build_report(self):
+        """Запускает расчет отчета в фоновом потоке"""
+        if self.worker is not None and self.worker.isRunning():
+            return
+
+        if self.worker is not None:
+            self.worker.deleteLater()
+        # Поток - дочерний объект диалога и удаляется вместе с ним
+        self.worker = ReportWorker(self.selected_groupings(), self.operator, self.filters, parent=self)
+        self.worker.report_ready.connect(self.on_report_ready)
+        self.worker.report_failed.connect(self.on_report_failed)
+        self._set_busy(True)
+        self.worker.start()
+
+    def on_report_ready(self, report):
+        self.report = report
+        self._set_busy(False)
+
+        headers = report_headers(report)
+        group_count = len(report.group_by)
+        table_rows = [format_report_row(row, group_count) for row in report.rows]
+        table_rows.append(format_report_total(report))
+
+        self.table.clear()
+        self.table.setColumnCount(len(headers))
+        self.table.setHorizontalHeaderLabels(headers)
+        self.table.setRowCount(len(table_rows))
+        for row, cells in enumerate(table_rows):
+            for col, text in enumerate(cells):
+                self.table.setItem(row, col, QtWidgets.QTableWidgetItem(text))
+
+        # Итоговая строка выделяется жирным шрифтом
+        total_row = len(table_rows) - 1
+        for col in range(len(headers)):
+            item = self.table.item(total_row, col)
+            font = item.font()
+            font.setBold(True)
+            item.setFont(font)
+
+        self.table.resizeColumnsToContents()
+
+    def on_report_failed(self, error):
+        self._set_busy(False)
+        QtWidgets.QMessageBox.critical(self, "Ошибка отчета", error)
+
+    def save_pdf(self):
+        if self.report is None:
+            return
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Сохранить отчет", "report.pdf", "PDF (*.pdf)")
+        if not path:
+            return
+        try:
+            write_report_pdf(path, self.report, subtitle=self.period_text)
+            logger.info(f"Пользователь '{self.operator}' сохранил отчет в PDF файл: {path}")
+            QtWidgets.QMessageBox.information(self, "Отчет", f"Отчет сохранен: {path}")
+        except Exception as e:
+            logger.error(f"Пользователь '{self.operator}' не смог сохранить отчет в PDF: {e}")
+            QtWidgets.QMessageBox.critical(self, "Ошибка", str(e))
+
+    def save_csv(self):
+        if self.report is None:
+            return
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(self, "Сохранить отчет", "report.csv", "CSV (*.csv)")
+        if not path:
+            return
+        try:
+            write_report_csv(path, self.report)
+            logger.info(f"Пользователь '{self.operator}' сохранил отчет в CSV файл: {path}")
+            QtWidgets.QMessageBox.information(self, "Отчет", f"Отчет сохранен: {path}")
+        except Exception as e:
+            logger.error(f"Пользователь '{self.operator}' не смог сохранить отчет в CSV: {e}")
+            QtWidgets.QMessageBox.critical(self, "Ошибка", str(e))
+
+    def _stop_worker(self):
+        """Прервать расчет и дождаться потока, чтобы он не пережил диалог"""
+        if self.worker is not None and self.worker.isRunning():
+            self.worker.cancel()
+            self.worker.wait()
+
+    def reject(self):
+        # Esc только скрывает диалог, минуя closeEvent
+        self._stop_worker()
+        super().reject()
+
+    def closeEvent(self, event):
+        self._stop_worker()
+        super().closeEvent(event)
@@ -0,0 +1,178 @@
+import csv
+import sqlite3
+import logging
+from collections import namedtuple
+from PyQt5 import QtCore, QtGui
+from PyQt5 import QtPrintSupport
+from database import aggregate_weighings, get_connection, close_connection
+from logger import get_logger
+
+# Настройка логирования для report_engine модуля
+logger = get_logger('report_engine')
+
+# Названия группировок отчета (ключи совпадают с WEIGHING_GROUPINGS в database)
+REPORT_GROUPINGS = {
+    'day': "День",
+    'shift': "Смена",
+    'operator': "Оператор",
+    'scales': "Весы",
+    'cargo': "Груз",
+    'sender': "Отправитель",
+    'recipient': "Получатель",
+}
+
+# Колонки показателей, которые считаются для каждой группы
+REPORT_METRIC_HEADERS = ["Взвешиваний", "Общая масса, кг", "Средняя масса, кг", "Мин. масса, кг", "Макс. масса, кг"]
+
+# Результат отчета: группировки, строки (значения группировок + показатели), итог по всем группам
+WeighingReport = namedtuple('WeighingReport', 'group_by rows total filters')
+
+
+def build_report(group_by, operator, filters=None):
+    """Сформировать отчет: агрегаты считаются в SQL (GROUP BY), итог - отдельным запросом"""
+    filters = dict(filters or {})
+    rows = aggregate_weighings(group_by, operator=operator, **filters) if group_by else []
+    total = aggregate_weighings((), operator=operator, **filters)[0]
+    return WeighingReport(tuple(group_by), rows, total, filters)
+
+
+def report_headers(report):
+    """Заголовки колонок отчета"""
+    return [REPORT_GROUPINGS[key] for key in report.group_by] + REPORT_METRIC_HEADERS
+
+
+def _format_weight(value):
+    return "-" if value is None else f"{value:.2f}"
+
+
+def format_report_row(row, group_count):
+    """Строка отчета в виде текстов ячеек"""
+    groups = ["-" if value is None else str(value) for value in row[:group_count]]
+    count = row[group_count]
+    return groups + [str(count)] + [_format_weight(value) for value in row[group_count + 1:]]
+
+
+def format_report_total(report):
+    """Итоговая строка отчета в виде текстов ячеек"""
+    labels = ["Итого"] + [""] * (len(report.group_by) - 1) if report.group_by else []
+    return labels + format_report_row(report.total, 0)
+
+
+def write_report_csv(path, report):
+    """Сохранить отчет в CSV (разделитель ';', как у экспорта журнала)"""
+    group_count = len(report.group_by)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(report_headers(report))
+        writer.writerows(format_report_row(row, group_count) for row in report.rows)
+        writer.writerow(format_report_total(report))
+
+
+def write_report_pdf(path, report, title="Отчет по взвешиваниям", subtitle=""):
+    """Сохранить отчет в PDF (A4, таблица с переносом на следующие страницы)"""
+    printer = QtPrintSupport.QPrinter()
+    printer.setOutputFormat(QtPrintSupport.QPrinter.PdfFormat)
+    printer.setOutputFileName(path)
+    printer.setPageSize(QtPrintSupport.QPrinter.A4)
+    printer.setPageMargins(10, 10, 10, 10, QtPrintSupport.QPrinter.Millimeter)
+
+    painter = QtGui.QPainter(printer)
+    try:
+        _draw_report(painter, printer, report, title, subtitle)
+    finally:
+        painter.end()
+
+
+def _draw_report(painter, printer, report, title, subtitle):
+    page = printer.pageRect()
+    width = page.width()
+    height = page.height()
+
+    headers = report_headers(report)
+    group_count = len(report.group_by)
+    table_rows = [format_report_row(row, group_count) for row in report.rows]
+    table_rows.append(format_report_total(report))
+
+    font_title = QtGui.QFont("Arial", 14, QtGui.QFont.Bold)
+    font_text = QtGui.QFont("Arial", 9)
+    font_header = QtGui.QFont("Arial", 9, QtGui.QFont.Bold)
+
+    # Высота строки и ширина колонок в единицах устройства печати
+    painter.setFont(font_text)
+    row_height = int(painter.fontMetrics().height() * 1.6)
+    col_width = width // max(len(headers), 1)
+    align = QtCore.Qt.AlignVCenter | QtCore.Qt.AlignLeft
+
+    def draw_row(y, cells, font, fill=None):
+        painter.setFont(font)
+        if fill is not None:
+            painter.fillRect(0, y, col_width * len(cells), row_height, fill)
+        for i, text in enumerate(cells):
+            rect = QtCore.QRect(i * col_width, y, col_width, row_height)
+            painter.drawRect(rect)
+            painter.drawText(rect.adjusted(4, 0, -4, 0), align, text)
+
+    painter.setFont(font_title)
+    y = 0
+    painter.drawText(0, y, width, row_height * 2, QtCore.Qt.AlignCenter, title)
+    y += row_height * 2
+    if subtitle:
+        painter.setFont(font_text)
+        painter.drawText(0, y, width, row_height, QtCore.Qt.AlignCenter, subtitle)
+        y += row_height
+
+    draw_row(y, headers, font_header, QtGui.QColor("#f0f0f0"))
+    y += row_height
+    for index, cells in enumerate(table_rows):
+        if y + row_height > height:
+            printer.newPage()
+            y = 0
+            draw_row(y, headers, font_header, QtGui.QColor("#f0f0f0"))
+            y += row_height
+        is_total = index == len(table_rows) - 1
+        draw_row(y, cells, font_header if is_total else font_text)
+        y += row_height
+
+
+class ReportWorker(QtCore.QThread):
+    """Расчет отчета в фоновом потоке, чтобы запросы по всему журналу не блокировали окно"""
+
+    # Отчет готов: WeighingReport
+    report_ready = QtCore.pyqtSignal(object)
+    # Ошибка расчета: текст ошибки
+    report_failed = QtCore.pyqtSignal(str)
+
+    def __init__(self, group_by, operator, filters=None, parent=None):
+        super().__init__(parent)
+        self.group_by = tuple(group_by)
+        self.operator = operator
+        self.filters = dict(filters or {})
+        self._connection = None  # Соединение потока расчета (для прерывания запроса)
+
+    def run(self):
+        try:
+            self._connection = get_connection()
+            report = build_report(self.group_by, self.operator, self.filters)
+            if not self.isInterruptionRequested():
+                self.report_ready.emit(report)
+        except Exception as e:
+            if self.isInterruptionRequested():
+                logger.info("Формирование отчета отменено")
+            else:
+                logger.error(f"Ошибка при формировании отчета: {e}")
+                self.report_failed.emit(str(e))
+        finally:
+            # Соединение с базой данных принадлежит этому потоку
+            self._connection = None
+            close_connection()
+
+    def cancel(self):
+        """Прервать расчет: выполняемый запрос прерывается, результат не отправляется"""
+        self.requestInterruption()
+        connection = self._connection
+        if connection is not None:
+            try:
+                connection.interrupt()
+            except sqlite3.Error:
+                # Поток уже закрыл соединение
+                pass
@@ -1,26 +1,33 @@
-import sqlite3
 import time
 import logging
 from datetime import datetime
 from PyQt5 import QtWidgets, QtCore, QtGui
 from weight_display_controller import WeightDisplayController
 from weight_reader import WeightReader
+from serial_multiplexer import SerialMultiplexer
+from connection_supervisor import (ConnectionSupervisor, CONNECTION_STATE_TITLES, STATE_CONNECTED, STATE_NO_DATA,
+                                   STATE_RECONNECTING)
+from weight_trend_widget import WeightTrendWidget
+from reading_history import ReadingHistory
 from auto_weighing_engine import AutoWeighingEngine
-from weighing_service import WeighingService
+from stability_detector import (DEFAULT_WINDOW_SIZE, DEFAULT_MIN_SAMPLES, DEFAULT_DIVISION,
+                                DEFAULT_TOLERANCE_DIVISIONS)
+from weighing_service import WeighingService, SAVE_QUEUED
+from database import get_connection
+import metrics
 from logger import get_logger
 
 # Настройка логирования для right_panel модуля
 logger = get_logger('right_panel')
 
-DB_FILE = 'weights_journal.db'
-
 class RightPanelWidget(QtWidgets.QWidget):
     # Сигнал для уведомления о новом взвешивании
-    weighing_saved = QtCore.pyqtSignal()
+    weighing_saved = QtCore.pyqtSignal(int)  # id сохраненной записи
     # Сигнал для удаления блока весов
     delete_requested = QtCore.pyqtSignal()
 
-    def __init__(self, font_family="Arial", parent=None, current_user=None, scales_number=1, show_info_block=True):
+    def __init__(self, font_family="Arial", parent=None, current_user=None, scales_number=1, show_info_block=True,
+                 weighing_writer=None, weighing_spool=None, serial_multiplexer=None):
         super().__init__(parent)
         self.current_user = current_user
         self.serial_port = None
@@ -34,16 +41,20 @@ class RightPanelWidget(QtWidgets.QWidget):
 
         # Инициализируем компоненты
         self.weight_reader = WeightReader()
-        self.auto_weighing_engine = AutoWeighingEngine(user=self.current_user, scales_name=self.current_config_name)
-        self.weighing_service = WeighingService()
-
-        # Оптимизация обновления интерфейса
-        self.last_ui_update = 0.0
-        self.ui_update_interval = 100  # Обновляем интерфейс раз в 100мс для баланса производительности
-
-        # Оптимизация автоматического взвешивания
-        self.last_auto_weigh_call = 0.0
-        self.auto_weigh_interval = 100  # Интервал вызовов автоматического взвешивания (мс) для более быстрой реакции
+        # Порт читает общий для всех весов поток мультиплексора (без менеджера весов - свой)
+        self._owns_multiplexer = serial_multiplexer is None
+        self.serial_multiplexer = serial_multiplexer or SerialMultiplexer(parent=self)
+        # Подключение к весам под надзором: переподключение после ошибок порта
+        self.connection_supervisor = ConnectionSupervisor(self.weight_reader, self.serial_multiplexer, parent=self)
+        # История последних показаний весов (для графика и движка автовзвешивания)
+        self.reading_history = ReadingHistory()
+        self.auto_weighing_engine = AutoWeighingEngine(user=self.current_user, scales_name=self.current_config_name,
+                                                       writer=weighing_writer, history=self.reading_history)
+        # Метрики производительности собираются по номеру весов
+        self.metrics_source = f"Весы№{scales_number}"
+        self.weight_reader.metrics_source = self.metrics_source
+        self.auto_weighing_engine.metrics_source = self.metrics_source
+        self.weighing_service = WeighingService(spool=weighing_spool, writer=weighing_writer)
 
         # Флаг потери соединения
         self.connection_lost = False
@@ -242,6 +253,11 @@ class RightPanelWidget(QtWidgets.QWidget):
         # Добавляем объединенный блок в основной layout
         main_layout.addWidget(self.weight_block)
 
+        # График веса за последнюю минуту
+        self.weight_trend = WeightTrendWidget(self.reading_history)
+        self.weight_trend.setToolTip("Вес за последнюю минуту")
+        main_layout.addWidget(self.weight_trend)
+
         # Горизонтальный блок с кнопкой "Сохранить вес" слева и автоматическим взвешиванием справа
         control_block = QtWidgets.QWidget()
         control_layout = QtWidgets.QHBoxLayout(control_block)
@@ -290,6 +306,12 @@ class RightPanelWidget(QtWidgets.QWidget):
         self.receipt_checkbox = QtWidgets.QCheckBox("Чекопечать")
         checkbox_layout.addWidget(self.receipt_checkbox)
 
+        self.scale_stability_checkbox = QtWidgets.QCheckBox("Стабильность от весов")
+        self.scale_stability_checkbox.setToolTip(
+            "Сохранять вес сразу по признаку стабильности ST от весов (протокол 2),\n"
+            "без ожидания интервала стабилизации")
+        checkbox_layout.addWidget(self.scale_stability_checkbox)
+
         interval_label = QtWidgets.QLabel("Интервал стабилизации в сек:")
         checkbox_layout.addWidget(interval_label)
 
@@ -397,17 +419,19 @@ class RightPanelWidget(QtWidgets.QWidget):
 
         layout.addStretch()
 
-        # Таймер для чтения и эмуляции веса с обновлением информации
-        self.timer = QtCore.QTimer(self)
-        self.timer.timeout.connect(self.read_or_simulate_weight)
-        self.timer.start(100)  # Уменьшаем интервал до 50мс для более быстрого чтения данных
+        # Своего таймера у панели нет: информационный блок, график и проверку молчания весов
+        # обновляет общий таймер ScalesManager (refresh_ui), чтение порта идет в SerialMultiplexer
 
         # Сохраняем ссылки на соединения сигналов для последующего отключения
         self.connect_button_connection = self.connect_button.clicked.connect(self.on_connect_clicked)
         self.disconnect_button_connection = self.disconnect_button.clicked.connect(self.on_disconnect_clicked)
         self.save_weight_button_connection = self.save_weight_button.clicked.connect(self.on_save_weight_clicked)
         self.auto_weight_checkbox_connection = self.auto_weight_checkbox.stateChanged.connect(self.on_auto_weighing_toggled)
-        self.timer_connection = self.timer.timeout.connect(self.read_or_simulate_weight)
+        self.scale_stability_checkbox_connection = self.scale_stability_checkbox.stateChanged.connect(
+            self.on_scale_stability_toggled)
+        self.readings_connection = self.connection_supervisor.readings_received.connect(self.on_readings_received)
+        self.connection_state_connection = self.connection_supervisor.state_changed.connect(
+            self.on_connection_state_changed)
 
         self.load_configurations_into_combo()
         self.update_info_display()
@@ -463,14 +487,21 @@ class RightPanelWidget(QtWidgets.QWidget):
         self.config_combo.clear()
         if not self.current_user:
             return
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
+        cursor = get_connection().cursor()
         cursor.execute('SELECT name FROM com_configurations WHERE username=? ORDER BY id DESC', (self.current_user,))
         rows = cursor.fetchall()
-        conn.close()
         names = [row[0] for row in rows]
         self.config_combo.addItems(names)
 
+    def refresh_ui(self, check_connection: bool = False):
+        """Обновление по общему таймеру ScalesManager: информационный блок, график
+        (перерисовывается, только если пришли новые кадры) и, если check_connection,
+        проверка молчания весов"""
+        self.update_info_display()
+        self.weight_trend.refresh()
+        if check_connection:
+            self.connection_supervisor.check_data()
+
     def update_info_display(self):
         # Обновляем информацию только если блок информации включен
         if not self.show_info_block:
@@ -515,16 +546,13 @@ class RightPanelWidget(QtWidgets.QWidget):
         self.update_info_display()
 
         # test mode removed
-        self.timer.stop()
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
+        cursor = get_connection().cursor()
         cursor.execute('''
-            SELECT port, baud, COALESCE(protocol, 1)
+            SELECT port, baud, COALESCE(protocol, 1), division, tolerance_divisions, window_size, min_samples
             FROM com_configurations
             WHERE username=? AND name=?
         ''', (self.current_user, current_config_name))
         row = cursor.fetchone()
-        conn.close()
 
         if not row:
             QtWidgets.QMessageBox.warning(self, "Ошибка", "Конфигурация не найдена.")
@@ -534,19 +562,26 @@ class RightPanelWidget(QtWidgets.QWidget):
             self.update_connection_status(False)
             return
 
-        port, baud, protocol = row
+        port, baud, protocol, division, tolerance_divisions, window_size, min_samples = row
         baud = int(baud)
 
-        # Используем WeightReader для подключения
-        success, message = self.weight_reader.connect(port, baud)
+        # Детектор стабильности настраивается под весы конфигурации (без значений - по умолчанию)
+        self.auto_weighing_engine.set_stability_parameters(
+            window_size=int(window_size) if window_size else DEFAULT_WINDOW_SIZE,
+            min_samples=int(min_samples) if min_samples else DEFAULT_MIN_SAMPLES,
+            division=float(division) if division else DEFAULT_DIVISION,
+            tolerance_divisions=(float(tolerance_divisions) if tolerance_divisions is not None
+                                 else DEFAULT_TOLERANCE_DIVISIONS)
+        )
+
+        # Подключаемся через надзор за подключением: дальше обрывы связи восстанавливаются сами
+        self.current_protocol = int(protocol) if protocol else 1
+        success, message = self.connection_supervisor.connect_port(port, baud, self.current_protocol)
         if success:
-            self.timer.start(50)
+            self.connection_lost = False
             QtWidgets.QMessageBox.information(self, "Подключено",
                                                f"Подключение к {port} с скоростью {baud} успешно установлено.")
             self.update_connection_status(True, port, baud)
-            # Сохраняем выбранный протокол для чтения
-            self.weight_reader.set_protocol(int(protocol) if protocol else 1)
-            self.current_protocol = int(protocol) if protocol else 1
         else:
             QtWidgets.QMessageBox.critical(self, "Ошибка подключения", message)
             self.update_connection_status(False)
@@ -555,15 +590,14 @@ class RightPanelWidget(QtWidgets.QWidget):
                 self.weight_label.setText("-")
 
     def on_disconnect_clicked(self):
-        self.timer.stop()
-        self.weight_reader.disconnect()
+        self.stop_reading()
         QtWidgets.QMessageBox.information(self, "Отключено", "COM-порт успешно отключен.")
         self.current_config_name = None
 
         # Сброс состояний
         self.auto_weighing_engine.reset_state()
-        self.last_ui_update = 0.0
-        self.last_auto_weigh_call = 0.0
+        self.reading_history.clear()
+        self.weight_trend.update()
 
         # Сброс флага потери соединения
         self.connection_lost = False
@@ -574,84 +608,58 @@ class RightPanelWidget(QtWidgets.QWidget):
             self.weight_display_manager.reset()
         self.update_info_display()
 
-    def read_or_simulate_weight(self):
+    def stop_reading(self):
+        """Снимает порт с обслуживания и закрывает его без переподключения (при отключении или удалении весов)"""
+        self.connection_supervisor.disconnect_port()
+
+    def on_readings_received(self, readings):
+        """Обрабатывает пачку кадров (WeightReading), полученную из потока чтения порта
+
+        Отображается только последний вес, а в движок автовзвешивания
+        передаются все кадры пачки вместе с признаком стабильности от весов,
+        чтобы ни один не терялся.
+        """
         try:
-            current_time = time.time() * 1000  # мс
-
-            # Оптимизированное обновление интерфейса - только раз в секунду
-            if current_time - self.last_ui_update > self.ui_update_interval:
-                self.update_info_display()
-                self.last_ui_update = current_time
-
-            # Читаем данные из порта и сразу отображаем вес
-            weight_value = self.weight_reader.read_weight()
-            if weight_value is not None:
-                # Сбрасываем флаг потери соединения при успешном чтении
-                self.connection_lost = False
-
-                # Сразу отображаем вес без буферизации
-                self._update_weight_display(weight_value)
-
-                # Обрабатываем автоматическое взвешивание с ограничением частоты вызовов
-                current_time = time.time() * 1000  # мс
-                if current_time - self.last_auto_weigh_call > self.auto_weigh_interval:
-                    self.process_auto_weighing(weight_value)
-                    self.last_auto_weigh_call = current_time
-            else:
-                # Если не удалось прочитать вес, проверяем на разрыв соединения
-                self._handle_connection_loss()
+            # Сбрасываем флаг потери соединения при успешном чтении
+            self.connection_lost = False
 
-        except Exception as e:
-            # Логируем ошибку и обрабатываем разрыв соединения
-            logger.error(f"Ошибка в read_or_simulate_weight: {str(e)}")
-            self._handle_connection_loss()
+            # Все кадры попадают в историю показаний (график обновится по таймеру)
+            self.reading_history.extend(readings)
+
+            # Сразу отображаем вес без буферизации
+            self._update_weight_display(float(readings[-1].value))
+            if metrics.enabled and readings[-1].timestamp_ns is not None:
+                metrics.record(self.metrics_source, metrics.DISPLAY_LATENCY,
+                               time.monotonic_ns() - readings[-1].timestamp_ns)
+
+            for reading in readings:
+                self.process_auto_weighing(reading.value, reading.stable, reading.timestamp_ns)
 
+        except Exception as e:
+            logger.error(f"Ошибка в on_readings_received: {str(e)}")
 
     def _update_weight_display(self, weight_value):
         """Обновляет отображение веса с использованием нового менеджера"""
         if hasattr(self, 'weight_display_manager'):
             self.weight_display_manager.update_weight(weight_value)
 
+    def on_connection_state_changed(self, state, message):
+        """Отображает состояние подключения: при ошибке порта надзор сам переподключает весы"""
+        supervisor = self.connection_supervisor
+        self.connection_lost = state == STATE_RECONNECTING
+        if state == STATE_CONNECTED:
+            self.update_connection_status(True, supervisor.port, supervisor.baudrate)
+        elif state in (STATE_NO_DATA, STATE_RECONNECTING):
+            self.update_connection_status(False, supervisor.port, supervisor.baudrate, CONNECTION_STATE_TITLES[state])
+            # Последний вес уже не актуален
+            if hasattr(self, 'weight_display_manager'):
+                self.weight_display_manager.reset()
 
-    def _process_auto_weighing_call(self, weight_value):
-        """Обрабатывает вызов автоматического взвешивания с ограничением частоты"""
-        try:
-            # Проверяем, что объект еще существует и не был удален
-            if not hasattr(self, 'last_auto_weigh_call') or not hasattr(self, 'auto_weigh_interval'):
-                return
-
-            current_time = time.time() * 1000  # мс
-            if current_time - self.last_auto_weigh_call > self.auto_weigh_interval:
-                self.process_auto_weighing(weight_value)
-                self.last_auto_weigh_call = current_time
-        except (AttributeError, RuntimeError):
-            # Игнорируем ошибки если переменные недоступны или объект удален
-            pass
-
-    def _handle_port_error(self, error):
-        """Обрабатывает критические ошибки порта"""
-        try:
-            # Проверяем, что объект еще существует
-            if not hasattr(self, 'weight_display_manager') or self.weight_display_manager is None:
-                return
-
-            error_msg = f"Ошибка порта: {str(error)}"
-            # Сбрасываем отображение веса при ошибке порта
-            self.weight_display_manager.reset()
-        except (AttributeError, RuntimeError):
-            # Игнорируем ошибки если объект был удален
-            pass
-
-    def _handle_connection_loss(self):
-        """Обрабатывает потерю соединения с весами"""
-        if not self.connection_lost:
-            self.connection_lost = True
-            logger.warning("Соединение с весами потеряно")
-            self.update_connection_status(False)
-            self.timer.stop()  # Останавливаем таймер при потере соединения
+    def process_auto_weighing(self, current_weight, scale_stable=None, timestamp_ns=None):
+        """Обрабатывает логику автоматического взвешивания
 
-    def process_auto_weighing(self, current_weight):
-        """Обрабатывает логику автоматического взвешивания"""
+        scale_stable - признак стабильности от весов, timestamp_ns - время поступления кадра (monotonic_ns)
+        """
         # Проверяем, включено ли автоматическое взвешивание
         if not self.auto_weight_checkbox.isChecked():
             return
@@ -664,9 +672,14 @@ class RightPanelWidget(QtWidgets.QWidget):
             pass  # Используем значение по умолчанию
 
         # Обрабатываем вес через движок автоматического взвешивания
-        should_save, status_message = self.auto_weighing_engine.process_weight(current_weight)
+        should_save, status_message = self.auto_weighing_engine.process_weight(current_weight, scale_stable,
+                                                                               timestamp_ns)
 
         if should_save:
+            # Уведомляем левую панель о новом взвешивании
+            if self.auto_weighing_engine.last_saved_id is not None:
+                self.weighing_saved.emit(self.auto_weighing_engine.last_saved_id)
+
             # Автоматическая чекопечать если включена
             if self.receipt_checkbox.isChecked():
                 self._perform_auto_print_receipt(current_weight)
@@ -792,6 +805,10 @@ class RightPanelWidget(QtWidgets.QWidget):
         self.update_auto_weighing_status()
 
 
+    def on_scale_stability_toggled(self):
+        """Обработчик чекбокса использования признака стабильности от весов"""
+        self.auto_weighing_engine.set_trust_scale_stability(self.scale_stability_checkbox.isChecked())
+
     def update_auto_weighing_status(self):
         """Обновляет отображение статуса автоматического взвешивания в блоке с весом"""
         if self.auto_weight_checkbox.isChecked():
@@ -800,10 +817,10 @@ class RightPanelWidget(QtWidgets.QWidget):
             self.auto_weight_label.setText("Автоматическое взвешивание\nвыключено")
 
 
-    def update_connection_status(self, is_connected, port=None, baud=None):
+    def update_connection_status(self, is_connected, port=None, baud=None, status=None):
         """Обновляет статус подключения с использованием нового менеджера"""
         if hasattr(self, 'weight_display_manager'):
-            self.weight_display_manager.update_connection_status(is_connected, port, baud)
+            self.weight_display_manager.update_connection_status(is_connected, port, baud, status)
 
     def on_save_weight_clicked(self):
         """Обработчик нажатия кнопки 'Сохранить вес'"""
@@ -845,7 +862,7 @@ class RightPanelWidget(QtWidgets.QWidget):
         scales_name = self.current_config_name or '-'
 
         # Используем WeighingService для сохранения
-        success = self.weighing_service.save_manual_weighing(
+        weighing_id = self.weighing_service.save_manual_weighing(
             weight=weight,
             operator=self.current_user,
             cargo_name=cargo_name,
@@ -855,12 +872,18 @@ class RightPanelWidget(QtWidgets.QWidget):
             scales_name=scales_name
         )
 
-        if success:
+        if weighing_id == SAVE_QUEUED:
+            self.auto_weighing_engine.reset_state()
+            logger.warning(f"Пользователь '{self.current_user}' сохранил вес {weight} кг в очередь: база недоступна")
+            QtWidgets.QMessageBox.warning(self, "Сохранено в очередь",
+                                          f"База данных недоступна. Вес {weight} кг сохранен в очередь записи "
+                                          f"и появится в журнале после записи в базу. Повторно сохранять не нужно.")
+        elif weighing_id is not None:
             # Устанавливаем флаги для автоматического взвешивания
             self.auto_weighing_engine.reset_state()
 
             # Уведомляем левую панель о новом взвешивании
-            self.weighing_saved.emit()
+            self.weighing_saved.emit(weighing_id)
 
             logger.info(f"Пользователь '{self.current_user}' вручную сохранил вес: {weight} кг")
             QtWidgets.QMessageBox.information(self, "Успех", f"Вес {weight} кг успешно сохранен.")
@@ -897,14 +920,17 @@ class RightPanelWidget(QtWidgets.QWidget):
                 self.save_weight_button.clicked.disconnect(self.save_weight_button_connection)
             if hasattr(self, 'auto_weight_checkbox_connection'):
                 self.auto_weight_checkbox.stateChanged.disconnect(self.auto_weight_checkbox_connection)
-
-            # Отключаем сигнал таймера
-            if hasattr(self, 'timer_connection'):
-                self.timer.timeout.disconnect(self.timer_connection)
-
-            # Останавливаем таймер
-            if hasattr(self, 'timer') and self.timer.isActive():
-                self.timer.stop()
+            if hasattr(self, 'scale_stability_checkbox_connection'):
+                self.scale_stability_checkbox.stateChanged.disconnect(self.scale_stability_checkbox_connection)
+
+            # Снимаем порт с обслуживания и закрываем его
+            self.stop_reading()
+            if hasattr(self, 'readings_connection'):
+                self.connection_supervisor.readings_received.disconnect(self.readings_connection)
+            if hasattr(self, 'connection_state_connection'):
+                self.connection_supervisor.state_changed.disconnect(self.connection_state_connection)
+            if self._owns_multiplexer:
+                self.serial_multiplexer.stop()
 
             # Отключаем сигнал toggle_button
             if hasattr(self, 'toggle_button'):
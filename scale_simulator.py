@@ -0,0 +1,277 @@
+import os
+import sys
+import time
+import math
+import random
+import argparse
+import logging
+from typing import Optional
+from logger import get_logger
+
+# Настройка логирования для scale_simulator модуля
+logger = get_logger('scale_simulator')
+
+# Порт вида "sim:[параметр=значение&...]" подключает виртуальные весы вместо COM-порта
+SIM_PORT_PREFIX = 'sim:'
+# Готовые варианты для списка портов в настройке COM-порта (деление 10 кг, как у
+# автомобильных весов - в конфигурации порта цену деления нужно указать такой же)
+SIM_PORT_PRESETS = ('sim:protocol=1', 'sim:protocol=2')
+
+# Параметры виртуальных весов по умолчанию
+SIM_DEFAULTS = {
+    'protocol': 2,        # Формат кадров: 1 - ww005kg, 2 - ST,GS,+000005kg
+    'rate': 20.0,         # Кадров в секунду
+    'division': 10.0,     # Цена деления, кг
+    'noise': 1.0,         # Шум на стабильном весе, ± делений
+    'load_min': 5000.0,   # Масса груза, кг
+    'load_max': 40000.0,
+    'idle': 5.0,          # Секунд пустой платформы между машинами
+    'ramp': 4.0,          # Секунд въезда на платформу
+    'settle': 1.5,        # Секунд затухающих колебаний после въезда
+    'hold': 10.0,         # Секунд стабильного веса
+    'unload': 3.0,        # Секунд съезда с платформы
+    'seed': None,         # Зерно генератора (по умолчанию - случайное)
+    'dropout': 0.0,       # Через сколько секунд после открытия порта обрывается связь (0 - без обрывов)
+}
+
+
+def parse_sim_port(port: str) -> dict:
+    """Разобрать порт "sim:protocol=2&rate=20&..." в параметры виртуальных весов"""
+    options = dict(SIM_DEFAULTS)
+    query = port[len(SIM_PORT_PREFIX):].lstrip('?')
+    for item in query.split('&'):
+        if not item:
+            continue
+        key, _, value = item.partition('=')
+        if key not in SIM_DEFAULTS:
+            raise ValueError(f"Неизвестный параметр виртуальных весов: {key}")
+        options[key] = int(value) if key in ('protocol', 'seed') else float(value)
+    return options
+
+
+class SimulatedScale:
+    """Модель весов: циклы пустая платформа -> въезд -> успокоение -> стабильный вес -> съезд.
+
+    weight_at(t) возвращает (вес, стабилен ли вес) на момент t секунд от начала;
+    каждая следующая машина получает случайную массу из [load_min, load_max].
+    """
+
+    def __init__(self, options: Optional[dict] = None):
+        self.options = dict(SIM_DEFAULTS)
+        self.options.update(options or {})
+        self._random = random.Random(self.options['seed'])
+        o = self.options
+        self.cycle_s = o['idle'] + o['ramp'] + o['settle'] + o['hold'] + o['unload']
+        self._cycle = -1
+        self._load = 0.0
+
+    def _load_for_cycle(self, cycle: int) -> float:
+        if cycle != self._cycle:
+            o = self.options
+            self._cycle = cycle
+            self._load = self._round(self._random.uniform(o['load_min'], o['load_max']))
+        return self._load
+
+    def _round(self, value: float) -> float:
+        division = self.options['division']
+        return round(value / division) * division
+
+    def weight_at(self, t: float):
+        o = self.options
+        cycle, phase_t = divmod(t, self.cycle_s)
+        load = self._load_for_cycle(int(cycle))
+        noise = self._random.uniform(-o['noise'], o['noise']) * o['division']
+
+        if phase_t < o['idle']:
+            return 0.0, True
+        phase_t -= o['idle']
+        if phase_t < o['ramp']:
+            # Въезд: вес нарастает неравномерно (оси заезжают по очереди)
+            share = phase_t / o['ramp']
+            return max(0.0, self._round(load * share * (0.8 + 0.2 * math.sin(share * 9)) + noise * 5)), False
+        phase_t -= o['ramp']
+        if phase_t < o['settle']:
+            # Затухающие колебания платформы
+            swing = load * 0.02 * math.exp(-4 * phase_t / o['settle']) * math.sin(phase_t * 12)
+            return self._round(load + swing + noise), False
+        phase_t -= o['settle']
+        if phase_t < o['hold']:
+            return max(0.0, self._round(load + noise)), True
+        phase_t -= o['hold']
+        share = 1 - phase_t / o['unload']
+        return max(0.0, self._round(load * share + noise * 5)), False
+
+    def frame(self, weight: float, stable: bool) -> bytes:
+        """Кадр весов в формате протокола"""
+        if self.options['protocol'] == 1:
+            return b'ww%06dkg\r\n' % int(weight)
+        status = b'ST' if stable else b'US'
+        return b'%s, GS,+%06d kg\r\n' % (status, int(weight))
+
+
+class SimulatedSerial:
+    """Виртуальные весы с интерфейсом serial.Serial (порт "sim:...").
+
+    Кадры генерируются по реальному времени с частотой rate: при каждом
+    обращении к in_waiting в буфер порта добавляются все кадры, время
+    которых наступило с прошлого обращения, как у настоящего порта.
+    """
+
+    def __init__(self, port: str, baudrate: int = 9600, timeout=None, **kwargs):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.options = parse_sim_port(port)
+        self.scale = SimulatedScale(self.options)
+
+        self._buffer = bytearray()
+        self._frame_interval_ns = int(1_000_000_000 / self.options['rate'])
+        self._opened_ns = time.monotonic_ns()
+        self._frames = 0  # Сгенерировано кадров с момента открытия
+        self.is_open = True
+
+    def _generate(self):
+        """Добавить в буфер кадры, время которых уже наступило"""
+        due = (time.monotonic_ns() - self._opened_ns) // self._frame_interval_ns
+        interval_s = self._frame_interval_ns / 1e9
+        scale = self.scale
+        while self._frames < due:
+            self._frames += 1
+            weight, stable = scale.weight_at(self._frames * interval_s)
+            self._buffer.extend(scale.frame(weight, stable))
+
+    @property
+    def in_waiting(self) -> int:
+        if not self.is_open:
+            raise OSError("Виртуальные весы отключены")
+        dropout = self.options['dropout']
+        if dropout and time.monotonic_ns() - self._opened_ns >= dropout * 1e9:
+            # Как у отключенного кабеля USB: порт числится открытым, но чтение дает ошибку
+            raise OSError("Обрыв связи с виртуальными весами")
+        self._generate()
+        return len(self._buffer)
+
+    def read(self, size: int = 1) -> bytes:
+        self._generate()
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def readline(self) -> bytes:
+        self._generate()
+        end = self._buffer.find(b'\n')
+        size = len(self._buffer) if end < 0 else end + 1
+        return self.read(size)
+
+    def close(self):
+        self.is_open = False
+        self._buffer.clear()
+
+
+def run_load_test(scales: int, duration: float, port: str = 'sim:protocol=2', db_file: Optional[str] = None,
+                  stabilization_interval: int = 3, trust_scale_stability: bool = False):
+    """Нагрузочный прогон без интерфейса: N виртуальных весов -> разбор -> автовзвешивание -> база.
+
+    Все весы читаются одним потоком SerialMultiplexer, как в приложении;
+    кадры обрабатываются движками прямо в этом потоке (DirectConnection),
+    потому что цикла событий Qt здесь нет. Сохранения идут через общую
+    очередь WeighingWriter. Возвращает словарь с кадрами, сохранениями,
+    процессорным временем и задержками.
+    """
+    import database
+    # Импорт database базу не открывает: первой открывается база прогона
+    if db_file:
+        database.DB_FILE = db_file
+        database.close_connection()
+    database.init_db()
+    from PyQt5 import QtCore
+    from weight_reader import WeightReader
+    from auto_weighing_engine import AutoWeighingEngine
+    from weighing_writer import WeighingWriter
+    from serial_multiplexer import SerialMultiplexer
+
+    saved_before = database.count_weighings(operator='simulator')
+    writer = WeighingWriter()
+    multiplexer = SerialMultiplexer()
+    results = [[0, 0] for _ in range(scales)]  # Кадров, макс. задержка (нс) по весам
+    readers = []
+    channels = []
+
+    def make_handler(engine, result):
+        def on_readings(readings):
+            for reading in readings:
+                engine.process_weight(reading.value, reading.stable, reading.timestamp_ns)
+            # Задержка от поступления кадра до окончания его обработки
+            result[1] = max(result[1], time.monotonic_ns() - readings[0].timestamp_ns)
+            result[0] += len(readings)
+        return on_readings
+
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    for index in range(scales):
+        reader = WeightReader()
+        # У каждых весов свое зерно, чтобы машины не заезжали синхронно
+        separator = '&' if '=' in port else ''
+        success, message = reader.connect(f"{port}{separator}seed={index}")
+        if not success:
+            logger.error(message)
+            continue
+        reader.set_protocol(reader.serial_port.options['protocol'])
+        engine = AutoWeighingEngine(user='simulator', scales_name=f"Весы {index + 1}", writer=writer)
+        engine.set_stabilization_interval(stabilization_interval)
+        # Допуск стабильности - в делениях виртуальных весов
+        engine.set_stability_parameters(division=reader.serial_port.options['division'])
+        engine.set_trust_scale_stability(trust_scale_stability)
+        channel = multiplexer.add(reader)
+        channel.readings_received.connect(make_handler(engine, results[index]), QtCore.Qt.DirectConnection)
+        readers.append(reader)
+        channels.append(channel)
+
+    time.sleep(duration)
+    for channel in channels:
+        multiplexer.remove(channel)
+    multiplexer.stop()
+    for reader in readers:
+        reader.disconnect()
+    writer.stop()
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu_started
+    saves = database.count_weighings(operator='simulator') - saved_before
+
+    frames = sum(result[0] for result in results)
+    return {
+        'scales': scales,
+        'seconds': elapsed,
+        'frames': frames,
+        'frames_per_second': frames / elapsed if elapsed > 0 else 0.0,
+        'saves': saves,
+        'cpu_percent': 100.0 * cpu / elapsed if elapsed > 0 else 0.0,
+        'max_latency_ms': max((result[1] for result in results), default=0) / 1e6,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон журнала на виртуальных весах")
+    parser.add_argument('--scales', type=int, default=16, help="количество весов")
+    parser.add_argument('--duration', type=float, default=60, help="длительность прогона, с")
+    parser.add_argument('--port', default='sim:protocol=2',
+                        help="порт виртуальных весов с параметрами, например sim:protocol=1&rate=50&noise=2")
+    parser.add_argument('--db', default='simulator_journal.db', help="файл базы данных для прогона")
+    parser.add_argument('--interval', type=int, default=3, help="интервал стабилизации, с")
+    parser.add_argument('--trust-scale', action='store_true', help="доверять признаку стабильности от весов")
+    args = parser.parse_args(argv)
+
+    if os.path.abspath(args.db) == os.path.abspath('weights_journal.db'):
+        parser.error("для прогона укажите отдельный файл базы данных")
+
+    result = run_load_test(args.scales, args.duration, args.port, args.db, args.interval, args.trust_scale)
+    print(f"Весов: {result['scales']}, время: {result['seconds']:.1f} с")
+    print(f"Кадров: {result['frames']} ({result['frames_per_second']:.0f} кадров/с), "
+          f"сохранений: {result['saves']}")
+    print(f"Загрузка процессора: {result['cpu_percent']:.1f}%, "
+          f"макс. задержка кадра: {result['max_latency_ms']:.1f} мс")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
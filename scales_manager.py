@@ -1,19 +1,26 @@
-import sqlite3
+import time
 import logging
 from PyQt5 import QtWidgets, QtCore, QtGui
 from right_panel import RightPanelWidget
+from weighing_writer import WeighingWriter
+from weighing_spool import WeighingSpool
+from serial_multiplexer import SerialMultiplexer
+from connection_supervisor import WATCHDOG_INTERVAL_MS
 from logger import get_logger
 
 # Настройка логирования для scales_manager модуля
 logger = get_logger('scales_manager')
 
-DB_FILE = 'weights_journal.db'
+# Период обновления панелей весов (информационный блок, график веса), мс
+UI_REFRESH_INTERVAL_MS = 100
 
 class ScalesManager(QtWidgets.QWidget):
     """Менеджер для управления несколькими блоками весов"""
 
     # Сигнал для уведомления о новом взвешивании
-    weighing_saved = QtCore.pyqtSignal()
+    weighing_saved = QtCore.pyqtSignal(int)  # id сохраненной записи
+    # Очередь записи не смогла сохранить пачку автовзвешиваний: количество записей, текст ошибки
+    write_failed = QtCore.pyqtSignal(int, str)
 
     def __init__(self, font_family="Arial", parent=None):
         super().__init__(parent)
@@ -23,6 +30,21 @@ class ScalesManager(QtWidgets.QWidget):
         self.scales_counter = 1   # Счетчик для нумерации весов
         self.printer_manager = None  # Менеджер термопринтера
 
+        # Спул предзаписи: переносим в базу взвешивания, не сохраненные в прошлый запуск
+        self.weighing_spool = WeighingSpool()
+        try:
+            self.weighing_spool.replay()
+        except Exception as e:
+            logger.error(f"Не удалось перенести взвешивания из спула в базу: {e}")
+
+        # Общая очередь записи автоматических взвешиваний для всех весов
+        self.weighing_writer = WeighingWriter(spool=self.weighing_spool, parent=self)
+        self.weighing_writer.weighing_saved.connect(self.weighing_saved.emit)
+        self.weighing_writer.write_failed.connect(self.write_failed.emit)
+
+        # Общий поток чтения портов всех весов
+        self.serial_multiplexer = SerialMultiplexer(parent=self)
+
         # Создаем scroll area для возможности прокрутки при множестве весов
         self.scroll_area = QtWidgets.QScrollArea()
         self.scroll_area.setWidgetResizable(True)
@@ -45,6 +67,21 @@ class ScalesManager(QtWidgets.QWidget):
         # Добавляем первую весы по умолчанию
         self.add_scales()
 
+        # Один таймер GUI-потока на все весы: обновление панелей и проверка молчания портов
+        self._next_connection_check = 0.0
+        self.refresh_timer = QtCore.QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh_scales)
+        self.refresh_timer.start(UI_REFRESH_INTERVAL_MS)
+
+    def refresh_scales(self):
+        """Обновить панели всех весов по общему таймеру (молчание весов - раз в WATCHDOG_INTERVAL_MS)"""
+        now = time.monotonic()
+        check_connection = now >= self._next_connection_check
+        if check_connection:
+            self._next_connection_check = now + WATCHDOG_INTERVAL_MS / 1000
+        for scales_widget in self.scales_widgets:
+            scales_widget.refresh_ui(check_connection)
+
     def add_scales(self):
         """Добавляет новый блок весов"""
         scales_number = self.scales_counter
@@ -57,7 +94,10 @@ class ScalesManager(QtWidgets.QWidget):
             parent=self,
             current_user=self.current_user,
             scales_number=scales_number,
-            show_info_block=show_info_block
+            show_info_block=show_info_block,
+            weighing_writer=self.weighing_writer,
+            weighing_spool=self.weighing_spool,
+            serial_multiplexer=self.serial_multiplexer
         )
 
         # Подключаем сигналы
@@ -129,6 +169,9 @@ class ScalesManager(QtWidgets.QWidget):
                 # Сигналы уже отключены
                 pass
 
+            # Снимаем порт с обслуживания и закрываем его до удаления виджета
+            scales_widget.stop_reading()
+
             # Удаляем из списка и layout
             self.scales_widgets.remove(scales_widget)
             self.layout.removeWidget(scales_widget)
@@ -180,6 +223,21 @@ class ScalesManager(QtWidgets.QWidget):
         """Возвращает список всех виджетов весов"""
         return self.scales_widgets.copy()
 
+    def stop_reading(self):
+        """Закрывает порты всех весов и останавливает общий поток чтения"""
+        self.refresh_timer.stop()
+        for scales_widget in self.scales_widgets:
+            scales_widget.stop_reading()
+        self.serial_multiplexer.stop()
+
+    def stop_writer(self):
+        """Дописывает в базу очередь автоматических взвешиваний и останавливает поток записи"""
+        pending = self.weighing_writer.pending_count()
+        if pending:
+            logger.info(f"Сохранение {pending} взвешиваний из очереди перед выходом")
+        self.weighing_writer.stop()
+        self.weighing_spool.close()
+
     def disconnect_signals(self):
         """Отключение всех сигналов для предотвращения memory leaks"""
         try:
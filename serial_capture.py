@@ -0,0 +1,321 @@
+import os
+import sys
+import json
+import time
+import struct
+import argparse
+import logging
+from datetime import datetime
+from typing import Optional
+from logger import get_logger
+
+# Настройка логирования для serial_capture модуля
+logger = get_logger('serial_capture')
+
+# Формат файла записи порта:
+#   CAPTURE_MAGIC, строка JSON с параметрами записи (порт, скорость, протокол),
+#   затем записи: время от начала записи в нс и длина (big-endian), сырые байты
+CAPTURE_MAGIC = b'WJCAP1\n'
+_CHUNK_HEADER = struct.Struct('>qI')
+
+# Порт вида "replay:<файл>[?speed=<n>&loop=1]" воспроизводит запись вместо COM-порта;
+# speed=1 - в реальном времени, speed=0 - без пауз (как можно быстрее)
+REPLAY_PORT_PREFIX = 'replay:'
+
+
+class SerialCapture:
+    """Запись сырых байтов COM-порта с метками времени (time.monotonic_ns) в файл.
+
+    Пишет WeightReader: каждый прочитанный из порта блок байтов сохраняется
+    до разбора на кадры, поэтому запись воспроизводит в том числе
+    оборванные и нераспознанные кадры.
+    """
+
+    def __init__(self, path: str, port: Optional[str] = None, baudrate: Optional[int] = None,
+                 protocol: Optional[int] = None):
+        self.path = path
+        self._file = open(path, 'wb')
+        self._start_ns = None
+        self.chunks = 0
+        self.bytes = 0
+
+        info = {
+            'port': port,
+            'baudrate': baudrate,
+            'protocol': protocol,
+            'started': datetime.now().isoformat(timespec='seconds'),
+        }
+        self._file.write(CAPTURE_MAGIC)
+        self._file.write(json.dumps(info, ensure_ascii=False).encode('utf-8') + b'\n')
+
+    def write(self, data: bytes, timestamp_ns: Optional[int] = None):
+        """Дописать блок байтов, прочитанный из порта в момент timestamp_ns"""
+        if self._file is None or not data:
+            return
+        if timestamp_ns is None:
+            timestamp_ns = time.monotonic_ns()
+        if self._start_ns is None:
+            self._start_ns = timestamp_ns
+        self._file.write(_CHUNK_HEADER.pack(timestamp_ns - self._start_ns, len(data)))
+        self._file.write(data)
+        self.chunks += 1
+        self.bytes += len(data)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def read_capture(path: str):
+    """Прочитать файл записи: (параметры записи, список (время в нс от начала, байты))"""
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    if not data.startswith(CAPTURE_MAGIC):
+        raise ValueError(f"{path} не является записью COM-порта")
+    info_end = data.index(b'\n', len(CAPTURE_MAGIC))
+    info = json.loads(data[len(CAPTURE_MAGIC):info_end].decode('utf-8'))
+
+    chunks = []
+    offset = info_end + 1
+    while offset + _CHUNK_HEADER.size <= len(data):
+        offset_ns, length = _CHUNK_HEADER.unpack_from(data, offset)
+        start = offset + _CHUNK_HEADER.size
+        chunk = data[start:start + length]
+        if len(chunk) < length:
+            # Запись оборвалась (приложение было закрыто во время записи)
+            break
+        chunks.append((offset_ns, chunk))
+        offset = start + length
+    return info, chunks
+
+
+def parse_replay_port(port: str):
+    """Разобрать порт "replay:<файл>[?speed=<n>&loop=1]" в (файл, скорость, повтор)"""
+    spec = port[len(REPLAY_PORT_PREFIX):]
+    path, _, query = spec.partition('?')
+    options = dict(item.partition('=')[::2] for item in query.split('&') if item)
+    speed = float(options.get('speed', 1))
+    loop = options.get('loop', '0') not in ('0', '', 'false')
+    return path, speed, loop
+
+
+class ReplaySerial:
+    """Воспроизведение записи SerialCapture с интерфейсом serial.Serial.
+
+    Поддерживает то, что использует WeightReader: is_open, in_waiting,
+    read(), readline(), close(). Блоки байтов становятся доступны по
+    записанному времени, ускоренному в speed раз; при speed=0 - без пауз,
+    по одному блоку на чтение. Метод monotonic_ns() возвращает время воспроизведения,
+    и WeightReader ставит кадрам метки по нему, поэтому стабилизация
+    при быстром воспроизведении считается так же, как в реальном времени.
+    """
+
+    def __init__(self, port: str, baudrate: int = 9600, timeout=None, **kwargs):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.path, self.speed, self.loop = parse_replay_port(port)
+        self.info, self._chunks = read_capture(self.path)
+
+        self._buffer = bytearray()
+        self._next = 0            # Индекс следующего блока записи
+        self._base_ns = 0         # Сдвиг времени при повторе записи по кругу
+        self._replay_ns = 0       # Время воспроизведения последнего выданного блока
+        self._opened_ns = time.monotonic_ns()
+        self.is_open = True
+
+    @property
+    def at_end(self) -> bool:
+        """Запись воспроизведена полностью и все байты вычитаны"""
+        return self._next >= len(self._chunks) and not self._buffer and not self.loop
+
+    def _elapsed_ns(self) -> Optional[int]:
+        """Сколько времени записи прошло с открытия (None - без пауз)"""
+        if self.speed <= 0:
+            return None
+        return int((time.monotonic_ns() - self._opened_ns) * self.speed)
+
+    def _release(self):
+        """Перенести в буфер порта блоки, время которых уже наступило.
+        Без пауз блоки выдаются по одному, когда буфер вычитан, чтобы
+        сохранить разбиение и метки времени записи"""
+        if not self._chunks:
+            return
+        elapsed = self._elapsed_ns()
+        while elapsed is not None or not self._buffer:
+            if self._next >= len(self._chunks):
+                if not self.loop:
+                    return
+                # По кругу: продолжаем время после последнего блока
+                self._base_ns += self._chunks[-1][0] + 1
+                self._next = 0
+            offset_ns, chunk = self._chunks[self._next]
+            offset_ns += self._base_ns
+            if elapsed is not None and offset_ns > elapsed:
+                return
+            self._buffer.extend(chunk)
+            self._replay_ns = offset_ns
+            self._next += 1
+
+    def monotonic_ns(self) -> int:
+        """Текущее время воспроизведения для меток кадров (время записи, а не реальное)"""
+        if self.speed <= 0:
+            return self._opened_ns + self._replay_ns
+        return self._opened_ns + self._elapsed_ns()
+
+    @property
+    def in_waiting(self) -> int:
+        if not self.is_open:
+            raise OSError("Порт воспроизведения закрыт")
+        self._release()
+        return len(self._buffer)
+
+    def read(self, size: int = 1) -> bytes:
+        self._release()
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def readline(self) -> bytes:
+        self._release()
+        end = self._buffer.find(b'\n')
+        size = len(self._buffer) if end < 0 else end + 1
+        return self.read(size)
+
+    def close(self):
+        self.is_open = False
+        self._buffer.clear()
+
+
+class _CountingWriter:
+    """Очередь записи для воспроизведения: считает автосохранения вместо записи в базу"""
+
+    def __init__(self):
+        self.records = []
+
+    def submit(self, record):
+        self.records.append(record)
+
+
+def replay_capture(path: str, protocol: Optional[int] = None, speed: float = 0,
+                   stabilization_interval: Optional[int] = None, trust_scale_stability: bool = False):
+    """Прогнать запись через WeightReader и AutoWeighingEngine без базы данных.
+
+    Returns:
+        dict: количество кадров и автосохранений, сохраненные веса, время разбора
+    """
+    from weight_reader import WeightReader
+    from auto_weighing_engine import AutoWeighingEngine
+
+    info, _ = read_capture(path)
+    protocol = protocol or info.get('protocol') or 1
+    baudrate = info.get('baudrate') or 9600
+
+    reader = WeightReader(protocol=protocol)
+    success, message = reader.connect(f"{REPLAY_PORT_PREFIX}{path}?speed={speed:g}", baudrate)
+    if not success:
+        raise OSError(message)
+
+    writer = _CountingWriter()
+    engine = AutoWeighingEngine(user='replay', scales_name=os.path.basename(path), writer=writer)
+    if stabilization_interval is not None:
+        engine.set_stabilization_interval(stabilization_interval)
+    engine.set_trust_scale_stability(trust_scale_stability)
+
+    frames = 0
+    started = time.perf_counter()
+    try:
+        while not reader.serial_port.at_end:
+            readings = reader.read_readings()
+            if not readings:
+                if speed > 0:
+                    time.sleep(0.01)
+                continue
+            frames += len(readings)
+            for reading in readings:
+                engine.process_weight(reading.value, reading.stable, reading.timestamp_ns)
+    finally:
+        reader.disconnect()
+    elapsed = time.perf_counter() - started
+
+    return {
+        'frames': frames,
+        'saves': len(writer.records),
+        'weights': [record['weight'] for record in writer.records],
+        'seconds': elapsed,
+        'frames_per_second': frames / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def record_port(path: str, port: str, baudrate: int, protocol: int, duration: float):
+    """Записать сырой поток COM-порта в файл в течение duration секунд"""
+    from weight_reader import WeightReader
+
+    reader = WeightReader(protocol=protocol)
+    success, message = reader.connect(port, baudrate)
+    if not success:
+        raise OSError(message)
+
+    capture = reader.start_capture(path)
+    frames = 0
+    deadline = time.monotonic() + duration
+    try:
+        while time.monotonic() < deadline:
+            readings = reader.read_readings()
+            frames += len(readings)
+            if not readings:
+                time.sleep(0.01)
+    finally:
+        reader.stop_capture()
+        reader.disconnect()
+    return {'chunks': capture.chunks, 'bytes': capture.bytes, 'frames': frames}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Запись и воспроизведение потока COM-порта весов")
+    commands = parser.add_subparsers(dest='command')
+
+    record = commands.add_parser('record', help="записать поток COM-порта в файл")
+    record.add_argument('path', help="файл записи")
+    record.add_argument('--port', required=True, help="COM-порт весов")
+    record.add_argument('--baud', type=int, default=9600, help="скорость порта")
+    record.add_argument('--protocol', type=int, default=1, help="протокол весов")
+    record.add_argument('--duration', type=float, default=60, help="длительность записи, с")
+
+    replay = commands.add_parser('replay', help="прогнать запись через разбор и автовзвешивание")
+    replay.add_argument('path', help="файл записи")
+    replay.add_argument('--protocol', type=int, help="протокол весов (по умолчанию - из записи)")
+    replay.add_argument('--speed', type=float, default=0,
+                        help="скорость воспроизведения: 1 - реальное время, 0 - как можно быстрее")
+    replay.add_argument('--interval', type=int, help="интервал стабилизации, с")
+    replay.add_argument('--trust-scale', action='store_true', help="доверять признаку стабильности от весов")
+
+    info = commands.add_parser('info', help="показать параметры записи")
+    info.add_argument('path', help="файл записи")
+
+    args = parser.parse_args(argv)
+    if args.command == 'record':
+        result = record_port(args.path, args.port, args.baud, args.protocol, args.duration)
+        print(f"Записано блоков: {result['chunks']}, байт: {result['bytes']}, кадров: {result['frames']}")
+    elif args.command == 'replay':
+        result = replay_capture(args.path, args.protocol, args.speed, args.interval, args.trust_scale)
+        print(f"Кадров: {result['frames']}, автосохранений: {result['saves']}, "
+              f"время: {result['seconds']:.3f} с ({result['frames_per_second']:.0f} кадров/с)")
+        for weight in result['weights']:
+            print(f"  {weight}")
+    elif args.command == 'info':
+        capture_info, chunks = read_capture(args.path)
+        duration = chunks[-1][0] / 1e9 if chunks else 0.0
+        print(json.dumps(capture_info, ensure_ascii=False))
+        print(f"Блоков: {len(chunks)}, байт: {sum(len(chunk) for _, chunk in chunks)}, "
+              f"длительность: {duration:.1f} с")
+    else:
+        parser.print_help()
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
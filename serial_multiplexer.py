@@ -0,0 +1,236 @@
+import os
+import time
+import socket
+import selectors
+import threading
+import logging
+from PyQt5 import QtCore
+from weight_reader import WeightReader
+from logger import get_logger
+
+# Настройка логирования для serial_multiplexer модуля
+logger = get_logger('serial_multiplexer')
+
+# Пауза между опросами портов без дескриптора (Windows, виртуальные весы, воспроизведение), с
+POLL_INTERVAL = 0.01
+# Как часто проверять, не закрыты ли порты, которые ждутся через selectors, с
+# (закрытый дескриптор молча исчезает из select и сам о себе не сообщает)
+CHECK_INTERVAL = 1.0
+
+
+def _port_fileno(serial_port):
+    """Файловый дескриптор порта для selectors или None, если порт нужно опрашивать.
+
+    На Windows selectors работает только с сокетами, поэтому COM-порты
+    там всегда опрашиваются; sim: и replay: порты дескриптора не имеют.
+    """
+    if os.name != 'posix':
+        return None
+    fileno = getattr(serial_port, 'fileno', None)
+    if fileno is None:
+        return None
+    try:
+        return fileno()
+    except Exception:
+        return None
+
+
+class SerialChannel(QtCore.QObject):
+    """Подписка одних весов на мультиплексор: сигналы с кадрами и потерей связи.
+
+    Сигналы испускаются из потока мультиплексора; получатели в GUI-потоке
+    подключаются через очередь событий (QueuedConnection).
+    """
+
+    # Все кадры (WeightReading), вычитанные за один проход, в порядке поступления
+    readings_received = QtCore.pyqtSignal(list)
+    # Порт закрылся или стал недоступен (весы сняты с обслуживания)
+    connection_lost = QtCore.pyqtSignal()
+
+    def __init__(self, weight_reader: WeightReader, parent=None):
+        super().__init__(parent)
+        self.weight_reader = weight_reader
+        self.fileno = None
+
+
+class SerialMultiplexer(QtCore.QObject):
+    """Один фоновый поток чтения портов для всех весов.
+
+    Порты с файловым дескриптором (COM-порты на Linux) ждутся через
+    selectors и вычитываются, только когда в них пришли данные; остальные
+    опрашиваются раз в POLL_INTERVAL. Разобранные кадры раздаются по весам
+    сигналами их SerialChannel, поэтому число потоков и пробуждений
+    не растет с количеством весов.
+    """
+
+    def __init__(self, poll_interval: float = POLL_INTERVAL, parent=None):
+        super().__init__(parent)
+        self.poll_interval = poll_interval
+
+        self._selector = selectors.DefaultSelector()
+        # Пара сокетов для пробуждения select() при добавлении/удалении весов и остановке
+        self._wakeup_receiver, self._wakeup_sender = socket.socketpair()
+        self._wakeup_receiver.setblocking(False)
+        self._wakeup_sender.setblocking(False)
+        self._selector.register(self._wakeup_receiver, selectors.EVENT_READ, None)
+
+        # Обслуживание портов и изменение списка весов идут под одной блокировкой:
+        # после remove() поток мультиплексора больше не обращается к WeightReader.
+        # Блокировка повторно входимая - обработчик с DirectConnection может вызвать remove()
+        self._lock = threading.RLock()
+        self._channels = []
+        self._polled = []
+        self._stopping = threading.Event()
+
+        self._thread = threading.Thread(target=self._run, name="SerialMultiplexer", daemon=True)
+        self._thread.start()
+
+    def add(self, weight_reader: WeightReader, parent=None) -> SerialChannel:
+        """Поставить подключенный WeightReader на обслуживание; возвращает канал с его сигналами"""
+        if self._stopping.is_set():
+            raise RuntimeError("Мультиплексор портов остановлен")
+        channel = SerialChannel(weight_reader, parent)
+        fileno = _port_fileno(weight_reader.serial_port)
+        with self._lock:
+            if fileno is not None:
+                try:
+                    self._selector.register(fileno, selectors.EVENT_READ, channel)
+                    channel.fileno = fileno
+                except (ValueError, KeyError, OSError) as e:
+                    logger.warning(f"Порт {weight_reader.port} нельзя ждать через selectors ({e}), будет опрашиваться")
+            if channel.fileno is None:
+                self._polled.append(channel)
+            self._channels.append(channel)
+        self._wakeup()
+        logger.debug(f"Порт {weight_reader.port} поставлен на обслуживание "
+                     f"({'selectors' if channel.fileno is not None else 'опрос'})")
+        return channel
+
+    def remove(self, channel: SerialChannel):
+        """Снять весы с обслуживания; после возврата порт можно закрывать"""
+        with self._lock:
+            self._detach(channel)
+        self._wakeup()
+
+    def _detach(self, channel: SerialChannel):
+        """Убрать канал из списков обслуживания (вызывается под блокировкой)"""
+        if channel not in self._channels:
+            return False
+        self._channels.remove(channel)
+        if channel.fileno is not None:
+            try:
+                self._selector.unregister(channel.fileno)
+            except (KeyError, ValueError, OSError):
+                pass
+        else:
+            self._polled.remove(channel)
+        return True
+
+    def channel_count(self) -> int:
+        with self._lock:
+            return len(self._channels)
+
+    def _wakeup(self):
+        try:
+            self._wakeup_sender.send(b'\0')
+        except (BlockingIOError, OSError):
+            # Буфер сокета полон - поток и так проснется
+            pass
+
+    def _drain_wakeup(self):
+        try:
+            while self._wakeup_receiver.recv(1024):
+                pass
+        except (BlockingIOError, OSError):
+            pass
+
+    def _service(self, channel: SerialChannel, selected: bool = False):
+        """Вычитать порт одних весов; возвращает количество кадров (-1 - связь потеряна).
+
+        selected - select() сообщил, что дескриптор порта готов к чтению.
+        """
+        reader = channel.weight_reader
+        if not reader.is_port_open():
+            logger.warning(f"Порт {reader.port} закрыт, весы сняты с обслуживания")
+            self._detach(channel)
+            channel.connection_lost.emit()
+            return -1
+        try:
+            if selected and not reader.serial_port.in_waiting:
+                # Готов к чтению, но байтов нет - так выглядит обрыв (USB-адаптер отключен):
+                # дескриптор останется готовым всегда, и цикл крутился бы вхолостую
+                raise OSError("порт готов к чтению, но данных нет (устройство отключено?)")
+            readings = reader.read_readings()
+        except Exception as e:
+            logger.error(f"Ошибка чтения порта {reader.port}: {str(e)}")
+            self._detach(channel)
+            channel.connection_lost.emit()
+            return -1
+        if readings:
+            channel.readings_received.emit(readings)
+        return len(readings)
+
+    def _check_selected(self):
+        """Снять с обслуживания закрытые порты, которые ждутся через selectors"""
+        for channel in self._channels[:]:
+            if channel.fileno is not None and not channel.weight_reader.is_port_open():
+                self._service(channel)
+
+    def _run(self):
+        """Основной цикл: ждать данные в портах и раздавать кадры по весам"""
+        next_check = time.monotonic() + CHECK_INTERVAL
+        while not self._stopping.is_set():
+            with self._lock:
+                if self._polled:
+                    timeout = self.poll_interval
+                elif self._channels:
+                    timeout = max(0.0, next_check - time.monotonic())
+                else:
+                    timeout = None
+            try:
+                events = self._selector.select(timeout)
+            except (OSError, ValueError) as e:
+                # Дескриптор закрыли в обход remove() - следующий проход найдет закрытый порт
+                logger.error(f"Ошибка ожидания данных портов: {e}")
+                events = []
+                self._stopping.wait(self.poll_interval)
+
+            ready = []
+            for key, _ in events:
+                if key.data is None:
+                    self._drain_wakeup()
+                else:
+                    ready.append(key.data)
+
+            frames = 0
+            with self._lock:
+                for channel in ready:
+                    if channel in self._channels:
+                        frames += max(self._service(channel, selected=True), 0)
+                for channel in self._polled[:]:
+                    if channel in self._channels:
+                        frames += max(self._service(channel), 0)
+                if time.monotonic() >= next_check:
+                    self._check_selected()
+                    next_check = time.monotonic() + CHECK_INTERVAL
+
+            if ready and not frames:
+                # Дескриптор готов, а кадров нет (неполный кадр или ошибка чтения) - не крутим цикл
+                self._stopping.wait(self.poll_interval)
+
+    def stop(self, timeout: float = 2.0):
+        """Остановить поток мультиплексора (порты закрывают сами весы)"""
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        self._wakeup()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning(f"Поток мультиплексора портов не завершился за {timeout} с")
+            return
+        with self._lock:
+            self._channels.clear()
+            self._polled.clear()
+        self._selector.close()
+        self._wakeup_receiver.close()
+        self._wakeup_sender.close()
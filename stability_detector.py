@@ -0,0 +1,117 @@
+from array import array
+from collections import deque
+
+# Параметры детектора стабильности по умолчанию
+DEFAULT_WINDOW_SIZE = 10          # Кадров в скользящем окне
+DEFAULT_MIN_SAMPLES = 5           # Минимум кадров в окне для решения о стабильности
+DEFAULT_DIVISION = 1.0            # Цена деления весов, кг
+DEFAULT_TOLERANCE_DIVISIONS = 1   # Допуск колебаний веса в окне, ± делений
+
+
+class StabilityDetector:
+    """Детектор стабильности веса по скользящему окну кадров.
+
+    Вес считается стабильным, если в окне не меньше min_samples кадров
+    и все они укладываются в полосу ±tolerance_divisions делений весов
+    (разброс максимум - минимум не больше двух допусков). Окно хранится
+    в кольцевом буфере array('d'); сумма и сумма квадратов (среднее
+    и дисперсия) ведутся нарастающим итогом, минимум и максимум -
+    монотонными очередями индексов, поэтому обработка кадра занимает O(1)
+    и не создает новых списков.
+    """
+
+    def __init__(self, window_size: int = DEFAULT_WINDOW_SIZE, min_samples: int = DEFAULT_MIN_SAMPLES,
+                 division: float = DEFAULT_DIVISION, tolerance_divisions: float = DEFAULT_TOLERANCE_DIVISIONS):
+        if window_size < 1:
+            raise ValueError("Размер окна должен быть не меньше 1")
+        self.window_size = window_size
+        self.min_samples = max(1, min(min_samples, window_size))
+        self.division = division
+        self.tolerance_divisions = tolerance_divisions
+
+        self._values = array('d', bytes(8 * window_size))
+        self._min_indices = deque()
+        self._max_indices = deque()
+        self.reset()
+
+    @property
+    def tolerance(self) -> float:
+        """Допуск колебаний веса (полуширина полосы), кг"""
+        return self.tolerance_divisions * self.division
+
+    def reset(self):
+        """Очистить окно (например, после сохранения или сброса веса на ноль)"""
+        self._count = 0       # Всего кадров с момента сброса
+        self._sum = 0.0
+        self._sum_sq = 0.0
+        self._min_indices.clear()
+        self._max_indices.clear()
+
+    def update(self, weight: float) -> bool:
+        """Добавить кадр в окно и вернуть, стабилен ли вес"""
+        index = self._count
+        slot = index % self.window_size
+
+        if index >= self.window_size:
+            # Вытесняем самый старый кадр
+            old = self._values[slot]
+            self._sum -= old
+            self._sum_sq -= old * old
+            oldest = index - self.window_size
+            if self._min_indices[0] == oldest:
+                self._min_indices.popleft()
+            if self._max_indices[0] == oldest:
+                self._max_indices.popleft()
+
+        self._values[slot] = weight
+        self._sum += weight
+        self._sum_sq += weight * weight
+        self._count = index + 1
+
+        # Монотонные очереди: в начале всегда индекс минимума/максимума окна
+        while self._min_indices and self._values[self._min_indices[-1] % self.window_size] >= weight:
+            self._min_indices.pop()
+        self._min_indices.append(index)
+        while self._max_indices and self._values[self._max_indices[-1] % self.window_size] <= weight:
+            self._max_indices.pop()
+        self._max_indices.append(index)
+
+        if slot == self.window_size - 1:
+            # Раз в окно пересчитываем суммы, чтобы не накапливалась ошибка округления
+            self._sum = sum(self._values)
+            self._sum_sq = sum(value * value for value in self._values)
+
+        return self.is_stable()
+
+    @property
+    def samples(self) -> int:
+        """Количество кадров в окне"""
+        return min(self._count, self.window_size)
+
+    @property
+    def minimum(self) -> float:
+        return self._values[self._min_indices[0] % self.window_size] if self._count else 0.0
+
+    @property
+    def maximum(self) -> float:
+        return self._values[self._max_indices[0] % self.window_size] if self._count else 0.0
+
+    @property
+    def mean(self) -> float:
+        samples = self.samples
+        return self._sum / samples if samples else 0.0
+
+    @property
+    def variance(self) -> float:
+        samples = self.samples
+        if not samples:
+            return 0.0
+        mean = self._sum / samples
+        return max(0.0, self._sum_sq / samples - mean * mean)
+
+    def is_stable(self) -> bool:
+        """Стабилен ли вес по текущему окну"""
+        if self.samples < self.min_samples:
+            return False
+        # Небольшой запас на погрешность представления дробных весов
+        return self.maximum - self.minimum <= 2 * self.tolerance + 1e-9
@@ -1,7 +1,5 @@
-import sqlite3
 from PyQt5 import QtWidgets, QtCore
-
-DB_FILE = 'weights_journal.db'
+from database import get_connection
 
 class UserManagementDialog(QtWidgets.QDialog):
     def __init__(self, parent=None):
@@ -67,11 +65,9 @@ class UserManagementDialog(QtWidgets.QDialog):
     def load_users(self):
         """Загружает список пользователей в таблицу"""
         self.table.setRowCount(0)
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
+        cursor = get_connection().cursor()
         cursor.execute("SELECT username, password FROM users ORDER BY username")
         users = cursor.fetchall()
-        conn.close()
 
         for row_data in users:
             row = self.table.rowCount()
@@ -101,11 +97,8 @@ class UserManagementDialog(QtWidgets.QDialog):
         )
 
         if ok and new_password.strip():
-            conn = sqlite3.connect(DB_FILE)
-            cursor = conn.cursor()
-            cursor.execute("UPDATE users SET password=? WHERE username=?", (new_password.strip(), username))
-            conn.commit()
-            conn.close()
+            with get_connection() as conn:
+                conn.execute("UPDATE users SET password=? WHERE username=?", (new_password.strip(), username))
 
             QtWidgets.QMessageBox.information(self, "Успех", f"Пароль пользователя '{username}' изменен")
             self.load_users()  # Обновляем таблицу
@@ -138,11 +131,8 @@ class UserManagementDialog(QtWidgets.QDialog):
         )
 
         if reply == QtWidgets.QMessageBox.Yes:
-            conn = sqlite3.connect(DB_FILE)
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM users WHERE username=?", (username,))
-            conn.commit()
-            conn.close()
+            with get_connection() as conn:
+                conn.execute("DELETE FROM users WHERE username=?", (username,))
 
             QtWidgets.QMessageBox.information(self, "Успех", f"Пользователь '{username}' удален")
             self.load_users()  # Обновляем таблицу
\ No newline at end of file
@@ -1,18 +1,27 @@
+import time
 import logging
 from datetime import datetime
+import metrics
 from logger import get_logger
 
 # Настройка логирования для weighing_service модуля
 logger = get_logger('weighing_service')
-from typing import Optional, Dict, Any
-from database import save_weighing
+from typing import Optional, Union, Dict, Any
+from database import save_weighing, checkpoint, datetime_to_timestamp, WEIGHING_DATETIME_FORMAT
+
+# Результат save_manual_weighing: база недоступна, но запись сохранена в спуле
+# и попадет в журнал позже (через очередь записи или при следующем запуске)
+SAVE_QUEUED = 'queued'
 
 
 class WeighingService:
     """Сервис для бизнес-логики взвешивания"""
 
-    def __init__(self):
-        pass
+    def __init__(self, spool=None, writer=None):
+        # Спул предзаписи (WeighingSpool): запись сначала попадает в него, затем в базу
+        self.spool = spool
+        # Очередь записи (WeighingWriter) для повтора, если база недоступна
+        self.writer = writer
 
     def save_manual_weighing(self,
                            weight: float,
@@ -21,7 +30,7 @@ class WeighingService:
                            sender: str = '-',
                            recipient: str = '-',
                            comment: str = '-',
-                           scales_name: str = '-') -> bool:
+                           scales_name: str = '-') -> Union[int, str, None]:
         """
         Сохранить ручное взвешивание
 
@@ -35,29 +44,66 @@ class WeighingService:
             scales_name: Название весов
 
         Returns:
-            bool: True если сохранение успешно
+            id сохраненной записи; SAVE_QUEUED, если база недоступна, но запись
+            осталась в спуле и будет сохранена позже; None, если сохранить не удалось
         """
         if not self._validate_weighing_data(weight, operator):
-            return False
+            return None
 
         try:
-            current_datetime = datetime.now().strftime("%d.%m.%Y %H:%M")
-
-            save_weighing(
-                datetime_str=current_datetime,
-                weight=weight,
-                operator=operator,
-                weighing_mode='Ручное',
-                cargo_name=cargo_name,
-                sender=sender,
-                recipient=recipient,
-                comment=comment,
-                scales_name=scales_name
-            )
-            return True
+            now = datetime.now()
+            current_datetime = now.strftime(WEIGHING_DATETIME_FORMAT)
+
+            record = {
+                'datetime_str': current_datetime,
+                'weight': weight,
+                'operator': operator,
+                'weighing_mode': 'Ручное',
+                'cargo_name': cargo_name,
+                'sender': sender,
+                'recipient': recipient,
+                'comment': comment,
+                'scales_name': scales_name,
+                'timestamp': datetime_to_timestamp(now)
+            }
         except Exception as e:
-            logger.error(f"Ошибка при сохранении ручного взвешивания: {str(e)}")
-            return False
+            logger.error(f"Ошибка при подготовке ручного взвешивания: {str(e)}")
+            return None
+
+        spooled = False
+        if self.spool is not None:
+            try:
+                self.spool.append(record)
+                spooled = True
+            except OSError as e:
+                logger.error(f"Не удалось дописать ручное взвешивание в спул: {e}")
+
+        try:
+            if metrics.enabled:
+                started_ns = time.perf_counter_ns()
+                weighing_id = save_weighing(**record)
+                metrics.record(metrics.SOURCE_DATABASE, metrics.DB_COMMIT_TIME, time.perf_counter_ns() - started_ns)
+            else:
+                weighing_id = save_weighing(**record)
+        except Exception as e:
+            if not spooled:
+                logger.error(f"Ошибка при сохранении ручного взвешивания: {str(e)}")
+                return None
+            # Запись уже в спуле и все равно попадет в журнал - об ошибке не сообщаем,
+            # иначе повторное сохранение оператором даст два взвешивания
+            if self.writer is not None:
+                try:
+                    self.writer.submit(record, spooled=True)
+                except RuntimeError:
+                    pass
+            logger.error(f"Ошибка при сохранении ручного взвешивания: {str(e)}. "
+                         f"Запись осталась в спуле и будет сохранена в базу позже")
+            return SAVE_QUEUED
+
+        if spooled:
+            # Ручные сохранения редки: сразу сбрасываем запись на диск и убираем ее из спула
+            self.spool.mark_committed([record['uid']], durable=checkpoint())
+        return weighing_id
 
     def _validate_weighing_data(self, weight: float, operator: str) -> bool:
         """Проверить корректность данных взвешивания"""
@@ -0,0 +1,163 @@
+import os
+import json
+import struct
+import threading
+import uuid
+import zlib
+import logging
+from database import save_weighings, checkpoint
+from logger import get_logger
+
+# Настройка логирования для weighing_spool модуля
+logger = get_logger('weighing_spool')
+
+SPOOL_FILE = 'weights_journal.spool'
+
+# Заголовок записи спула: длина данных и CRC32 данных (big-endian)
+_RECORD_HEADER = struct.Struct('>II')
+# Сколько записей спула переносить в базу одной транзакцией при восстановлении
+REPLAY_BATCH_SIZE = 500
+
+
+class WeighingSpool:
+    """Журнал предзаписи взвешиваний (append-only файл с fsync).
+
+    Каждое взвешивание сначала дописывается в конец файла спула
+    (длина + CRC32 + JSON) и сбрасывается на диск, и только потом
+    сохраняется в базу. Сохраненные записи отмечаются по uid; файл
+    очищается, когда все дописанные записи сохранены и транзакции
+    с ними уже на диске (при synchronous=NORMAL - после контрольной
+    точки WAL, см. mark_synced). Если база была недоступна или приложение
+    упало, записи остаются в спуле и переносятся в базу при следующем
+    запуске (replay). Повторный перенос безопасен: у записи есть uid,
+    а weighings.uid уникален.
+    """
+
+    def __init__(self, path=SPOOL_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        # uid записей спула, еще не сохраненных в базу; записи, оставшиеся с прошлого
+        # запуска, считаются несохраненными, пока их не перенесет replay()
+        records, self._valid_size = self._scan()
+        self._uncommitted = {record.get('uid') for record in records}
+        # uid сохраненных записей, транзакции которых еще могут не быть на диске
+        self._unsynced = set()
+        self._file = None
+
+    def append(self, record):
+        """Дописать взвешивание в спул (присваивает record['uid'], если его нет)"""
+        if not record.get('uid'):
+            record['uid'] = uuid.uuid4().hex
+        payload = json.dumps(record, ensure_ascii=False).encode('utf-8')
+
+        with self._lock:
+            self._open()
+            self._file.write(_RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._uncommitted.add(record['uid'])
+        return record['uid']
+
+    def mark_committed(self, uids, durable=True):
+        """Отметить, что записи спула с данными uid сохранены в базу.
+
+        durable=False - транзакция зафиксирована без fsync (synchronous=NORMAL):
+        такие записи остаются в спуле до mark_synced(). Когда сохранено
+        и сброшено на диск все дописанное, спул очищается.
+        """
+        with self._lock:
+            for uid in uids:
+                if uid in self._uncommitted:
+                    self._uncommitted.discard(uid)
+                    if not durable:
+                        self._unsynced.add(uid)
+            self._truncate_if_done()
+
+    def unsynced(self):
+        """uid записей, сохраненных в базу без сброса на диск (снимок для mark_synced)"""
+        with self._lock:
+            return set(self._unsynced)
+
+    def mark_synced(self, uids):
+        """Отметить, что транзакции с записями uids сброшены на диск (контрольная точка WAL)"""
+        with self._lock:
+            self._unsynced -= set(uids)
+            self._truncate_if_done()
+
+    def _truncate_if_done(self):
+        """Очистить спул, если все записи сохранены и на диске (вызывается под блокировкой)"""
+        if not self._uncommitted and not self._unsynced and self._file is not None:
+            self._truncate()
+
+    def _open(self):
+        """Открыть спул на дозапись (вызывается под блокировкой).
+        Поврежденный хвост отрезается, иначе новые записи оказались бы за ним и не читались"""
+        if self._file is None:
+            self._file = open(self.path, 'ab')
+            if self._file.tell() > self._valid_size:
+                self._file.truncate(self._valid_size)
+
+    def _truncate(self):
+        """Очистить файл спула (вызывается под блокировкой)"""
+        if self._file is not None:
+            self._file.truncate(0)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._uncommitted.clear()
+        self._unsynced.clear()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def read_records(self):
+        """Прочитать все целые записи спула (оборванная или поврежденная запись в конце отбрасывается)"""
+        return self._scan()[0]
+
+    def _scan(self):
+        """Прочитать записи спула; возвращает (записи, размер целой части файла в байтах)"""
+        records = []
+        if not os.path.exists(self.path):
+            return records, 0
+
+        with open(self.path, 'rb') as f:
+            data = f.read()
+
+        offset = 0
+        while offset + _RECORD_HEADER.size <= len(data):
+            length, checksum = _RECORD_HEADER.unpack_from(data, offset)
+            start = offset + _RECORD_HEADER.size
+            payload = data[start:start + length]
+            if len(payload) < length or zlib.crc32(payload) != checksum:
+                break
+            records.append(json.loads(payload.decode('utf-8')))
+            offset = start + length
+
+        if offset < len(data):
+            logger.warning(f"Спул {self.path}: отброшен поврежденный хвост ({len(data) - offset} байт)")
+        return records, offset
+
+    def replay(self):
+        """Перенести записи спула в базу и очистить спул. Возвращает количество новых записей в базе"""
+        records = self.read_records()
+        if not records:
+            return 0
+
+        inserted = 0
+        for start in range(0, len(records), REPLAY_BATCH_SIZE):
+            ids = save_weighings(records[start:start + REPLAY_BATCH_SIZE])
+            inserted += sum(1 for weighing_id in ids if weighing_id is not None)
+
+        # Спул очищается, только когда перенесенные записи уже на диске
+        if not checkpoint():
+            logger.warning(f"Записи спула перенесены в базу, но контрольная точка WAL не выполнена - "
+                           f"спул будет очищен при следующем запуске")
+            return inserted
+
+        with self._lock:
+            self._open()
+            self._truncate()
+        logger.info(f"Восстановлено из спула {inserted} взвешиваний (записей в спуле: {len(records)})")
+        return inserted
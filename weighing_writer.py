@@ -0,0 +1,224 @@
+import queue
+import sqlite3
+import threading
+import time
+import logging
+from PyQt5 import QtCore
+from database import save_weighings, get_connection, close_connection, checkpoint
+import metrics
+from logger import get_logger
+
+# Настройка логирования для weighing_writer модуля
+logger = get_logger('weighing_writer')
+
+# Режимы надежности записи:
+# normal - WAL c synchronous=NORMAL: зафиксированная пачка переживает падение приложения,
+#          но последние транзакции могут потеряться при отключении питания; при спуле
+#          записи остаются в нем до контрольной точки WAL, которая сбрасывает их на диск;
+# full   - synchronous=FULL: каждая зафиксированная пачка сразу сбрасывается на диск
+#          и переживает отключение питания (ценой fsync на каждую транзакцию)
+DURABILITY_NORMAL = 'normal'
+DURABILITY_FULL = 'full'
+# Режим задается в коде, а не в настройках: приложение всегда пишет через спул, и в режиме
+# normal запись остается в нем (fsync при постановке в очередь) до контрольной точки WAL,
+# поэтому отключение питания не теряет взвешиваний и в normal. full имеет смысл только
+# для очереди без спула (WeighingWriter(durability=DURABILITY_FULL))
+DEFAULT_DURABILITY = DURABILITY_NORMAL
+
+# Максимум записей в одной транзакции
+WRITER_BATCH_SIZE = 50
+# Пауза перед повтором при заблокированной базе (удваивается до максимума)
+LOCKED_RETRY_DELAY = 0.1
+LOCKED_RETRY_MAX_DELAY = 2.0
+# Сколько секунд при остановке продолжать повторы записи в заблокированную базу
+SHUTDOWN_RETRY_TIMEOUT = 10.0
+
+# Признак остановки потока записи в очереди
+_STOP = object()
+
+
+def _is_locked_error(error):
+    """База занята другим соединением - запись можно повторить"""
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+class WeighingWriter(QtCore.QObject):
+    """Очередь отложенной записи взвешиваний (write-behind) для всех весов.
+
+    Движки автовзвешивания только ставят запись в очередь и сразу
+    возвращаются к чтению веса. Отдельный поток забирает все накопившиеся
+    записи и сохраняет их пачками в одной транзакции; при блокировке базы
+    пачка повторяется с нарастающей паузой. stop() дожидается записи
+    всего, что было поставлено в очередь.
+
+    Если задан спул (WeighingSpool), запись сначала дописывается в него,
+    поэтому поставленное в очередь взвешивание не теряется при падении
+    приложения или недоступной базе. Из спула записи убираются, только
+    когда они на диске: в режиме normal - после контрольной точки WAL,
+    которая выполняется, когда очередь опустела.
+    """
+
+    # Запись сохранена: id новой записи
+    weighing_saved = QtCore.pyqtSignal(int)
+    # Пачку не удалось сохранить: количество записей, текст ошибки
+    write_failed = QtCore.pyqtSignal(int, str)
+
+    def __init__(self, durability=DEFAULT_DURABILITY, batch_size=WRITER_BATCH_SIZE, spool=None, parent=None):
+        super().__init__(parent)
+        if durability not in (DURABILITY_NORMAL, DURABILITY_FULL):
+            raise ValueError(f"Неизвестный режим надежности записи: {durability}")
+        self.durability = durability
+        self.batch_size = batch_size
+        self.spool = spool
+
+        self._queue = queue.Queue()
+        self._pending = 0  # Поставлено в очередь, но еще не обработано
+        self._pending_changed = threading.Condition()
+        self._stopping = threading.Event()
+        self._stop_time = None
+
+        self._thread = threading.Thread(target=self._run, name="WeighingWriter", daemon=True)
+        self._thread.start()
+
+    def submit(self, record, spooled=False, latency=None):
+        """Поставить взвешивание в очередь записи (аргументы save_weighing в виде словаря).
+        spooled=True - запись уже дописана в спул (например, при повторе ручного сохранения).
+        latency - (источник метрик, time.monotonic_ns() выполнения условия сохранения):
+        после фиксации пачки задержка до нее записывается в метрику SAVE_LATENCY"""
+        if self._stopping.is_set():
+            raise RuntimeError("Очередь записи взвешиваний остановлена")
+        if self.spool is not None and not spooled:
+            try:
+                self.spool.append(record)
+            except OSError as e:
+                # Запись не в спуле: она не отметится в нем при сохранении (учет идет по uid)
+                logger.error(f"Не удалось дописать взвешивание в спул: {e}")
+        with self._pending_changed:
+            self._pending += 1
+        self._queue.put((record, latency))
+
+    def pending_count(self):
+        """Количество записей, еще не сохраненных в базу"""
+        with self._pending_changed:
+            return self._pending
+
+    def flush(self, timeout=None):
+        """Дождаться сохранения всех поставленных записей. False - не успели за timeout секунд"""
+        with self._pending_changed:
+            return self._pending_changed.wait_for(lambda: self._pending == 0, timeout)
+
+    def stop(self, timeout=None):
+        """Сохранить оставшиеся записи и остановить поток записи"""
+        if not self._thread.is_alive():
+            return
+        self._stop_time = time.monotonic()
+        self._stopping.set()
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.error(f"Поток записи взвешиваний не завершился, не сохранено записей: {self.pending_count()}")
+
+    def _run(self):
+        """Основной цикл потока записи"""
+        try:
+            if self.durability == DURABILITY_FULL:
+                get_connection().execute('PRAGMA synchronous=FULL')
+
+            stop_requested = False
+            while not stop_requested:
+                item = self._queue.get()
+                if item is _STOP:
+                    break
+
+                # Забираем все, что уже накопилось в очереди, не дожидаясь новых записей
+                batch = [item]
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stop_requested = True
+                        break
+                    batch.append(item)
+
+                self._write_batch(batch)
+                if self._queue.empty():
+                    self._sync_spool()
+
+            # Записи, поставленные одновременно с остановкой
+            remaining = []
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not _STOP:
+                    remaining.append(item)
+            if remaining:
+                self._write_batch(remaining)
+            self._sync_spool()
+        except Exception as e:
+            logger.error(f"Ошибка в потоке записи взвешиваний: {e}")
+        finally:
+            # Соединение с базой данных принадлежит этому потоку
+            close_connection()
+
+    def _write_batch(self, batch):
+        """Сохранить пачку (записи очереди с метками задержки) одной транзакцией,
+        повторяя при заблокированной базе"""
+        delay = LOCKED_RETRY_DELAY
+        records = [record for record, _ in batch]
+        try:
+            while True:
+                try:
+                    if metrics.enabled:
+                        started_ns = time.perf_counter_ns()
+                        ids = save_weighings(records)
+                        metrics.record(metrics.SOURCE_DATABASE, metrics.DB_COMMIT_TIME,
+                                       time.perf_counter_ns() - started_ns)
+                    else:
+                        ids = save_weighings(records)
+                    break
+                except sqlite3.OperationalError as e:
+                    if not _is_locked_error(e) or not self._may_retry():
+                        raise
+                    logger.warning(f"База данных занята, повтор записи {len(batch)} взвешиваний через {delay:.1f} с")
+                    time.sleep(delay)
+                    delay = min(delay * 2, LOCKED_RETRY_MAX_DELAY)
+        except Exception as e:
+            logger.error(f"Не удалось сохранить {len(batch)} взвешиваний: {e}")
+            self.write_failed.emit(len(batch), str(e))
+        else:
+            if metrics.enabled:
+                committed_ns = time.monotonic_ns()
+                for _, latency in batch:
+                    if latency is not None:
+                        source, condition_met_ns = latency
+                        metrics.record(source, metrics.SAVE_LATENCY, committed_ns - condition_met_ns)
+            if self.spool is not None:
+                self.spool.mark_committed([record.get('uid') for record in records],
+                                          durable=self.durability == DURABILITY_FULL)
+            for weighing_id in ids:
+                # None - запись уже была в базе (повтор из спула)
+                if weighing_id is not None:
+                    self.weighing_saved.emit(weighing_id)
+        finally:
+            with self._pending_changed:
+                self._pending -= len(batch)
+                self._pending_changed.notify_all()
+
+    def _sync_spool(self):
+        """Сбросить сохраненные записи на диск контрольной точкой WAL и убрать их из спула"""
+        if self.spool is None:
+            return
+        uids = self.spool.unsynced()
+        if uids and checkpoint():
+            self.spool.mark_synced(uids)
+
+    def _may_retry(self):
+        """Повторять запись всегда, а при остановке - не дольше SHUTDOWN_RETRY_TIMEOUT"""
+        if not self._stopping.is_set():
+            return True
+        return time.monotonic() - self._stop_time < SHUTDOWN_RETRY_TIMEOUT
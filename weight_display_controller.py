@@ -60,7 +60,7 @@ class WeightDisplayController:
 
         try:
             # Проверяем, изменился ли вес
-            weight_text = ".1f" if weight_value >= 0 else "-"
+            weight_text = f"{weight_value:.1f}"
 
             # Выходим если значение не изменилось
             if weight_text == self.last_weight_text:
@@ -132,18 +132,19 @@ class WeightDisplayController:
         self.last_font_size = self.max_font_size
         self._set_error_state()
 
-    def update_connection_status(self, is_connected: bool, port: Optional[str] = None, baud: Optional[int] = None):
-        """Обновляет статус подключения"""
+    def update_connection_status(self, is_connected: bool, port: Optional[str] = None, baud: Optional[int] = None,
+                                 status: Optional[str] = None):
+        """Обновляет статус подключения (status - состояние вместо "Ок"/"None", например "Переподключение")"""
         try:
             # Проверяем, что объект еще существует
             if not hasattr(self, 'status_label') or self.status_label is None:
                 return
 
-            if is_connected and port:
+            if port and (is_connected or status):
                 second_line = port
                 if baud:
                     second_line = f"{second_line}, {baud}"
-                text = f"Прием данных...Ок\n{second_line}"
+                text = f"Прием данных...{status or 'Ок'}\n{second_line}"
             else:
                 text = "Прием данных...None\n-"
 
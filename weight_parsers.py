@@ -0,0 +1,124 @@
+import re
+from collections import namedtuple
+from typing import Callable, Dict, Optional, Union
+
+# Разобранный кадр весов:
+# value  - вес в кг;
+# stable - признак стабильности от весов (True/False) или None, если протокол его не передает;
+# net    - True для веса нетто (NT), False для брутто (GS);
+# unit   - единица измерения, в которой весы передали вес;
+# timestamp_ns - время поступления кадра по time.monotonic_ns() (проставляет WeightReader)
+WeightReading = namedtuple('WeightReading', 'value stable net unit timestamp_ns', defaults=(None,))
+
+# Парсер кадра весов: принимает сырые байты кадра и возвращает WeightReading,
+# просто вес (для парсеров без признаков кадра) или None
+WeightParser = Callable[[bytes], Optional[Union[WeightReading, int, float]]]
+
+# Регулярные выражения компилируются один раз при импорте и работают прямо по байтам,
+# без декодирования UTF-8, strip() и lower() на каждый кадр
+_PROTOCOL_1_RE = re.compile(rb'ww\s*(\d+(?:\.\d+)?)', re.IGNORECASE)
+_PROTOCOL_2_RE = re.compile(rb'([A-Z]{2}),\s*(GS|NT),\s*([+\-]?)\s*(\d+(?:\.\d+)?)\s*(kg|g|t)\b')
+_GENERIC_NUMBER_RE = re.compile(rb'\d+(?:[.,]\d+)?')
+
+# Разумный предел для веса в кг при разборе кадра неизвестного формата
+GENERIC_MAX_WEIGHT = 100000
+
+# Единица веса по умолчанию и множители перевода в нее
+DEFAULT_UNIT = 'kg'
+_UNIT_FACTORS = {b'kg': 1, b'g': 0.001, b't': 1000}
+
+
+def _to_number(value: bytes) -> Union[int, float]:
+    """Преобразовать цифры кадра в int или float (если есть десятичная точка)"""
+    return float(value) if b'.' in value else int(value)
+
+
+def parse_protocol_1(raw: bytes) -> Optional[WeightReading]:
+    """Протокол 1: кадры вида b'ww005.5kg' или b'ww 005.5 kg' (единица kg необязательна).
+    Признак стабильности протокол не передает"""
+    match = _PROTOCOL_1_RE.search(raw)
+    if match:
+        return WeightReading(_to_number(match.group(1)), None, False, DEFAULT_UNIT)
+    return None
+
+
+def parse_protocol_2(raw: bytes) -> Optional[WeightReading]:
+    """Протокол 2: кадры вида b'ST, GS,+000005 kg'.
+
+    ST - вес стабилен, US (и другие префиксы, например OL - перегрузка) - нет;
+    GS - брутто, NT - нетто. Вес в g и t переводится в кг,
+    отрицательный вес возвращается со знаком.
+    """
+    match = _PROTOCOL_2_RE.search(raw)
+    if match:
+        status, kind, sign, digits, unit = match.groups()
+        value = _to_number(digits)
+        factor = _UNIT_FACTORS[unit]
+        if factor != 1:
+            value = value * factor
+        if sign == b'-':
+            value = -value
+        return WeightReading(value, status == b'ST', kind == b'NT', unit.decode('ascii'))
+    return None
+
+
+def parse_generic(raw: bytes) -> Optional[float]:
+    """Запасной разбор: первое число кадра, похожее на вес"""
+    for match in _GENERIC_NUMBER_RE.finditer(raw):
+        # Заменяем запятую на точку для корректного преобразования
+        value = float(match.group(0).replace(b',', b'.'))
+        if 0 <= value <= GENERIC_MAX_WEIGHT:
+            return value
+    return None
+
+
+# Реестр парсеров по номеру протокола из настроек COM-порта
+PARSERS: Dict[int, WeightParser] = {
+    1: parse_protocol_1,
+    2: parse_protocol_2,
+}
+
+# Протокол, используемый для неизвестных номеров (как и раньше - протокол 1)
+DEFAULT_PROTOCOL = 1
+
+
+def register_parser(protocol: int, parser: WeightParser):
+    """Зарегистрировать парсер для нового протокола весов"""
+    PARSERS[protocol] = parser
+
+
+def get_parser(protocol: int) -> WeightParser:
+    """Получить парсер протокола (для неизвестного протокола - парсер по умолчанию)"""
+    return PARSERS.get(protocol, PARSERS[DEFAULT_PROTOCOL])
+
+
+def parse_reading(raw: bytes, parser: WeightParser, strict: bool = False) -> Optional[WeightReading]:
+    """Разобрать кадр парсером протокола в WeightReading.
+
+    В строгом режиме кадры, не подходящие под протокол, отбрасываются;
+    иначе выполняется запасной поиск числа в кадре (без признака стабильности).
+    Отрицательный вес (уход нуля пустой платформы) возвращается со знаком:
+    индикатор должен его показать, а автовзвешивание считает его нулем.
+    """
+    if not raw:
+        return None
+
+    try:
+        reading = parser(raw)
+        if reading is None and not strict:
+            reading = parse_generic(raw)
+    except ValueError:
+        return None
+
+    if reading is None:
+        return None
+    if not isinstance(reading, WeightReading):
+        # Парсер вернул только число
+        reading = WeightReading(reading, None, False, DEFAULT_UNIT)
+    return reading
+
+
+def parse_frame(raw: bytes, parser: WeightParser, strict: bool = False) -> Optional[Union[int, float]]:
+    """Разобрать кадр парсером протокола и вернуть только вес (см. parse_reading)"""
+    reading = parse_reading(raw, parser, strict)
+    return reading.value if reading is not None else None
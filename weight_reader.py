@@ -1,33 +1,69 @@
-import re
 import time
+import importlib
 import serial
-from typing import Optional, Union, Tuple
+import metrics
+from collections import deque
+from typing import Optional, Union, Tuple, List
+from weight_parsers import WeightReading, get_parser, parse_frame, parse_reading
+
+# Источники данных вместо COM-порта по префиксу имени порта: (модуль, класс).
+# Модули стенда (serial_capture.REPLAY_PORT_PREFIX, scale_simulator.SIM_PORT_PREFIX)
+# импортируются только при открытии такого порта, а не при запуске журнала
+PORT_FACTORIES = {
+    'replay:': ('serial_capture', 'ReplaySerial'),
+    'sim:': ('scale_simulator', 'SimulatedSerial'),
+}
+
+
+def open_serial_port(port: str, baudrate: int = 9600, timeout=1):
+    """Открыть COM-порт или источник данных по префиксу порта ("replay:<файл>", "sim:...")"""
+    for prefix, (module_name, class_name) in PORT_FACTORIES.items():
+        if port.startswith(prefix):
+            factory = getattr(importlib.import_module(module_name), class_name)
+            return factory(port=port, baudrate=baudrate, timeout=timeout)
+    return serial.Serial(port=port, baudrate=baudrate, timeout=timeout)
 
 
 class WeightReader:
     """Класс для чтения данных с COM-порта и парсинга веса"""
 
-    def __init__(self, port: Optional[str] = None, baudrate: int = 9600, protocol: int = 1):
+    def __init__(self, port: Optional[str] = None, baudrate: int = 9600, protocol: int = 1,
+                 frame_buffer_size: int = 256, max_pending_bytes: int = 4096, strict: bool = False):
         self.serial_port: Optional[serial.Serial] = None
         self.port = port
         self.baudrate = baudrate
         self.protocol = protocol  # 1: ww005kg, 2: ST,GS,+000005kg
         self.is_connected = False
 
+        # Парсер протокола выбирается один раз, а не на каждый кадр
+        self._parser = get_parser(protocol)
+        self.strict = strict  # Строгий режим: без запасного поиска числа в кадре
+
+        # Пакетное чтение: хвост незавершенного кадра и кольцевой буфер последних кадров (WeightReading)
+        self.max_pending_bytes = max_pending_bytes
+        self._pending = bytearray()
+        self.frames: deque = deque(maxlen=frame_buffer_size)
+
+        # Запись сырого потока порта (SerialCapture) и часы для меток кадров:
+        # источник воспроизведения отдает свое время, чтобы метки совпадали с записью
+        self.capture: Optional['SerialCapture'] = None
+        self._clock_ns = time.monotonic_ns
+        # Источник метрик производительности (название весов; по умолчанию - порт)
+        self.metrics_source: Optional[str] = None
+
     def connect(self, port: str, baudrate: int = 9600) -> Tuple[bool, str]:
         """Подключиться к COM-порту"""
         try:
             if self.serial_port and self.serial_port.is_open:
                 self.serial_port.close()
 
-            self.serial_port = serial.Serial(
-                port=port,
-                baudrate=baudrate,
-                timeout=1
-            )
+            self.serial_port = open_serial_port(port, baudrate, timeout=1)
+            self._clock_ns = getattr(self.serial_port, 'monotonic_ns', time.monotonic_ns)
             self.port = port
             self.baudrate = baudrate
             self.is_connected = True
+            self._pending.clear()
+            self.frames.clear()
             return True, f"Подключено к {port} с скоростью {baudrate}"
         except Exception as e:
             self.is_connected = False
@@ -43,6 +79,21 @@ class WeightReader:
         finally:
             self.serial_port = None
             self.is_connected = False
+            self._pending.clear()
+            self._clock_ns = time.monotonic_ns
+
+    def start_capture(self, path: str) -> 'SerialCapture':
+        """Начать запись сырого потока порта в файл (см. serial_capture)"""
+        from serial_capture import SerialCapture
+        self.stop_capture()
+        self.capture = SerialCapture(path, port=self.port, baudrate=self.baudrate, protocol=self.protocol)
+        return self.capture
+
+    def stop_capture(self):
+        """Остановить запись сырого потока порта"""
+        if self.capture is not None:
+            self.capture.close()
+            self.capture = None
 
     def read_weight(self) -> Optional[float]:
         """Прочитать и распарсить вес с COM-порта"""
@@ -53,87 +104,121 @@ class WeightReader:
             if self.serial_port.in_waiting:
                 raw_bytes = self.serial_port.readline()
                 if raw_bytes:
-                    raw_string = raw_bytes.decode('utf-8').strip()
-                    weight_value = self.parse_weight_from_raw(raw_string)
-                    if weight_value is not None and isinstance(weight_value, (int, float)) and weight_value >= 0:
-                        return weight_value
+                    return parse_frame(raw_bytes, self._parser, self.strict)
         except Exception:
             # Игнорируем ошибки чтения
             pass
 
         return None
 
-    def parse_weight_from_raw(self, raw_string: str) -> Optional[float]:
-        """Парсит строку веса в зависимости от текущего протокола.
+    def read_readings(self) -> List[WeightReading]:
+        """Вычитать из порта все накопленные кадры за один вызов в виде WeightReading
+        (вес, признак стабильности, брутто/нетто, единица, время поступления) в порядке поступления.
+        Список ограничен размером кольцевого буфера, поэтому отставание
+        от весов не может расти неограниченно.
+
+        Время поступления берется по time.monotonic_ns() в момент чтения порта;
+        для кадров, которые успели полежать в буфере порта, оно уменьшается
+        на время передачи байтов, пришедших после них, при текущей скорости порта.
 
-        Протокол 1: строки вида 'ww005.5kg' или 'ww 005.5 kg' -> число 20.12
+        Пустой список означает только, что данных пока нет; ошибки порта
+        (serial.SerialException, OSError - например, отключенный кабель USB)
+        пробрасываются вызывающему, чтобы отличить их от паузы в данных.
+        """
+        if not self.is_connected or not self.serial_port or not self.serial_port.is_open:
+            return []
+
+        waiting = self.serial_port.in_waiting
+        if not waiting:
+            return []
+        chunk = self.serial_port.read(waiting)
+        read_time_ns = self._clock_ns()
+
+        if self.capture is not None:
+            self.capture.write(chunk, read_time_ns)
+
+        timing = metrics.enabled
+        if timing:
+            parse_started_ns = time.perf_counter_ns()
+
+        parser = self._parser
+        strict = self.strict
+        byte_time_ns = self._byte_time_ns()
+        readings = []
+        frames = self._split_frames(chunk)
+        for raw_bytes, bytes_after in frames:
+            reading = parse_reading(raw_bytes, parser, strict)
+            if reading is not None:
+                readings.append(reading._replace(timestamp_ns=read_time_ns - bytes_after * byte_time_ns))
+
+        if timing and frames:
+            source = self.metrics_source or self.port
+            metrics.record(source, metrics.PARSE_TIME, (time.perf_counter_ns() - parse_started_ns) // len(frames))
+            metrics.record_frames(source, [reading.timestamp_ns for reading in readings])
+
+        if not readings:
+            return []
+
+        # Оставляем только то, что помещается в кольцевой буфер
+        maxlen = self.frames.maxlen
+        if maxlen is not None and len(readings) > maxlen:
+            readings = readings[-maxlen:]
+        self.frames.extend(readings)
+        return readings
+
+    def _byte_time_ns(self) -> int:
+        """Время передачи одного байта по порту в нс (8N1: 10 бит на байт)"""
+        return 10 * 1_000_000_000 // self.baudrate if self.baudrate else 0
+
+    def _split_frames(self, chunk: bytes) -> List[Tuple[bytes, int]]:
+        """Разбить прочитанные байты на кадры, сохранив незавершенный хвост.
+
+        Для каждого кадра возвращается (кадр, количество байтов чанка, пришедших после него).
+        """
+        self._pending.extend(chunk)
+        data = bytes(self._pending)
+        self._pending.clear()
+
+        frames = []
+        end = 0
+        for line in data.splitlines(keepends=True):
+            end += len(line)
+            frame = line.rstrip(b'\r\n')
+            if len(frame) == len(line):
+                # Последний кадр еще не дочитан - ждем его окончания в следующем вызове
+                if len(frame) <= self.max_pending_bytes:
+                    self._pending.extend(frame)
+                break
+            if frame:
+                frames.append((frame, min(len(data) - end, len(chunk))))
+        return frames
+
+    def parse_weight_from_raw(self, raw: Union[str, bytes]) -> Optional[Union[int, float]]:
+        """Парсит кадр веса парсером текущего протокола (см. weight_parsers).
+
+        Протокол 1: строки вида 'ww005.5kg' или 'ww 005.5 kg' -> число 5.5
         Протокол 2: строки вида 'ST, GS,+000005 kg' -> число 5
+        В строгом режиме кадры другого формата не разбираются.
         """
-        if not raw_string or not raw_string.strip():
-            return None
-
-        try:
-            if self.protocol == 2:
-                # Протокол 2: строки вида 'ST, GS,+000005 kg'
-                # Ищем образец с числом и 'kg' в конце, может содержать + и пробелы
-                match = re.search(r'[A-Z]{2},\s*GS,\s*[+\-]?\s*(\d+(?:\.\d+)?)\s*kg', raw_string.strip())
-                if match:
-                    value_str = match.group(1).strip()
-                    try:
-                        value = float(value_str) if '.' in value_str else int(value_str)
-                        return value if value >= 0 else None
-                    except ValueError:
-                        pass
-            else:
-                # Протокол 1: строки вида 'ww00020.12kg' или 'ww 00020.12 kg'
-                # Ищем ww + любое количество цифр + необязательная десятичная часть + kg
-                match = re.search(r'ww\s*(\d+(?:\.\d+)?)\s*kg', raw_string.strip().lower())
-                if match:
-                    value_str = match.group(1).strip()
-                    try:
-                        value = float(value_str) if '.' in value_str else int(value_str)
-                        return value if value >= 0 else None
-                    except ValueError:
-                        pass
-
-                # Альтернативный формат без 'kg' но с 'ww'
-                alt_match = re.search(r'ww\s*(\d+(?:\.\d+)?)', raw_string.strip().lower())
-                if alt_match:
-                    value_str = alt_match.group(1).strip()
-                    try:
-                        value = float(value_str) if '.' in value_str else int(value_str)
-                        return value if value >= 0 else None
-                    except ValueError:
-                        pass
-
-            # Если основные протоколы не сработали, ищем числа с десятичной точкой или запятой
-            # Но только если они выглядят как вес (положительные числа)
-            number_patterns = [
-                r'(\d+(?:[.,]\d+)?)',  # числа с точкой или запятой как разделителем
-            ]
-
-            for pattern in number_patterns:
-                matches = re.findall(pattern, raw_string.strip())
-                for match in matches:
-                    # Заменяем запятую на точку для корректного преобразования
-                    value_str = match.replace(',', '.')
-                    try:
-                        value = float(value_str)
-                        # Проверяем, что это разумное значение веса (не слишком большое)
-                        if 0 <= value <= 100000:  # Разумный предел для веса в кг
-                            return value
-                    except ValueError:
-                        continue
+        if isinstance(raw, str):
+            raw = raw.encode('utf-8', errors='ignore')
+        return parse_frame(raw, self._parser, self.strict)
 
-        except Exception:
-            # Игнорируем любые ошибки парсинга
-            pass
+    def parse_reading_from_raw(self, raw: Union[str, bytes]) -> Optional[WeightReading]:
+        """Парсит кадр веса в WeightReading: вес, признак стабильности, брутто/нетто, единица.
 
-        return None
+        Протокол 2: 'ST, GS,+000005 kg' -> WeightReading(5, True, False, 'kg'),
+                    'US, NT,+000005 kg' -> WeightReading(5, False, True, 'kg')
+        Протокол 1 признак стабильности не передает (stable=None).
+        """
+        if isinstance(raw, str):
+            raw = raw.encode('utf-8', errors='ignore')
+        return parse_reading(raw, self._parser, self.strict)
 
     def set_protocol(self, protocol: int):
         """Установить протокол обмена данными"""
         self.protocol = protocol
+        self._parser = get_parser(protocol)
 
     def is_port_open(self) -> bool:
         """Проверить, открыт ли порт"""
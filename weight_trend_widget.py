@@ -0,0 +1,116 @@
+import time
+import logging
+from PyQt5 import QtWidgets, QtCore, QtGui
+from logger import get_logger
+
+# Настройка логирования для weight_trend_widget модуля
+logger = get_logger('weight_trend_widget')
+
+# Сколько секунд истории показывает график по умолчанию
+TREND_SPAN_S = 60
+
+
+class WeightTrendWidget(QtWidgets.QWidget):
+    """Легкий график веса за последние секунды по ReadingHistory.
+
+    Виджет ничего не хранит сам: при каждой отрисовке он копирует окно
+    из истории показаний и сводит его к минимуму и максимуму на столбец
+    пикселей. Число точек ломаной (стоимость рисования) зависит от ширины
+    виджета, но копирование и свертка окна линейны по числу кадров в нем,
+    то есть растут с частотой кадров (сверху их ограничивает емкость
+    истории). refresh() перерисовывает график, только если в истории
+    появились новые кадры.
+    """
+
+    def __init__(self, history=None, span_s: float = TREND_SPAN_S, parent=None):
+        super().__init__(parent)
+        self.history = history
+        self.span_s = span_s
+        self._drawn_count = -1  # total_count истории на момент последней отрисовки
+
+        self.setFixedHeight(60)
+        self.setAttribute(QtCore.Qt.WA_OpaquePaintEvent)
+        self._background = QtGui.QColor("#ffffff")
+        self._line_pen = QtGui.QPen(QtGui.QColor("#0030df"), 1)
+        self._grid_pen = QtGui.QPen(QtGui.QColor("#e5e7eb"), 1)
+        self._text_pen = QtGui.QPen(QtGui.QColor("#6b7280"), 1)
+        self._font = QtGui.QFont("Arial", 7)
+
+    def set_history(self, history):
+        self.history = history
+        self._drawn_count = -1
+        self.update()
+
+    def refresh(self):
+        """Перерисовать график, если в истории появились новые показания"""
+        if self.history is None or not self.isVisible():
+            return
+        if self.history.total_count != self._drawn_count:
+            self.update()
+
+    def paintEvent(self, event):
+        painter = QtGui.QPainter(self)
+        try:
+            self._draw(painter)
+        except Exception as e:
+            logger.error(f"Ошибка отрисовки графика веса: {e}")
+        finally:
+            painter.end()
+
+    def _draw(self, painter):
+        rect = self.rect()
+        painter.fillRect(rect, self._background)
+        painter.setPen(self._grid_pen)
+        painter.drawRect(rect.adjusted(0, 0, -1, -1))
+
+        if self.history is None:
+            return
+        self._drawn_count = self.history.total_count
+
+        now_ns = time.monotonic_ns()
+        timestamps, values = self.history.window(self.span_s, now_ns)
+        if not values:
+            return
+
+        width = max(rect.width() - 2, 1)
+        height = max(rect.height() - 4, 1)
+        low = min(values)
+        high = max(values)
+        if high - low < 1e-9:
+            low -= 1
+            high += 1
+        scale_y = height / (high - low)
+        span_ns = self.span_s * 1_000_000_000
+        start_ns = now_ns - span_ns
+
+        # Минимум и максимум веса на каждый столбец пикселей
+        columns = {}
+        for timestamp, value in zip(timestamps, values):
+            x = int((timestamp - start_ns) * width / span_ns)
+            column = columns.get(x)
+            if column is None:
+                columns[x] = [value, value, value]
+            else:
+                if value < column[0]:
+                    column[0] = value
+                if value > column[1]:
+                    column[1] = value
+                column[2] = value
+
+        polygon = QtGui.QPolygonF()
+        for x in sorted(columns):
+            column_min, column_max, column_last = columns[x]
+            px = 1 + min(max(x, 0), width - 1)
+            polygon.append(QtCore.QPointF(px, 2 + (high - column_max) * scale_y))
+            if column_min != column_max:
+                polygon.append(QtCore.QPointF(px, 2 + (high - column_min) * scale_y))
+            polygon.append(QtCore.QPointF(px, 2 + (high - column_last) * scale_y))
+
+        painter.setRenderHint(QtGui.QPainter.Antialiasing, False)
+        painter.setPen(self._line_pen)
+        painter.drawPolyline(polygon)
+
+        painter.setPen(self._text_pen)
+        painter.setFont(self._font)
+        painter.drawText(rect.adjusted(4, 2, -4, -2), QtCore.Qt.AlignTop | QtCore.Qt.AlignLeft, f"{high:.1f}")
+        painter.drawText(rect.adjusted(4, 2, -4, -2), QtCore.Qt.AlignBottom | QtCore.Qt.AlignLeft, f"{low:.1f}")